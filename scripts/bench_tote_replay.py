@@ -0,0 +1,147 @@
+"""Replay a recorded Tote race day through the ingest functions and report throughput.
+
+Record a day once against the live API (uses the normal rate limits):
+  TOTE_API_KEY=... TOTE_GRAPHQL_URL=... \
+  python autobet/scripts/bench_tote_replay.py --date 2025-09-20 --cassette data/cassettes/2025-09-20.jsonl.gz --record
+
+Then benchmark offline as often as needed (no network, no BigQuery):
+  python autobet/scripts/bench_tote_replay.py --date 2025-09-20 --cassette data/cassettes/2025-09-20.jsonl.gz \
+      --latency-ms 40 --repeat 3
+
+Stages: events (ingest_tote_events), products OPEN / CLOSED (ingest_products
+by date), products by id (ingest_products(product_ids=...) over the products
+seen earlier). Rows go to an in-memory sink; pass --out DIR to also write
+them as JSON lines per table.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Dummy credentials are fine in replay mode; clients only check they are set
+os.environ.setdefault("TOTE_API_KEY", "replay")
+os.environ.setdefault("TOTE_GRAPHQL_URL", "https://replay.invalid/graphql")
+
+from sports.providers.tote_api import ToteClient
+from sports.providers.tote_cassette import ToteCassette, set_default_cassette
+from sports.ingest.tote_events import ingest_tote_events
+from sports.ingest.tote_products import ingest_products
+from sports.ingest.row_fingerprints import RowFingerprintCache, set_row_cache
+
+
+class LocalSink:
+    """In-memory stand-in for BigQuerySink: any ``upsert_*`` call just collects rows."""
+
+    def __init__(self, out_dir: str | None = None) -> None:
+        self.out_dir = out_dir
+        self.rows: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+    def __getattr__(self, name: str):
+        if not name.startswith("upsert_"):
+            raise AttributeError(name)
+        table = name[len("upsert_"):]
+
+        def _upsert(rows):
+            rows = list(rows or [])
+            self.rows[table].extend(rows)
+            if self.out_dir and rows:
+                with open(os.path.join(self.out_dir, f"{table}.jsonl"), "a", encoding="utf-8") as f:
+                    for r in rows:
+                        f.write(json.dumps(r, default=str) + "\n")
+        return _upsert
+
+    def counts(self) -> Dict[str, int]:
+        return {t: len(r) for t, r in self.rows.items()}
+
+
+def _run_stage(name: str, fn, sink: LocalSink, cassette: ToteCassette) -> Dict[str, Any]:
+    before_rows = sum(sink.counts().values())
+    before_req = cassette.hits if cassette.replaying else cassette.recorded
+    t0 = time.perf_counter()
+    err = None
+    try:
+        fn()
+    except Exception as e:
+        err = str(e)
+    elapsed = time.perf_counter() - t0
+    rows = sum(sink.counts().values()) - before_rows
+    reqs = (cassette.hits if cassette.replaying else cassette.recorded) - before_req
+    return {
+        "stage": name,
+        "seconds": round(elapsed, 3),
+        "requests": reqs,
+        "rows": rows,
+        "rows_per_s": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "requests_per_s": round(reqs / elapsed, 1) if elapsed > 0 else None,
+        "error": err,
+    }
+
+
+def run_day(day: str, cassette: ToteCassette, *, first: int, bet_types: List[str] | None, max_ids: int, out_dir: str | None) -> List[Dict[str, Any]]:
+    sink = LocalSink(out_dir)
+    # Every run writes every row and never touches the shared (Redis) fingerprints
+    set_row_cache(RowFingerprintCache(enabled=False, use_redis=False))
+    client = ToteClient(cassette=cassette)
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    stages = [
+        ("events", lambda: ingest_tote_events(sink, client, first=first, since_iso=f"{day}T00:00:00Z", until_iso=f"{next_day}T00:00:00Z")),
+        ("products_open", lambda: ingest_products(sink, client, date_iso=day, status="OPEN", first=first, bet_types=bet_types)),
+        ("products_closed", lambda: ingest_products(sink, client, date_iso=day, status="CLOSED", first=first, bet_types=bet_types)),
+    ]
+    results = [_run_stage(name, fn, sink, cassette) for name, fn in stages]
+    ids = list(dict.fromkeys(r.get("product_id") for r in sink.rows.get("tote_products", []) if r.get("product_id")))[:max_ids]
+    if ids:
+        results.append(_run_stage(
+            "products_by_id",
+            lambda: ingest_products(sink, client, date_iso=None, status=None, first=first, bet_types=None, product_ids=ids),
+            sink, cassette,
+        ))
+    results.append({"stage": "tables", "rows_by_table": sink.counts()})
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Record or replay a Tote race day through the ingest pipeline")
+    ap.add_argument("--date", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--cassette", required=True, help="Path to .jsonl.gz cassette")
+    ap.add_argument("--record", action="store_true", help="Call the live API and record responses")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency per replayed request")
+    ap.add_argument("--first", type=int, default=400)
+    ap.add_argument("--bet-types", default="", help="Comma-separated list. Leave blank to fetch ALL types.")
+    ap.add_argument("--max-ids", type=int, default=200, help="Products to refetch in the by-id stage")
+    ap.add_argument("--repeat", type=int, default=1, help="Replay runs (ignored when recording)")
+    ap.add_argument("--out", default=None, help="Write sink rows as JSONL per table into this directory")
+    args = ap.parse_args()
+
+    bet_types = [s.strip().upper() for s in (args.bet_types or "").split(",") if s.strip()] or None
+    cassette = ToteCassette(args.cassette, "record" if args.record else "replay", latency_s=args.latency_ms / 1000.0)
+    # Clients created inside the ingest functions (e.g. the async by-id path) share it
+    set_default_cassette(cassette)
+
+    runs = 1 if args.record else max(1, args.repeat)
+    for i in range(runs):
+        results = run_day(args.date, cassette, first=args.first, bet_types=bet_types, max_ids=args.max_ids, out_dir=args.out if i == 0 else None)
+        print(f"--- run {i + 1}/{runs} ({cassette.mode}) ---")
+        for r in results:
+            print(json.dumps(r))
+    if args.record:
+        cassette.flush()
+    print(json.dumps(cassette.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Replay Tote WebSocket message streams into the pool subscriber and report throughput.
+
+Capture a production stream by running the subscriber with a tap:
+  TOTE_WS_TAP=data/ws_taps/2025-09-20.jsonl.gz python -m sports.websocket_service
+
+Replay it offline through ``_subscribe_pools`` against a local WebSocket
+server and an in-memory sink (no Tote, no BigQuery):
+  python autobet/scripts/bench_tote_ws_replay.py --stream data/ws_taps/2025-09-20.jsonl.gz --speed 10
+
+Or generate a synthetic burst instead of a recording:
+  python autobet/scripts/bench_tote_ws_replay.py --synthetic 50000 --products 200 --speed max --sink-latency-ms 800
+
+``--speed`` is a multiple of the recorded pace (1, 10, ...) or ``max`` to
+send frames back to back. The report covers subscriber messages/s, per-message
+processing latency, sink queue depth, flush timings and coalescing counters.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Dummy credentials; HTTP fallbacks hit an empty replay cassette and fail fast
+os.environ.setdefault("TOTE_API_KEY", "replay")
+os.environ.setdefault("TOTE_GRAPHQL_URL", "https://replay.invalid/graphql")
+os.environ.pop("TOTE_WS_TAP", None)
+
+import websockets  # noqa: E402
+
+from sports.providers.sink_pipeline import sink_pipeline_stats  # noqa: E402
+from sports.providers.subscriber_metrics import message_stats  # noqa: E402
+from sports.providers.tote_cassette import ToteCassette, set_default_cassette  # noqa: E402
+from sports.providers.tote_subscriptions import _subscribe_pools  # noqa: E402
+
+Frame = Tuple[int, str]
+
+
+class LocalSink:
+    """In-memory stand-in for BigQuerySink with an optional per-call write latency."""
+
+    def __init__(self, latency_s: float = 0.0) -> None:
+        self.latency_s = latency_s
+        self.rows: Dict[str, int] = defaultdict(int)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        if not name.startswith("upsert_"):
+            raise AttributeError(name)
+        table = name[len("upsert_"):]
+
+        def _upsert(rows):
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            with self._lock:
+                self.rows[table] += len(rows or [])
+                self.calls[table] += 1
+        return _upsert
+
+    def query(self, sql: str, **kwargs) -> List[Any]:
+        return []
+
+
+def load_stream(path: str) -> List[Frame]:
+    opener = gzip.open if path.endswith(".gz") else open
+    frames: List[Frame] = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+                frames.append((int(rec["t"]), rec["raw"]))
+            except Exception:
+                continue
+    frames.sort(key=lambda fr: fr[0])
+    return frames
+
+
+def _money(v: float) -> List[Dict[str, Any]]:
+    return [{"decimalAmount": round(v, 2), "currency": {"code": "GBP"}}]
+
+
+def synthetic_stream(n: int, products: int, rate: float, seed: int = 7) -> Iterator[Frame]:
+    """Pool-total heavy mix resembling the minutes before the off."""
+    rng = random.Random(seed)
+    t0 = int(time.time() * 1000)
+    gross = {f"P{i:05d}": rng.uniform(50, 5000) for i in range(products)}
+    pids = list(gross)
+    for i in range(n):
+        ts = t0 + int(i * 1000.0 / rate)
+        pid = rng.choice(pids)
+        r = rng.random()
+        if r < 0.90:
+            gross[pid] += rng.choice([0.0, 0.5, 1.0, 2.0, 10.0])
+            msg = {
+                "MessageType": "PoolTotalChanged",
+                "ProductId": pid,
+                "Total": {"GrossAmounts": _money(gross[pid]), "NetAmounts": _money(gross[pid] * 0.8)},
+                "CarryIn": {"GrossAmounts": _money(0.0)},
+            }
+        elif r < 0.95:
+            msg = {"MessageType": "SelectionStatusChanged", "ProductId": pid, "SelectionId": f"{pid}-S{rng.randint(1, 14)}", "Status": "NonRunner"}
+        elif r < 0.98:
+            msg = {"MessageType": "ProductStatusChanged", "ProductId": pid, "Status": rng.choice(["OPEN", "CLOSED"])}
+        else:
+            msg = {"MessageType": "EventStatusChanged", "EventId": f"E{pid}", "Status": "Off"}
+        yield ts, json.dumps(msg)
+
+
+async def _serve(frames: List[Frame], speed: float, done: asyncio.Event, sent: Dict[str, float]):
+    async def handler(ws, path=None):
+        if sent.get("started"):
+            # Reconnects after the stream finished just idle until shutdown
+            await done.wait()
+            return
+        sent["started"] = time.perf_counter()
+        base_t = frames[0][0] if frames else 0
+        for i, (t, raw) in enumerate(frames):
+            if speed > 0:
+                due = sent["started"] + (t - base_t) / 1000.0 / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await ws.send(raw)
+            if speed <= 0 and i % 500 == 0:
+                await asyncio.sleep(0)
+        sent["finished"] = time.perf_counter()
+        sent["frames"] = len(frames)
+        await done.wait()
+
+    return await websockets.serve(handler, "127.0.0.1", 0, max_size=None)
+
+
+async def run(frames: List[Frame], speed: float, sink: LocalSink, timeout: float) -> Dict[str, Any]:
+    done = asyncio.Event()
+    sub_stop = asyncio.Event()
+    sent: Dict[str, float] = {}
+    server = await _serve(frames, speed, done, sent)
+    port = server.sockets[0].getsockname()[1]
+    message_stats.reset()
+    max_depth = 0
+
+    sub = asyncio.create_task(_subscribe_pools(f"ws://127.0.0.1:{port}/", sink, stop=sub_stop))
+    t_start = time.perf_counter()
+    last_count, last_change = -1, time.perf_counter()
+    while time.perf_counter() - t_start < timeout:
+        await asyncio.sleep(0.1)
+        pstats = sink_pipeline_stats().get("tote_subscriber") or {}
+        max_depth = max(max_depth, int(pstats.get("queue_depth") or 0))
+        count = message_stats.messages
+        if count != last_count:
+            last_count, last_change = count, time.perf_counter()
+        if "finished" in sent and time.perf_counter() - last_change > 0.5:
+            break
+    processed_at = last_change
+    sub_stop.set()
+    done.set()
+    server.close()
+    await server.wait_closed()
+    t_close = time.perf_counter()
+    try:
+        await asyncio.wait_for(sub, timeout=60)
+    except Exception:
+        sub.cancel()
+    close_s = time.perf_counter() - t_close
+
+    msg = message_stats.stats()
+    pstats = sink_pipeline_stats().get("tote_subscriber") or {}
+    started = sent.get("started", t_start)
+    elapsed = max(1e-9, processed_at - started)
+    return {
+        "frames": len(frames),
+        "speed": "max" if speed <= 0 else speed,
+        "send_s": round(sent.get("finished", processed_at) - started, 3),
+        "processed": msg["messages"],
+        "process_s": round(elapsed, 3),
+        "messages_per_s": round(msg["messages"] / elapsed, 1),
+        "latency_ms": msg["latency_ms"],
+        "by_type": msg["by_type"],
+        "max_queue_depth": max_depth,
+        "shutdown_flush_s": round(close_s, 3),
+        "sink_tables": {
+            t: {k: v for k, v in st.items() if k.startswith("flush_ms") or k.startswith("rows_") or k == "flushes"}
+            for t, st in (pstats.get("tables") or {}).items()
+        },
+        "snapshot_coalescing": pstats.get("snapshot_coalescing"),
+        "sink_rows": dict(sink.rows),
+        "sink_calls": dict(sink.calls),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Load-test the Tote pool subscriber with a local WebSocket replay")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--stream", help="Tap file recorded with TOTE_WS_TAP (.jsonl or .jsonl.gz)")
+    src.add_argument("--synthetic", type=int, help="Generate this many synthetic messages")
+    ap.add_argument("--products", type=int, default=200, help="Products in the synthetic stream")
+    ap.add_argument("--rate", type=float, default=200.0, help="Synthetic messages per second at 1x")
+    ap.add_argument("--speed", default="1", help="Replay speed multiple (1, 10, ...) or 'max'")
+    ap.add_argument("--sink-latency-ms", type=float, default=0.0, help="Simulated latency per sink write")
+    ap.add_argument("--timeout", type=float, default=600.0, help="Give up after this many seconds")
+    args = ap.parse_args()
+
+    speed = 0.0 if str(args.speed).lower() == "max" else float(args.speed)
+    frames = load_stream(args.stream) if args.stream else list(synthetic_stream(args.synthetic, args.products, args.rate))
+    if not frames:
+        print("No frames to replay")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Empty cassette: any HTTP fallback misses immediately instead of touching the network
+        empty = os.path.join(tmp, "empty.jsonl.gz")
+        with gzip.open(empty, "wt", encoding="utf-8"):
+            pass
+        set_default_cassette(ToteCassette(empty, "replay"))
+        report = asyncio.run(run(frames, speed, LocalSink(args.sink_latency_ms / 1000.0), args.timeout))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
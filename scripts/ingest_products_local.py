@@ -5,6 +5,8 @@ from __future__ import annotations
 Usage:
   python autobet/scripts/ingest_products_local.py --date YYYY-MM-DD --status OPEN --first 400 --bet-types SUPERFECTA,WIN
   Repeat with --after cursor to page; or use --pages N to auto paginate.
+  python autobet/scripts/ingest_products_local.py --product-ids ID1,ID2,...
+  (fetches the listed products concurrently over the async Tote client)
 """
 
 import argparse
@@ -69,18 +71,27 @@ query GetRacingNextOff($sport: Sport!, $date: String!, $limit: Int) {
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Direct Tote products ingest to BigQuery")
-    ap.add_argument("--date", required=True)
+    ap.add_argument("--date")
     ap.add_argument("--status", default="OPEN")
     ap.add_argument("--first", type=int, default=500)
     ap.add_argument("--bet-types", default="", help="Comma-separated bet types. Empty = ALL")
     ap.add_argument("--pages", type=int, default=0, help="Pages to fetch. 0 = until hasNextPage=false")
+    ap.add_argument("--product-ids", default="", help="Comma-separated product IDs to fetch directly (ignores --date)")
     args = ap.parse_args()
+    product_ids = [s.strip() for s in (args.product_ids or '').split(',') if s.strip()]
+    if not args.date and not product_ids:
+        ap.error("--date is required unless --product-ids is given")
 
     sink = get_bq_sink()
     if not sink:
         raise SystemExit("BigQuery not configured. Ensure BQ_WRITE_ENABLED=true and BQ_PROJECT/BQ_DATASET envs are set.")
     client = ToteClient()
 
+    if product_ids:
+        count = ingest_products(sink, client, None, None, len(product_ids), None, product_ids=product_ids)
+        print(f"Inserted/updated products: {count}")
+        return
+
     bet_types = [s.strip().upper() for s in (args.bet_types or '').split(',') if s.strip()]
     variables = {"date": args.date, "status": args.status, "first": args.first}
     if bet_types:
@@ -4,12 +4,14 @@ Usage:
   python autobet/scripts/ingest_tote_range.py --from 2022-01-01 --to 2025-09-05 \
     --bet-types WIN,PLACE,EXACTA,TRIFECTA,SUPERFECTA --first 400
 
-This runs OPEN then CLOSED for each day in the range.
+This runs OPEN and CLOSED for each day in the range on a worker pool (see
+sports.backfill). Completed (date, status, bet types) units are recorded in
+the --checkpoint file, so an interrupted run resumes where it stopped.
 """
 from __future__ import annotations
 
 import argparse
-from datetime import date, timedelta
+from datetime import date
 from pathlib import Path
 import sys
 
@@ -17,16 +19,7 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from sports.db import get_db
-from sports.providers.tote_api import ToteClient
-from sports.ingest.tote_products import ingest_products
-
-
-def daterange(d0: date, d1: date):
-    cur = d0
-    while cur <= d1:
-        yield cur
-        cur = cur + timedelta(days=1)
+from sports.backfill import backfill_range
 
 
 def main() -> None:
@@ -35,6 +28,9 @@ def main() -> None:
     ap.add_argument("--to", dest="date_to", required=True, help="YYYY-MM-DD")
     ap.add_argument("--bet-types", default="WIN,PLACE,EXACTA,TRIFECTA,SUPERFECTA")
     ap.add_argument("--first", type=int, default=400)
+    ap.add_argument("--statuses", default="OPEN,CLOSED")
+    ap.add_argument("--workers", type=int, default=None, help="Default: Tote limiter concurrency ceiling")
+    ap.add_argument("--checkpoint", default=None, help="Default: data/tote_range_<from>_<to>.jsonl")
     args = ap.parse_args()
 
     d0 = date.fromisoformat(args.date_from)
@@ -43,29 +39,12 @@ def main() -> None:
         raise SystemExit("--to must be >= --from")
 
     bet_types = [s.strip().upper() for s in (args.bet_types or '').split(',') if s.strip()]
-    db = get_db(); client = ToteClient()
+    statuses = [s.strip().upper() for s in (args.statuses or '').split(',') if s.strip()]
+    checkpoint = args.checkpoint or f"data/tote_range_{d0.isoformat()}_{d1.isoformat()}.jsonl"
 
-    total = 0
-    for cur in daterange(d0, d1):
-        ds = cur.isoformat()
-        print(f"[Ingest Range] {ds} OPEN...")
-        try:
-            n_open = ingest_products(db, client, date_iso=ds, status="OPEN", first=args.first, bet_types=bet_types)
-        except Exception as e:
-            print(f"[Ingest Range] {ds} OPEN ERROR: {e}")
-            n_open = 0
-        print(f"[Ingest Range] {ds} CLOSED...")
-        try:
-            n_closed = ingest_products(db, client, date_iso=ds, status="CLOSED", first=args.first, bet_types=bet_types)
-        except Exception as e:
-            print(f"[Ingest Range] {ds} CLOSED ERROR: {e}")
-            n_closed = 0
-        day_total = n_open + n_closed
-        print(f"[Ingest Range] {ds} total={day_total}")
-        total += day_total
-    print(f"Done. Total rows: {total}")
+    res = backfill_range(d0, d1, bet_types, statuses=statuses, workers=args.workers, checkpoint_path=checkpoint, first=args.first)
+    print(f"Done. Total rows: {res.get('rows', 0)} (units ok={res.get('ok')} failed={res.get('failed')} skipped={res.get('skipped')})")
 
 
 if __name__ == "__main__":
     main()
-
@@ -1,10 +1,15 @@
 import argparse
+import json
 import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
-# This script assumes it's run from a context where the `autobet` package is available.
-# Example from project root: python -m autobet.sports.backfill --start 2023-01-01
+# Run from the project root: python -m sports.backfill --start 2023-01-01
+# Kill it at any time; re-running with the same --checkpoint resumes where it stopped.
 
 # Set environment variables if not already set, for local runs
 if 'BQ_PROJECT' not in os.environ:
@@ -12,16 +17,135 @@ if 'BQ_PROJECT' not in os.environ:
 if 'BQ_DATASET' not in os.environ:
     os.environ['BQ_DATASET'] = 'autobet'
 
-# These imports are based on the structure seen in webapp.py
-from autobet.sports.providers.tote_api import ToteClient
-from autobet.sports.ingest.tote_products import ingest_products
-from autobet.sports.db import get_db
+from .providers.tote_api import ToteClient, limiter_stats
+from .ingest.tote_products import ingest_products
+from .db import get_db
 
+# A unit of work: (date_iso, status, bet_type); bet_type "ALL" means no bet type filter
+Unit = Tuple[str, str, str]
 
-def backfill_range(start_date: date, end_date: date, bet_types: list[str]):
+DEFAULT_CHECKPOINT = os.getenv("BACKFILL_CHECKPOINT", "data/backfill_checkpoint.jsonl")
+
+
+def _unit_key(unit: Unit) -> str:
+    return "|".join(unit)
+
+
+class BackfillCheckpoint:
+    """Append-only JSON-lines record of completed units.
+
+    A unit is written only after its ingest returned, and each line is
+    flushed and fsynced, so a killed run loses at most the units in flight.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: Set[str] = set()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except Exception:
+                        continue  # partial last line from a kill
+                    if rec.get("ok"):
+                        self.done.add(rec.get("unit"))
+
+    def is_done(self, unit: Unit) -> bool:
+        return _unit_key(unit) in self.done
+
+    def mark(self, unit: Unit, *, ok: bool, rows: int = 0, error: Optional[str] = None, attempts: int = 1) -> None:
+        rec = {
+            "unit": _unit_key(unit),
+            "ok": ok,
+            "rows": rows,
+            "attempts": attempts,
+            "error": error,
+            "ts": int(time.time()),
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if ok:
+                self.done.add(rec["unit"])
+
+
+def plan_units(start_date: date, end_date: date, statuses: List[str], bet_types: List[str], *, split_bet_types: bool = False) -> List[Unit]:
+    """Expand a range into units, newest day first so recent data lands early."""
+    types = list(bet_types) if (split_bet_types and bet_types) else [",".join(bet_types) if bet_types else "ALL"]
+    units: List[Unit] = []
+    cur = end_date
+    while cur >= start_date:
+        for status in statuses:
+            for bt in types:
+                units.append((cur.isoformat(), status, bt))
+        cur -= timedelta(days=1)
+    return units
+
+
+class _Progress:
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.rows = 0
+        self.t0 = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, ok: bool, rows: int) -> str:
+        with self._lock:
+            if ok:
+                self.done += 1
+                self.rows += rows
+            else:
+                self.failed += 1
+            finished = self.done + self.failed
+            elapsed = time.monotonic() - self.t0
+            rate = finished / elapsed if elapsed > 0 else 0.0
+            eta = (self.total - finished) / rate if rate > 0 else 0.0
+            return (f"[{finished}/{self.total}] ok={self.done} failed={self.failed} rows={self.rows} "
+                    f"{rate * 60:.1f} units/min ETA {timedelta(seconds=int(eta))}")
+
+
+def _run_unit(unit: Unit, ingest: Callable[[Unit], int], max_attempts: int, base_delay: float) -> Tuple[bool, int, Optional[str], int]:
+    last_err: Optional[str] = None
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return True, int(ingest(unit) or 0), None, attempt
+        except Exception as e:
+            last_err = str(e)
+            if attempt < max_attempts:
+                delay = min(300.0, base_delay * (2 ** (attempt - 1)))
+                time.sleep(delay * random.uniform(0.5, 1.5))
+    return False, 0, last_err, max_attempts
+
+
+def backfill_range(
+    start_date: date,
+    end_date: date,
+    bet_types: list[str],
+    *,
+    statuses: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+    first: int = 1000,
+    max_attempts: int = 4,
+    retry_delay: float = 5.0,
+    split_bet_types: bool = False,
+) -> Dict[str, Any]:
     """
-    Iterates through a date range and ingests historical data for each day.
+    Ingest historical products for a date range on a worker pool, resumably.
+
+    Units already recorded in the checkpoint are skipped. Workers default to
+    the Tote limiter's concurrency ceiling; the shared limiter still paces
+    the actual requests, so extra workers only queue on it.
     """
+    statuses = statuses or ["CLOSED"]
     print(f"Starting backfill from {start_date.isoformat()} to {end_date.isoformat()}...")
 
     try:
@@ -29,42 +153,46 @@ def backfill_range(start_date: date, end_date: date, bet_types: list[str]):
         sink = get_db()
         if not sink or not sink.enabled:
             print("BigQuery sink is not configured. Aborting.")
-            return
+            return {"ok": 0, "failed": 0, "skipped": 0}
     except Exception as e:
         print(f"Failed to initialize clients: {e}")
-        return
-
-    current_date = start_date
-    while current_date <= end_date:
-        date_iso = current_date.isoformat()
-        print(f"--- Processing {date_iso} ---")
-
-        try:
-            # Ingest products. For historical data, we want 'CLOSED' status.
-            # The 'RESULTED' status is not a valid filter for the Tote API's product query;
-            # 'CLOSED' is the correct status for products that are no longer open for betting.
-            print(f"  Ingesting 'CLOSED' products for {date_iso}...")
-            ingest_products(
-                sink,
-                client,
-                date_iso=date_iso,
-                status="CLOSED",
-                first=1000,  # Fetch a large number to get all products for the day
-                # Pass None if list is empty, which the ingestor should interpret as "all types".
-                bet_types=(bet_types or None)
-            )
-
-            print(f"  Successfully processed {date_iso}.")
-
-        except Exception as e:
-            print(f"  [ERROR] Failed to process {date_iso}: {e}")
-
-        # Move to the next day
-        current_date += timedelta(days=1)
-        # Be a good citizen and don't hammer the API
-        time.sleep(2)
-
-    print("Backfill complete.")
+        return {"ok": 0, "failed": 0, "skipped": 0}
+
+    checkpoint = BackfillCheckpoint(checkpoint_path)
+    units = plan_units(start_date, end_date, statuses, bet_types, split_bet_types=split_bet_types)
+    todo = [u for u in units if not checkpoint.is_done(u)]
+    skipped = len(units) - len(todo)
+    n_workers = max(1, int(workers or limiter_stats().get("concurrency_max") or 4))
+    print(f"{len(units)} units, {skipped} already done (checkpoint {checkpoint_path}), {len(todo)} to run on {n_workers} workers")
+
+    def _ingest(unit: Unit) -> int:
+        date_iso, status, bt = unit
+        # Closed products for past days are the historical record; 'RESULTED' is not a valid filter
+        return ingest_products(
+            sink,
+            client,
+            date_iso=date_iso,
+            status=status,
+            first=first,
+            bet_types=(None if bt == "ALL" else bt.split(",")),
+            raise_errors=True,
+        )
+
+    progress = _Progress(len(todo))
+    with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="backfill") as pool:
+        futures = {pool.submit(_run_unit, u, _ingest, max_attempts, retry_delay): u for u in todo}
+        for fut in as_completed(futures):
+            unit = futures[fut]
+            ok, rows, err, attempts = fut.result()
+            checkpoint.mark(unit, ok=ok, rows=rows, error=err, attempts=attempts)
+            line = progress.update(ok, rows)
+            if ok:
+                print(f"  {_unit_key(unit)}: {rows} rows {line}")
+            else:
+                print(f"  [ERROR] {_unit_key(unit)} failed after {attempts} attempts: {err} {line}")
+
+    print("Backfill complete." if not progress.failed else f"Backfill finished with {progress.failed} failed units; re-run to retry them.")
+    return {"ok": progress.done, "failed": progress.failed, "skipped": skipped, "rows": progress.rows}
 
 
 if __name__ == "__main__":
@@ -72,6 +200,12 @@ if __name__ == "__main__":
     parser.add_argument("--start", required=True, help="Start date for backfill in YYYY-MM-DD format.")
     parser.add_argument("--end", default=date.today().isoformat(), help="End date for backfill in YYYY-MM-DD format (defaults to today).")
     parser.add_argument("--types", default="WIN,PLACE,EXACTA,TRIFECTA,SUPERFECTA", help="Comma-separated bet types to ingest.")
+    parser.add_argument("--statuses", default="CLOSED", help="Comma-separated selling statuses (e.g. OPEN,CLOSED).")
+    parser.add_argument("--split-types", action="store_true", help="One unit per bet type instead of one per day/status.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker threads (default: Tote limiter concurrency ceiling).")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Checkpoint file recording completed units.")
+    parser.add_argument("--first", type=int, default=1000, help="GraphQL page size.")
+    parser.add_argument("--max-attempts", type=int, default=4, help="Attempts per unit before it is recorded as failed.")
     args = parser.parse_args()
 
     try:
@@ -84,5 +218,16 @@ if __name__ == "__main__":
         exit(1)
 
     bet_types_list = [s.strip().upper() for s in (args.types or '').split(',') if s.strip()]
-
-    backfill_range(start_dt, end_dt, bet_types_list)
\ No newline at end of file
+    statuses_list = [s.strip().upper() for s in (args.statuses or '').split(',') if s.strip()]
+
+    backfill_range(
+        start_dt,
+        end_dt,
+        bet_types_list,
+        statuses=statuses_list,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        first=args.first,
+        max_attempts=args.max_attempts,
+        split_bet_types=args.split_types,
+    )
@@ -3,6 +3,7 @@ from __future__ import annotations
 import os
 import json
 import threading
+import time
 from typing import Iterable, Mapping, Any, Optional
 
 from .config import cfg
@@ -74,7 +75,7 @@ class BigQuerySink:
         
         quota_manager = get_quota_manager()
         
-        @exponential_backoff_with_jitter(base_delay=2.0, max_delay=60.0, max_retries=3)
+        @exponential_backoff_with_jitter(base_delay=2.0, max_delay=60.0, max_retries=3, dependency="bigquery")
         def _execute_query():
             # Check quota before executing
             if not quota_manager.can_execute_query():
@@ -265,6 +266,10 @@ class BigQuerySink:
 
     # --- table-specific upserts ---
     def upsert_tote_products(self, rows: Iterable[Mapping[str, Any]]):
+        # updated_ts (ms) lets readers such as the pool subscriber's context cache load incrementally
+        now_ms = int(time.time() * 1000)
+        rows = [dict(r, updated_ts=now_ms) for r in rows]
+        self._ensure_columns("tote_products", {"updated_ts": "INT64"})
         temp = self._load_to_temp(
             "tote_products",
             rows,
@@ -273,6 +278,7 @@ class BigQuerySink:
                 "total_net": "FLOAT64",
                 "rollover": "FLOAT64",
                 "deduction_rate": "FLOAT64",
+                "updated_ts": "INT64",
             })
         if not temp:
             return
@@ -292,6 +298,7 @@ class BigQuerySink:
                 "venue=S.venue",
                 "start_iso=S.start_iso",
                 "source=S.source",
+                "updated_ts=S.updated_ts",
             ]))
 
     def upsert_tote_product_dividends(self, rows: Iterable[Mapping[str, Any]]):
@@ -450,7 +457,7 @@ class BigQuerySink:
         
         quota_manager = get_quota_manager()
         
-        @exponential_backoff_with_jitter(base_delay=1.0, max_delay=30.0, max_retries=3)
+        @exponential_backoff_with_jitter(base_delay=1.0, max_delay=30.0, max_retries=3, dependency="bigquery")
         def _execute_insert():
             # Check quota before executing
             if not quota_manager.can_execute_insert():
@@ -635,6 +642,29 @@ class BigQuerySink:
                 "country=S.country",
             ]))
 
+    def upsert_matches(self, rows: Iterable[Mapping[str, Any]]):
+        """Merge historical match results (football/cricket CSV imports) keyed by match_id."""
+        temp = self._load_to_temp("matches", rows, schema_hint={
+            "match_id": "STRING",
+            "season": "STRING",
+            "fthg": "INT64",
+            "ftag": "INT64",
+        })
+        if not temp:
+            return
+        self._merge(
+            "matches",
+            temp,
+            key_expr="T.match_id=S.match_id",
+            update_set=",".join([
+                "comp=S.comp",
+                "season=S.season",
+                "fthg=S.fthg",
+                "ftag=S.ftag",
+                "ftr=S.ftr",
+                "source=S.source",
+            ]))
+
     def upsert_race_conditions(self, rows: Iterable[Mapping[str, Any]]):
         temp = self._load_to_temp("race_conditions", rows, schema_hint={
             "weather_temp_c": "FLOAT64",
@@ -758,7 +788,10 @@ class BigQuerySink:
         """Append/merge raw probable odds payloads.
 
         Expected row keys: raw_id (str), fetched_ts (INT64 or STRING ISO), payload (STRING), product_id (STRING)
+        and, when the full payload was stored in GCS, gcs_uri (STRING), payload_bytes / gzip_bytes (INT64)
         """
+        pointer_cols = {"gcs_uri": "STRING", "payload_bytes": "INT64", "gzip_bytes": "INT64"}
+        rows = [{**{c: None for c in pointer_cols}, **dict(r)} for r in rows]
         temp = self._load_to_temp(
             "raw_tote_probable_odds",
             rows,
@@ -766,11 +799,12 @@ class BigQuerySink:
                 "fetched_ts": "INT64",
                 "product_id": "STRING",
                 "raw_id": "STRING",
+                **pointer_cols,
             })
         if not temp:
             return
         # Ensure required columns exist on destination
-        self._ensure_columns("raw_tote_probable_odds", {"raw_id": "STRING", "product_id": "STRING"})
+        self._ensure_columns("raw_tote_probable_odds", {"raw_id": "STRING", "product_id": "STRING", **pointer_cols})
         self._merge(
             "raw_tote_probable_odds",
             temp,
@@ -779,6 +813,9 @@ class BigQuerySink:
                 "fetched_ts=S.fetched_ts",
                 "payload=S.payload",
                 "product_id=S.product_id",
+                "gcs_uri=S.gcs_uri",
+                "payload_bytes=S.payload_bytes",
+                "gzip_bytes=S.gzip_bytes",
             ]))
 
     def upsert_ingest_job_runs(self, rows: Iterable[Mapping[str, Any]]):
@@ -886,7 +923,10 @@ class BigQuerySink:
         CREATE TABLE IF NOT EXISTS `{ds}.raw_tote_probable_odds`(
           fetched_ts INT64,
           payload STRING,
-          product_id STRING
+          product_id STRING,
+          gcs_uri STRING,
+          payload_bytes INT64,
+          gzip_bytes INT64
         );
         CREATE TABLE IF NOT EXISTS `{ds}.tote_event_results_log`(
           event_id STRING,
@@ -90,4 +90,79 @@ class Config:
     superfecta_auto_place_ready: bool = os.getenv("SUPERFECTA_AUTO_PLACE_READY", "false").lower() in ("1", "true", "yes", "on")
     superfecta_monitor_hours_ahead: int = int(os.getenv("SUPERFECTA_MONITOR_HOURS_AHEAD", "6"))
 
+    # --- Tote pool subscriber (sports/providers/tote_subscriptions.py) ---
+    # HTTP fallback results are reused this long; at most N fallback fetches at once.
+    tote_sub_http_cache_ms: float = float(os.getenv("TOTE_SUB_HTTP_CACHE_MS", "1500"))
+    tote_sub_http_concurrency: int = int(os.getenv("TOTE_SUB_HTTP_CONCURRENCY", "4"))
+    # Async message handlers (those with an HTTP fallback) running at once.
+    tote_sub_handler_tasks: int = int(os.getenv("TOTE_SUB_HANDLER_TASKS", "256"))
+    # Per-table BigQuery flush pipelines (sink_pipeline.py). More than one
+    # in-flight write per table may reorder MERGEs.
+    tote_sub_flush_workers: int = int(os.getenv("TOTE_SUB_FLUSH_WORKERS", "4"))
+    tote_sub_flush_inflight: int = int(os.getenv("TOTE_SUB_FLUSH_INFLIGHT", "1"))
+    tote_sub_flush_interval_ms: int = int(os.getenv("TOTE_SUB_FLUSH_INTERVAL_MS", "400"))
+    tote_sub_flush_max_batch: int = int(os.getenv("TOTE_SUB_FLUSH_MAX_BATCH", "1000"))
+    tote_sub_flush_max_pending: int = int(os.getenv("TOTE_SUB_FLUSH_MAX_PENDING", "20000"))
+    # Spool mode: non-transient failures of a batch before its bad rows are isolated and dead-lettered
+    tote_sub_flush_max_attempts: int = int(os.getenv("TOTE_SUB_FLUSH_MAX_ATTEMPTS", "5"))
+    # Disk spool for at-least-once flushing; empty keeps rows in memory.
+    tote_sub_spool_dir: str = os.getenv("TOTE_SUB_SPOOL_DIR", "").strip()
+    tote_sub_spool_segment_mb: int = int(os.getenv("TOTE_SUB_SPOOL_SEGMENT_MB", "64"))
+    tote_sub_spool_sync_ms: int = int(os.getenv("TOTE_SUB_SPOOL_SYNC_MS", "1000"))
+    # Pool snapshot coalescing (snapshot_coalesce.py); a 0 window disables it.
+    tote_snapshot_window_ms: float = float(os.getenv("TOTE_SNAPSHOT_WINDOW_MS", "1000"))
+    tote_snapshot_min_change: float = float(os.getenv("TOTE_SNAPSHOT_MIN_CHANGE", "0.5"))
+    tote_snapshot_min_change_pct: float = float(os.getenv("TOTE_SNAPSHOT_MIN_CHANGE_PCT", "0.05"))
+    tote_snapshot_near_off_s: float = float(os.getenv("TOTE_SNAPSHOT_NEAR_OFF_S", "60"))
+    # Product context cache (product_context.py)
+    tote_ctx_refresh_s: float = float(os.getenv("TOTE_CTX_REFRESH_S", "15"))
+    tote_ctx_evict_after_s: float = float(os.getenv("TOTE_CTX_EVICT_AFTER_S", "10800"))
+    tote_ctx_negative_ttl_s: float = float(os.getenv("TOTE_CTX_NEGATIVE_TTL_S", "60"))
+    tote_ctx_overlap_s: float = float(os.getenv("TOTE_CTX_OVERLAP_S", "120"))
+
+    # --- Tote products ingest (sports/ingest/tote_products.py) ---
+    # Products per normalize/upsert batch when streaming a day's products
+    tote_products_stream_batch: int = max(1, int(os.getenv("TOTE_PRODUCTS_STREAM_BATCH", "200") or 200))
+    # GCS bucket for raw product payloads (gzip JSON); when set it is the raw store and
+    # raw_tote_probable_odds keeps a pointer plus the odds lines its view reads
+    tote_raw_bucket: str = (os.getenv("TOTE_RAW_BUCKET") or "").strip()
+
+    # --- Ingest row de-duplication (sports/ingest/row_fingerprints.py) ---
+    tote_row_dedup: bool = os.getenv("TOTE_ROW_DEDUP", "true").lower() in ("1", "true", "yes", "on")
+    tote_row_dedup_max: int = int(os.getenv("TOTE_ROW_DEDUP_MAX", "200000"))
+    tote_row_dedup_ttl_s: int = int(os.getenv("TOTE_ROW_DEDUP_TTL_S", str(7 * 86400)))
+
+    # --- Pub/Sub ---
+    # Shared publisher batching (sports/gcp.py)
+    pubsub_batch_max_messages: int = int(os.getenv("PUBSUB_BATCH_MAX_MESSAGES", "100"))
+    pubsub_batch_max_bytes: int = int(os.getenv("PUBSUB_BATCH_MAX_BYTES", "1000000"))
+    pubsub_batch_max_latency_ms: float = float(os.getenv("PUBSUB_BATCH_MAX_LATENCY_MS", "10"))
+    # Streaming-pull consumer (sports/pubsub_consumer.py): flow control per
+    # subscription, shared callback threads, and micro-batching onto the bus.
+    pubsub_max_messages: int = int(os.getenv("PUBSUB_MAX_MESSAGES", "1000"))
+    pubsub_max_bytes: int = int(os.getenv("PUBSUB_MAX_BYTES", str(64 << 20)))
+    pubsub_callback_workers: int = int(os.getenv("PUBSUB_CALLBACK_WORKERS", "8"))
+    pubsub_bus_batch_ms: int = int(os.getenv("PUBSUB_BUS_BATCH_MS", "50"))
+    pubsub_bus_batch_max: int = int(os.getenv("PUBSUB_BUS_BATCH_MAX", "500"))
+
+    # --- Realtime event bus (sports/realtime.py, sports/realtime_redis.py) ---
+    # "redis" shares events across instances through a Redis stream.
+    realtime_bus: str = os.getenv("REALTIME_BUS", "").strip().lower()
+    # Falls back to redis_url when empty.
+    realtime_redis_url: str = os.getenv("REALTIME_REDIS_URL", "")
+    realtime_redis_stream: str = os.getenv("REALTIME_REDIS_STREAM", "autobet:events")
+    realtime_redis_maxlen: int = int(os.getenv("REALTIME_REDIS_MAXLEN", "10000"))
+    # Also trim entries older than this; 0 trims by count only.
+    realtime_redis_retention_s: float = float(os.getenv("REALTIME_REDIS_RETENTION_S", "0"))
+    # A new instance starts reading this far back; 0 reads only new entries.
+    realtime_redis_catchup_s: float = float(os.getenv("REALTIME_REDIS_CATCHUP_S", "0"))
+
+    # --- SSE / WebSocket fan-out (sports/sse_service.py) ---
+    sse_replay_events: int = int(os.getenv("SSE_REPLAY_EVENTS", "5000"))
+    sse_client_queue: int = int(os.getenv("SSE_CLIENT_QUEUE", "2048"))
+    sse_keepalive_s: int = int(os.getenv("SSE_KEEPALIVE_S", "25"))
+    sse_cors_origin: str = os.getenv("SSE_CORS_ORIGIN", "*")
+    # Feed of the standalone app: "pubsub" or "bus" (the webapp always uses its bus).
+    sse_feed: str = os.getenv("SSE_FEED", "pubsub").strip().lower()
+
 cfg = Config()
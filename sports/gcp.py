@@ -7,13 +7,17 @@ from __future__ import annotations
 
 import base64
 import json
-from typing import Dict, Any
+import threading
+from concurrent import futures
+from typing import Dict, Any, Iterable, List, Tuple
 
 import os
 import json
 from google.cloud import pubsub_v1, storage
 from typing import Optional
 
+from .config import cfg
+
 _VALID_GOOGLE_CRED_TYPES = {"service_account", "authorized_user"}
 
 def _is_valid_google_credentials_file(path: str) -> bool:
@@ -71,15 +75,113 @@ def _load_gcp_credentials():
     return None
 
 
+# Process-wide publisher: one client (credentials loaded once) whose batching
+# turns bursts of publishes into a few RPCs (batch limits: cfg.pubsub_batch_*).
+_publisher: Optional[pubsub_v1.PublisherClient] = None
+_publisher_lock = threading.Lock()
+_topic_paths: Dict[Tuple[str, str], str] = {}
+_publish_stats = {"published": 0, "failed": 0, "pending": 0}
+_stats_lock = threading.Lock()
+
+
+def get_publisher() -> pubsub_v1.PublisherClient:
+    """Shared PublisherClient with batch settings and message ordering enabled."""
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                sanitize_adc_env()
+                creds = _load_gcp_credentials()
+                batch = pubsub_v1.types.BatchSettings(
+                    max_messages=max(1, cfg.pubsub_batch_max_messages),
+                    max_bytes=max(1024, cfg.pubsub_batch_max_bytes),
+                    max_latency=max(0.0, cfg.pubsub_batch_max_latency_ms) / 1000.0,
+                )
+                options = pubsub_v1.types.PublisherOptions(enable_message_ordering=True)
+                kwargs: Dict[str, Any] = {"batch_settings": batch, "publisher_options": options}
+                if creds:
+                    kwargs["credentials"] = creds
+                _publisher = pubsub_v1.PublisherClient(**kwargs)
+    return _publisher
+
+
+def pubsub_topic_path(project_id: str, topic_id: str) -> str:
+    key = (project_id, topic_id)
+    path = _topic_paths.get(key)
+    if path is None:
+        path = _topic_paths[key] = pubsub_v1.PublisherClient.topic_path(project_id, topic_id)
+    return path
+
+
+def publish_pubsub_message_async(
+    project_id: str,
+    topic_id: str,
+    payload: Dict[str, Any],
+    *,
+    ordering_key: Optional[str] = None,
+    **attributes: str,
+) -> futures.Future:
+    """Queue a JSON payload on the shared publisher and return its future (resolves to the message ID).
+
+    Messages sharing an ``ordering_key`` (e.g. a product_id) are delivered in
+    publish order to subscriptions with ordering enabled.
+    """
+    publisher = get_publisher()
+    topic_path = pubsub_topic_path(project_id, topic_id)
+    data = json.dumps(payload, default=str).encode("utf-8")
+    fut = publisher.publish(topic_path, data, ordering_key=ordering_key or "", **attributes)
+    with _stats_lock:
+        _publish_stats["pending"] += 1
+
+    def _done(f) -> None:
+        ok = f.exception() is None
+        with _stats_lock:
+            _publish_stats["pending"] -= 1
+            _publish_stats["published" if ok else "failed"] += 1
+        if not ok and ordering_key:
+            # A failed publish pauses its ordering key until resumed
+            try:
+                publisher.resume_publish(topic_path, ordering_key)
+            except Exception:
+                pass
+
+    fut.add_done_callback(_done)
+    return fut
+
+
+def wait_pubsub_futures(pending: Iterable[futures.Future], timeout: Optional[float] = 60.0) -> List[str]:
+    """Wait for publish futures together; return message IDs or raise the first failure."""
+    pending = list(pending)
+    done, not_done = futures.wait(pending, timeout=timeout)
+    if not_done:
+        raise TimeoutError(f"{len(not_done)} of {len(pending)} Pub/Sub publishes did not complete in {timeout}s")
+    errors = [f.exception() for f in pending if f.exception() is not None]
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(pending)} Pub/Sub publishes failed: {errors[0]}") from errors[0]
+    return [f.result() for f in pending]
+
+
+def publish_pubsub_messages(
+    project_id: str,
+    topic_id: str,
+    payloads: Iterable[Dict[str, Any]],
+    *,
+    timeout: Optional[float] = 60.0,
+) -> List[str]:
+    """Publish many JSON payloads in batches and wait for all of them once."""
+    return wait_pubsub_futures(
+        [publish_pubsub_message_async(project_id, topic_id, p) for p in payloads],
+        timeout=timeout,
+    )
+
+
 def publish_pubsub_message(project_id: str, topic_id: str, payload: Dict[str, Any]) -> str:
     """Publish a JSON payload to a Pub/Sub topic and return the message ID."""
-    sanitize_adc_env()
-    creds = _load_gcp_credentials()
-    publisher = pubsub_v1.PublisherClient(credentials=creds) if creds else pubsub_v1.PublisherClient()
-    topic_path = publisher.topic_path(project_id, topic_id)
-    data = json.dumps(payload).encode("utf-8")
-    future = publisher.publish(topic_path, data)
-    return future.result()
+    return publish_pubsub_message_async(project_id, topic_id, payload).result()
+
+
+def publisher_stats() -> Dict[str, Any]:
+    return {**_publish_stats, "topics": len(_topic_paths), "client": _publisher is not None}
 
 
 def parse_pubsub_envelope(envelope: Dict[str, Any]) -> Dict[str, Any]:
@@ -102,3 +204,15 @@ def upload_text_to_bucket(bucket_name: str, destination_blob: str, text: str) ->
     bucket = client.bucket(bucket_name)
     blob = bucket.blob(destination_blob)
     blob.upload_from_string(text)
+
+
+def upload_bytes_to_bucket(bucket_name: str, destination_blob: str, data: bytes, *, content_type: str = "application/octet-stream", content_encoding: Optional[str] = None) -> None:
+    """Upload raw bytes (e.g. a gzip-compressed payload) to a Cloud Storage bucket."""
+    sanitize_adc_env()
+    creds = _load_gcp_credentials()
+    client = storage.Client(credentials=creds) if creds else storage.Client()
+    bucket = client.bucket(bucket_name)
+    blob = bucket.blob(destination_blob)
+    if content_encoding:
+        blob.content_encoding = content_encoding
+    blob.upload_from_string(data, content_type=content_type)
@@ -12,11 +12,12 @@ import requests
 import time
 import json
 import traceback
+from concurrent.futures import wait as futures_wait
 from flask import Flask, request
 from google.cloud import bigquery
 
 import pandas as pd
-from .gcp import parse_pubsub_envelope, publish_pubsub_message
+from .gcp import parse_pubsub_envelope, publish_pubsub_message_async
 from .config import cfg
 from .providers.tote_api import ToteClient, ToteError, rate_limited_get, normalize_probable_lines
 from .bq import get_bq_sink
@@ -93,16 +94,18 @@ def handle_pubsub() -> tuple[str, int]:
 
             # This task is now a simple wrapper around the `ingest_probable_odds` task for multiple events.
             # This avoids duplicating logic and ensures consistency.
-            published_count = 0
+            # Re-use the existing `ingest_probable_odds` task logic for each event.
+            # This is more robust as it uses the GraphQL endpoint directly.
+            futs = []
             for event_id in event_ids:
                 try:
-                    # Re-use the existing `ingest_probable_odds` task logic for each event.
-                    # This is more robust as it uses the GraphQL endpoint directly.
-                    job_payload = {"task": "ingest_probable_odds", "event_id": event_id}
-                    publish_pubsub_message(cfg.bq_project, "ingest-jobs", job_payload)
-                    published_count += 1
+                    futs.append(publish_pubsub_message_async(cfg.bq_project, "ingest-jobs", {"task": "ingest_probable_odds", "event_id": event_id}))
                 except Exception as e:
                     print(f"Failed to publish probable odds job for event {event_id}: {e}")
+            futures_wait(futs, timeout=60)
+            published_count = sum(1 for f in futs if f.done() and f.exception() is None)
+            if published_count < len(event_ids):
+                print(f"Failed to publish {len(event_ids) - published_count} of {len(event_ids)} probable odds jobs")
             n_ingested = published_count
             metrics["refreshed_probable_odds_for_events"] = len(event_ids)
             metrics["ingested_products_for_odds"] = n_ingested
@@ -134,7 +137,7 @@ def handle_pubsub() -> tuple[str, int]:
             }
             """
             try:
-                data = client.graphql(GQL, {"id": win_product_id})
+                data = client.product(win_product_id, GQL)
             except ToteError as te:
                 print(f"GraphQL probable fetch failed for {win_product_id}: {te}")
                 return ("", 204)
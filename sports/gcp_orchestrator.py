@@ -6,7 +6,7 @@ from flask import Flask, request, jsonify
 from google.cloud import bigquery
 from typing import Any
 
-from .gcp import publish_pubsub_message
+from .gcp import publish_pubsub_message, publish_pubsub_messages
 from .config import cfg
 from .bq import get_bq_sink
 import uuid
@@ -196,9 +196,9 @@ def scan_and_publish_results_jobs():
 
     unique_event_ids = results_needed_df['event_id'].unique()
     try:
-        for event_id in unique_event_ids:
-            job = {"task": "ingest_event_results", "event_id": event_id}
-            publish_pubsub_message(project_id, topic_id, job)
+        publish_pubsub_messages(
+            project_id, topic_id, [{"task": "ingest_event_results", "event_id": event_id} for event_id in unique_event_ids]
+        )
     except Exception as e:
         err = str(e)
         print(f"Failed to publish result ingest jobs: {err}")
@@ -252,10 +252,9 @@ def scan_and_publish_probable_sweep():
 
     n = 0
     try:
-        for _, row in df.iterrows():
-            eid = row["event_id"]
-            publish_pubsub_message(project_id, topic_id, {"task": "ingest_probable_odds", "event_id": eid})
-            n += 1
+        event_ids = df["event_id"].tolist()
+        publish_pubsub_messages(project_id, topic_id, [{"task": "ingest_probable_odds", "event_id": eid} for eid in event_ids])
+        n = len(event_ids)
     except Exception as e:
         err = str(e)
         print(f"Failed to publish probable odds jobs: {err}")
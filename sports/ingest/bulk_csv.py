@@ -0,0 +1,195 @@
+"""Bulk, vectorized CSV ingest for football-data, Kaggle football and Cricsheet files.
+
+The per-row ``ingest_dir`` / ``ingest_file`` helpers parse every row with
+``csv.DictReader`` and write one match at a time. This path reads each file
+into a DataFrame, resolves column aliases and dates column-wise,
+de-duplicates across files and writes all matches with a single
+``upsert_matches`` call. Files whose checksum is unchanged since the last
+successful run are skipped (tracked in a small JSON manifest).
+
+Usage:
+  python -m sports.run matches-bulk --kind football_fd --path data/football_fd
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+# Column aliases per source, first present non-empty value wins
+SOURCES: Dict[str, Dict[str, Any]] = {
+    "football_fd": {
+        "sport": "football",
+        "source": "football-data.co.uk",
+        "date_formats": ["%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d"],
+        "columns": {
+            "date": ["Date", "date"],
+            "home": ["HomeTeam", "Home", "HomeTeamName"],
+            "away": ["AwayTeam", "Away", "AwayTeamName"],
+            "comp": ["Div", "division"],
+            "season": [],
+            "fthg": ["FTHG", "HG"],
+            "ftag": ["FTAG", "AG"],
+            "ftr": ["FTR", "Res"],
+        },
+    },
+    "football_kaggle": {
+        "sport": "football",
+        "source": "kaggle",
+        "date_formats": ["ISO8601", "%d/%m/%Y"],
+        "columns": {
+            "date": ["date", "Date"],
+            "home": ["home_team", "HomeTeam"],
+            "away": ["away_team", "AwayTeam"],
+            "comp": ["competition", "Div"],
+            "season": ["season"],
+            "fthg": ["home_goals", "FTHG"],
+            "ftag": ["away_goals", "FTAG"],
+            "ftr": ["result", "FTR"],
+        },
+    },
+    "cricket_cricsheet": {
+        "sport": "cricket",
+        "source": "cricsheet",
+        "date_formats": ["ISO8601", "%d/%m/%Y"],
+        "columns": {
+            "date": ["match_date", "date"],
+            "home": ["team1", "home_team", "HomeTeam"],
+            "away": ["team2", "away_team", "AwayTeam"],
+            "comp": ["comp", "competition"],
+            "season": ["season"],
+            "fthg": [],
+            "ftag": [],
+            "ftr": ["result"],
+        },
+    },
+}
+
+MATCH_COLUMNS = ["match_id", "sport", "comp", "season", "date", "home", "away", "fthg", "ftag", "ftr", "source"]
+
+
+def file_checksum(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_csv(path: str) -> pd.DataFrame:
+    # pyarrow's multithreaded reader when available; the C engine tolerates odd encodings and ragged rows
+    try:
+        return pd.read_csv(path, dtype=str, engine="pyarrow")
+    except Exception:
+        return pd.read_csv(path, dtype=str, encoding="utf-8", encoding_errors="replace", on_bad_lines="skip")
+
+
+def _coalesce(df: pd.DataFrame, aliases: Sequence[str]) -> pd.Series:
+    cols = [c for c in aliases if c in df.columns]
+    if not cols:
+        return pd.Series(pd.NA, index=df.index, dtype="object")
+    block = df[cols].apply(lambda s: s.str.strip()).replace({"": pd.NA, "NA": pd.NA})
+    return block.bfill(axis=1).iloc[:, 0]
+
+
+def _parse_dates(raw: pd.Series, formats: Sequence[str]) -> pd.Series:
+    raw = raw.astype("string").str.split(" ").str[0]
+    out = pd.Series(pd.NaT, index=raw.index, dtype="datetime64[ns]")
+    for fmt in formats:
+        missing = out.isna() & raw.notna()
+        if not missing.any():
+            break
+        out[missing] = pd.to_datetime(raw[missing], format=fmt, errors="coerce")
+    return out.dt.strftime("%Y-%m-%d")
+
+
+def normalize_frame(df: pd.DataFrame, kind: str) -> pd.DataFrame:
+    """Map a raw CSV frame onto MATCH_COLUMNS, dropping rows without date/teams."""
+    spec = SOURCES[kind]
+    cols = spec["columns"]
+    out = pd.DataFrame(index=df.index)
+    out["date"] = _parse_dates(_coalesce(df, cols["date"]), spec["date_formats"])
+    for name in ("home", "away", "comp", "season", "ftr"):
+        out[name] = _coalesce(df, cols[name])
+    for name in ("fthg", "ftag"):
+        out[name] = pd.to_numeric(_coalesce(df, cols[name]), errors="coerce").astype("Int64")
+    out["sport"] = spec["sport"]
+    out["source"] = spec["source"]
+    out = out.dropna(subset=["date", "home", "away"])
+    key = out["sport"] + "|" + out["date"] + "|" + out["home"] + "|" + out["away"]
+    out["match_id"] = key.map(lambda k: hashlib.sha1(k.encode("utf-8")).hexdigest()[:16])
+    return out[MATCH_COLUMNS]
+
+
+def _load_manifest(path: Optional[str]) -> Dict[str, str]:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_manifest(path: Optional[str], manifest: Dict[str, str]) -> None:
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # Nullable ints/NA -> plain Python values for JSON load jobs
+    obj = df.astype(object).where(df.notna(), None)
+    return obj.to_dict("records")
+
+
+def bulk_ingest(db: Any, path: str, kind: str, *, manifest_path: Optional[str] = None, force: bool = False) -> int:
+    """Ingest a CSV file or every CSV in a directory; returns matches written.
+
+    ``db`` needs an ``upsert_matches(rows)`` method (``BigQuerySink``).
+    """
+    if kind not in SOURCES:
+        raise ValueError(f"Unknown CSV kind {kind!r}; expected one of {sorted(SOURCES)}")
+    files = sorted(glob.glob(os.path.join(path, "*.csv")) + glob.glob(os.path.join(path, "*.CSV"))) if os.path.isdir(path) else [path]
+    if manifest_path is None:
+        manifest_path = os.path.join(path if os.path.isdir(path) else os.path.dirname(path) or ".", f".{kind}_manifest.json")
+    manifest = _load_manifest(manifest_path)
+    frames: List[pd.DataFrame] = []
+    checksums: Dict[str, str] = {}
+    for fp in files:
+        key = os.path.basename(fp)
+        digest = file_checksum(fp)
+        if not force and manifest.get(key) == digest:
+            print(f"[{kind}] {key}: unchanged, skipped")
+            continue
+        t0 = time.perf_counter()
+        try:
+            frame = normalize_frame(_read_csv(fp), kind)
+        except Exception as e:
+            print(f"[{kind}] {key}: failed to read ({e})")
+            continue
+        dt = time.perf_counter() - t0
+        rate = len(frame) / dt if dt > 0 else 0.0
+        print(f"[{kind}] {key}: {len(frame)} rows in {dt:.2f}s ({rate:,.0f} rows/s)")
+        frames.append(frame)
+        checksums[key] = digest
+    if not frames:
+        print(f"[{kind}] nothing to ingest")
+        return 0
+    matches = pd.concat(frames, ignore_index=True).drop_duplicates(subset=["match_id"], keep="last")
+    t0 = time.perf_counter()
+    db.upsert_matches(_records(matches))
+    print(f"[{kind}] wrote {len(matches)} matches from {len(frames)} file(s) in {time.perf_counter() - t0:.2f}s")
+    manifest.update(checksums)
+    _save_manifest(manifest_path, manifest)
+    return len(matches)
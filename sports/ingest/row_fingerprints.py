@@ -0,0 +1,187 @@
+"""Per-table row fingerprints so re-ingests only upsert new or changed rows.
+
+Each row is hashed (canonical JSON) and remembered under its primary key.
+Repeated ingests of the same date then drop rows whose fingerprint is
+unchanged before they reach the BigQuery MERGE. Fingerprints live in a
+bounded in-process LRU and, when REDIS_URL is set, in Redis so they survive
+restarts and are shared across ingest instances.
+
+Fingerprints are scoped to the destination (``project.dataset`` of the
+sink) so a run against another dataset or a local sink never makes the
+production ingest skip rows. Each fingerprint expires on its own
+``ttl_s`` after it was written: in memory it carries its write time, and
+in Redis it goes into a per-day hash that expires ``ttl_s`` after its last
+write, so idle keys age out instead of piling up.
+
+Fingerprints are only committed after the sink write succeeded, so a failed
+upsert is retried in full on the next run. Switched, sized and expired by
+``cfg.tote_row_dedup*`` (sports/config.py).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from ..config import cfg
+
+try:  # Optional dependency; used if available
+    import redis  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    redis = None  # type: ignore
+
+
+def row_fingerprint(row: Mapping[str, Any]) -> str:
+    payload = json.dumps(row, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class RowFingerprintCache:
+    BUCKET_S = 86400
+
+    def __init__(self, *, max_entries: int = 200_000, ttl_s: int = 7 * 86400, enabled: bool = True, use_redis: bool = True) -> None:
+        self.enabled = enabled
+        self.max_entries = max(1000, int(max_entries))
+        self.ttl_s = max(60, int(ttl_s))
+        self.use_redis = use_redis
+        # (scope, table, pk) -> (fingerprint, written at)
+        self._local: "OrderedDict[Tuple[str, str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_failed = False
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _redis_client(self):
+        if self._redis is not None or self._redis_failed:
+            return self._redis
+        if not self.use_redis or not cfg.redis_url or redis is None:
+            self._redis_failed = True
+            return None
+        try:
+            client = redis.from_url(cfg.redis_url, decode_responses=True, socket_timeout=1.5, socket_connect_timeout=1.5)
+            client.ping()
+            self._redis = client
+        except Exception as e:
+            print(f"Row fingerprint cache: Redis unavailable, using memory only ({e})")
+            self._redis_failed = True
+        return self._redis
+
+    @staticmethod
+    def default_scope() -> str:
+        return f"{cfg.bq_project}.{cfg.bq_dataset}"
+
+    def _redis_key(self, scope: str, table: str, bucket: int) -> str:
+        return f"autobet:rowfp:{scope}:{table}:{bucket}"
+
+    def _buckets(self, now: float) -> List[int]:
+        """Day buckets that may hold live fingerprints, newest first."""
+        cur = int(now // self.BUCKET_S)
+        return list(range(cur, cur - self.ttl_s // self.BUCKET_S - 2, -1))
+
+    def _count(self, table: str, written: int, skipped: int) -> None:
+        c = self._counters.setdefault(table, {"written": 0, "skipped": 0})
+        c["written"] += written
+        c["skipped"] += skipped
+
+    def changed_rows(self, table: str, rows: Sequence[Mapping[str, Any]], key_fields: Sequence[str], *, scope: Optional[str] = None) -> Tuple[List[Mapping[str, Any]], List[Tuple[str, str]]]:
+        """Return (rows to write, pending fingerprints to ``commit`` once written)."""
+        if not self.enabled or not rows:
+            return list(rows), []
+        scope = scope or self.default_scope()
+        now = time.time()
+        keyed = []
+        for r in rows:
+            pk = "|".join(str(r.get(k)) for k in key_fields)
+            keyed.append((r, pk, row_fingerprint(r)))
+        known: Dict[str, str] = {}
+        with self._lock:
+            for _, pk, _ in keyed:
+                hit = self._local.get((scope, table, pk))
+                if hit is None:
+                    continue
+                if now - hit[1] > self.ttl_s:
+                    del self._local[(scope, table, pk)]
+                    continue
+                known[pk] = hit[0]
+                self._local.move_to_end((scope, table, pk))
+        missing = [pk for _, pk, _ in keyed if pk not in known]
+        client = self._redis_client() if missing else None
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for b in self._buckets(now):
+                    pipe.hmget(self._redis_key(scope, table, b), missing)
+                for values in pipe.execute():
+                    for pk, fp in zip(missing, values):
+                        if fp and pk not in known:
+                            known[pk] = fp
+            except Exception as e:
+                print(f"Row fingerprint cache: Redis read failed for {table}: {e}")
+        out: List[Mapping[str, Any]] = []
+        pending: List[Tuple[str, str]] = []
+        for r, pk, fp in keyed:
+            if known.get(pk) == fp:
+                continue
+            out.append(r)
+            pending.append((pk, fp))
+        with self._lock:
+            self._count(table, len(out), len(rows) - len(out))
+        return out, pending
+
+    def commit(self, table: str, pending: Iterable[Tuple[str, str]], *, scope: Optional[str] = None) -> None:
+        pending = list(pending)
+        if not self.enabled or not pending:
+            return
+        scope = scope or self.default_scope()
+        now = time.time()
+        with self._lock:
+            for pk, fp in pending:
+                self._local[(scope, table, pk)] = (fp, now)
+                self._local.move_to_end((scope, table, pk))
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+        client = self._redis_client()
+        if client is not None:
+            try:
+                # Today's bucket expires ttl_s after its last write (i.e. once the day is over)
+                key = self._redis_key(scope, table, self._buckets(now)[0])
+                pipe = client.pipeline(transaction=False)
+                pipe.hset(key, mapping=dict(pending))
+                pipe.expire(key, self.ttl_s + self.BUCKET_S)
+                pipe.execute()
+            except Exception as e:
+                print(f"Row fingerprint cache: Redis write failed for {table}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._local),
+                "redis": self._redis is not None,
+                "tables": {t: dict(c) for t, c in self._counters.items()},
+            }
+
+
+_row_cache = RowFingerprintCache(
+    max_entries=cfg.tote_row_dedup_max,
+    ttl_s=cfg.tote_row_dedup_ttl_s,
+    enabled=cfg.tote_row_dedup,
+)
+
+
+def get_row_cache() -> RowFingerprintCache:
+    return _row_cache
+
+
+def set_row_cache(cache: RowFingerprintCache) -> None:
+    """Install the cache used by the ingest functions (benchmarks, tests)."""
+    global _row_cache
+    _row_cache = cache
+
+
+def row_cache_stats() -> Dict[str, Any]:
+    return _row_cache.stats()
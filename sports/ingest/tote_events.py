@@ -1,10 +1,21 @@
 from __future__ import annotations
 import json
-from typing import Any, Dict, List
-from ..providers.tote_api import ToteClient, ToteError
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+from ..providers.tote_api import ToteClient, ToteError, limiter_stats
 from ..bq import BigQuerySink
 import time
 
+# Time-window sharding for long since/until ranges
+SHARD_HOURS = float(os.getenv("TOTE_EVENTS_SHARD_HOURS", "24") or 24)
+# Shard size adapts so a shard takes about this many pages
+SHARD_TARGET_PAGES = max(1, int(os.getenv("TOTE_EVENTS_SHARD_TARGET_PAGES", "2") or 2))
+SHARD_MIN_HOURS = 1.0
+SHARD_MAX_HOURS = 24.0 * 7
+
 EVENTS_QUERY = """
 query GetEvents($since: DateTime, $until: DateTime, $first: Int, $after: String) {
   events(first: $first, after: $after, since: $since, until: $until) {
@@ -35,52 +46,152 @@ def ingest_tote_events(
     first: int = 100,
     since_iso: str | None = None,
     until_iso: str | None = None,
+    *,
+    workers: Optional[int] = None,
+    shard_hours: Optional[float] = None,
 ) -> int:
     """
     Ingests event data from the Tote GraphQL API into BigQuery.
     This includes event details, competitor lists, and results if available.
+
+    A since/until range is split into time shards fetched concurrently; each
+    shard pages independently and writes every page to the sink as it
+    arrives. Shard size adapts towards SHARD_TARGET_PAGES pages per shard and
+    events are de-duplicated by event_id across shards.
+
+    Page fetches retry inside the client (shared "tote" retry budget and
+    circuit breaker); a shard whose page still fails does not stop the
+    others, but ToteError is raised at the end naming the failed shards.
     """
     print(f"Ingesting events from Tote API (since: {since_iso}, until: {until_iso})")
-    variables: Dict[str, Any] = {"first": first}
-    if since_iso:
-        variables["since"] = since_iso
-    if until_iso:
-        variables["until"] = until_iso
-
-    all_nodes = []
-    page = 1
-    while True:
-        print(f"Fetching page {page}...")
-        try:
+    start = _parse_iso(since_iso)
+    end = _parse_iso(until_iso)
+    planner = _ShardPlanner(start, end, shard_hours or SHARD_HOURS) if (start and end and end > start) else None
+    seen: Set[str] = set()
+    lock = threading.Lock()
+    totals = {"events": 0, "runs": 0, "competitor_logs": 0}
+
+    def _ingest_shard(s_iso: str | None, u_iso: str | None) -> int:
+        variables: Dict[str, Any] = {"first": first}
+        if s_iso:
+            variables["since"] = s_iso
+        if u_iso:
+            variables["until"] = u_iso
+        page = 1
+        while True:
+            print(f"Fetching page {page} ({s_iso} .. {u_iso})...")
             data = client.graphql(EVENTS_QUERY, variables)
-        except Exception as e:
-            print(f"Failed to fetch events from Tote API: {e}")
-            break
-
-        nodes = (data.get("events", {}).get("nodes", []))
-        if not nodes:
-            print("No more events found.")
-            break
-        all_nodes.extend(nodes)
-
-        page_info = data.get("events", {}).get("pageInfo", {})
-        if page_info.get("hasNextPage") and page_info.get("endCursor"):
-            variables["after"] = page_info["endCursor"]
-            page += 1
-        else:
-            break
-
-    if not all_nodes:
+            nodes = (data.get("events", {}).get("nodes", []))
+            if not nodes:
+                print("No more events found.")
+                break
+            with lock:
+                fresh = [ev for ev in nodes if ev.get("id") and ev.get("id") not in seen]
+                seen.update(ev.get("id") for ev in fresh)
+            if fresh:
+                counts = _write_event_rows(db, _event_rows(fresh, int(time.time() * 1000)))
+                with lock:
+                    for key, n in counts.items():
+                        totals[key] += n
+            page_info = data.get("events", {}).get("pageInfo", {})
+            if page_info.get("hasNextPage") and page_info.get("endCursor"):
+                variables["after"] = page_info["endCursor"]
+                page += 1
+            else:
+                break
+        return page
+
+    failed: List[Tuple[str, str, str]] = []
+    if planner is None:
+        _ingest_shard(since_iso, until_iso)
+    else:
+        n_workers = max(1, int(workers or min(4, limiter_stats().get("concurrency_max") or 4)))
+
+        def _worker() -> None:
+            while True:
+                shard = planner.next_shard()
+                if shard is None:
+                    return
+                s, u = shard
+                try:
+                    pages = _ingest_shard(_fmt_iso(s), _fmt_iso(u))
+                except Exception as e:
+                    # Keep going with other shards; the failure is raised once all are done
+                    print(f"Events shard {_fmt_iso(s)} .. {_fmt_iso(u)} failed: {e}")
+                    with lock:
+                        failed.append((_fmt_iso(s), _fmt_iso(u), str(e)))
+                    continue
+                planner.observe(u - s, pages)
+
+        with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="tote-events") as pool:
+            for fut in [pool.submit(_worker) for _ in range(n_workers)]:
+                fut.result()
+
+    if failed:
+        failed.sort()
+        s0, u0, err = failed[0]
+        raise ToteError(
+            f"{len(failed)} event shard(s) failed after retries ({totals['events']} events written); "
+            f"first {s0} .. {u0}: {err}"
+        )
+    if not totals["events"]:
         return 0
+    print(f"Successfully ingested {totals['events']} events, {totals['runs']} results, and {totals['competitor_logs']} competitor logs.")
+    return totals["events"]
+
+
+def _parse_iso(value: str | None) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    except Exception:
+        return None
 
+
+def _fmt_iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class _ShardPlanner:
+    """Hands out consecutive [since, until) windows, resizing them as shards report page counts."""
+
+    def __init__(self, start: datetime, end: datetime, hours: float) -> None:
+        self.cursor = start
+        self.end = end
+        self.size = timedelta(hours=min(SHARD_MAX_HOURS, max(SHARD_MIN_HOURS, hours)))
+        self._lock = threading.Lock()
+
+    def next_shard(self) -> Optional[Tuple[datetime, datetime]]:
+        with self._lock:
+            if self.cursor >= self.end:
+                return None
+            s = self.cursor
+            u = min(self.end, s + self.size)
+            self.cursor = u
+            return s, u
+
+    def observe(self, span: timedelta, pages: int) -> None:
+        # Scale towards the target pages per shard, at most 2x per step
+        hours = span.total_seconds() / 3600.0
+        if hours <= 0:
+            return
+        factor = min(2.0, max(0.5, SHARD_TARGET_PAGES / max(1, pages)))
+        with self._lock:
+            new_hours = min(SHARD_MAX_HOURS, max(SHARD_MIN_HOURS, hours * factor))
+            self.size = timedelta(hours=new_hours)
+
+
+def _event_rows(nodes: List[Dict[str, Any]], ts_ms: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Normalize event nodes into rows for the events, horses, runs and log tables."""
     rows_events: List[Dict[str, Any]] = []
     rows_runs: List[Dict[str, Any]] = []
     rows_horses: List[Dict[str, Any]] = []
     rows_competitors_log: List[Dict[str, Any]] = []
     rows_status_log: List[Dict[str, Any]] = []
-    ts_ms = int(time.time() * 1000)
 
-    for ev in all_nodes:
+    for ev in nodes:
         event_id = ev.get("id")
         if not event_id:
             continue
@@ -144,10 +255,24 @@ def ingest_tote_events(
         except Exception:
             pass
 
-    db.upsert_tote_events(rows_events)
+    return {
+        "events": rows_events,
+        "runs": rows_runs,
+        "horses": rows_horses,
+        "competitors_log": rows_competitors_log,
+        "status_log": rows_status_log,
+    }
+
+
+def _write_event_rows(db: BigQuerySink, rows: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
+    rows_events = rows["events"]
+    rows_horses = rows["horses"]
+    rows_runs = rows["runs"]
+    rows_competitors_log = rows["competitors_log"]
+    rows_status_log = rows["status_log"]
+    if rows_events: db.upsert_tote_events(rows_events)
     if rows_horses: db.upsert_hr_horses(list({h['horse_id']: h for h in rows_horses}.values()))
     if rows_runs: db.upsert_hr_horse_runs(rows_runs)
     if rows_competitors_log: db.upsert_tote_event_competitors_log(rows_competitors_log)
     if rows_status_log: db.upsert_tote_event_status_log(rows_status_log)
-    print(f"Successfully ingested {len(rows_events)} events, {len(rows_runs)} results, and {len(rows_competitors_log)} competitor logs.")
-    return len(rows_events)
+    return {"events": len(rows_events), "runs": len(rows_runs), "competitor_logs": len(rows_competitors_log)}
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import gzip
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
+from ..config import cfg
 from ..providers.tote_api import ToteClient
+from ..providers.tote_async import run_products_by_id
 from ..bq import BigQuerySink
+from .row_fingerprints import get_row_cache
 
 # Full products query including legs, selections (runners), pool totals and result dividends.
 # Mirrors autobet/sql/tote_products.graphql so the web refresh ingestor pulls runners as well.
@@ -257,9 +261,13 @@ query GetProduct($id: String!) {
 }
 """
 
-def ingest_products(db: BigQuerySink, client: ToteClient, date_iso: str | None, status: str | None, first: int, bet_types: list[str] | None, product_ids: list[str] | None = None) -> int:
+def ingest_products(db: BigQuerySink, client: ToteClient, date_iso: str | None, status: str | None, first: int, bet_types: list[str] | None, product_ids: list[str] | None = None, raise_errors: bool = False) -> int:
     """
     Ingests product data from the Tote API into BigQuery.
+
+    Sink write failures are logged and counted as 0 rows unless
+    ``raise_errors`` is set (the backfill engine uses it so a failed write
+    is retried instead of checkpointed).
     """
     print(f"Ingesting products for date={date_iso}, status={status}, bet_types={bet_types}, product_ids={product_ids}")
     variables: Dict[str, Any] = {"first": first}
@@ -271,60 +279,155 @@ def ingest_products(db: BigQuerySink, client: ToteClient, date_iso: str | None,
         variables["betTypes"] = bet_types
     products_nodes: List[Dict[str, Any]] = []
     if product_ids:
-        # Fetch by ID one-by-one via product(id:)
-        for pid in product_ids:
-            try:
-                data = client.graphql(PRODUCT_BY_ID_QUERY, {"id": pid})
-                node = data.get("product")
-                if node:
-                    products_nodes.append(node)
-            except Exception as e:
-                print(f"Failed to fetch product {pid} from Tote API: {e}")
+        # Fetch by ID as aliased product(id:) batches; batches run concurrently over the async client when available
+        results = None
+        if isinstance(client, ToteClient):
+            if len(product_ids) > 1:
+                results = run_products_by_id(product_ids, PRODUCT_BY_ID_QUERY, client=client)
+            if results is None:
+                results = client.products_by_id(product_ids, PRODUCT_BY_ID_QUERY)
+        else:
+            results = []
+            for pid in product_ids:
+                try:
+                    results.append(client.graphql(PRODUCT_BY_ID_QUERY, {"id": pid}))
+                except Exception as e:
+                    results.append(e)
+        for pid, data in zip(product_ids, results):
+            if isinstance(data, Exception):
+                print(f"Failed to fetch product {pid} from Tote API: {data}")
+                continue
+            node = (data or {}).get("product")
+            if node:
+                products_nodes.append(node)
+        nodes_iter: Iterable[Dict[str, Any]] = products_nodes
+    elif hasattr(client, "iter_connection_nodes"):
+        # Pages are parsed off the wire (ijson) and fully read before their nodes are written in batches
+        nodes_iter = client.iter_connection_nodes(PRODUCTS_QUERY, variables, "products")
     else:
-        try:
-            page = 1
-            while True:
-                data = client.graphql(PRODUCTS_QUERY, variables)
-                nodes = (data.get("products", {}).get("nodes", []))
-                if nodes:
-                    products_nodes.extend(nodes)
-                page_info = (data.get("products", {}).get("pageInfo", {}) if isinstance(data, dict) else {})
-                if page_info.get("hasNextPage") and page_info.get("endCursor"):
-                    variables["after"] = page_info["endCursor"]
-                    page += 1
-                else:
-                    break
-            print(f"Successfully fetched {len(products_nodes)} products from Tote API for date: {date_iso}")
-        except Exception as e:
-            print(f"Failed to fetch product data from Tote API: {e}")
-            raise
-    if not products_nodes:
+        nodes_iter = _iter_product_pages(client, variables)
+
+    import time as _t
+    ts_ms = int(_t.time() * 1000)
+    # Generate an ID based on the request params
+    req_id_part = date_iso or "live"
+    if bet_types:
+        req_id_part += "_" + "_".join(bet_types)
+    rid = f"probable:{req_id_part}:{ts_ms}"
+
+    total = 0
+    fetched = 0
+    part = 0
+    seen_events: set = set()
+    batch: List[Dict[str, Any]] = []
+    try:
+        for node in nodes_iter:
+            if not node:
+                continue
+            batch.append(node)
+            if len(batch) >= cfg.tote_products_stream_batch:
+                total += _ingest_product_batch(db, batch, rid if part == 0 else f"{rid}:{part}", ts_ms, seen_events, raise_errors)
+                fetched += len(batch)
+                part += 1
+                batch = []
+        if batch:
+            total += _ingest_product_batch(db, batch, rid if part == 0 else f"{rid}:{part}", ts_ms, seen_events, raise_errors)
+            fetched += len(batch)
+    except Exception as e:
+        print(f"Failed to fetch product data from Tote API: {e}")
+        raise
+    if not fetched:
         print("No products found.")
         return 0
+    print(f"Successfully ingested {fetched} products from Tote API for date: {date_iso}")
+    return total
+
+
+def _iter_product_pages(client: Any, variables: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Page through PRODUCTS_QUERY with ``client.graphql`` for clients without streaming."""
+    variables = dict(variables)
+    while True:
+        data = client.graphql(PRODUCTS_QUERY, variables)
+        nodes = (data.get("products", {}).get("nodes", []))
+        yield from nodes
+        page_info = (data.get("products", {}).get("pageInfo", {}) if isinstance(data, dict) else {})
+        if page_info.get("hasNextPage") and page_info.get("endCursor"):
+            variables["after"] = page_info["endCursor"]
+        else:
+            break
+
 
-    # Store the raw payload containing probable odds for this batch
+def _store_raw_products(db: BigQuerySink, products_nodes: List[Dict[str, Any]], rid: str, ts_ms: int) -> None:
+    """Store one batch of raw product nodes (with probable odds lines).
+
+    With ``cfg.tote_raw_bucket`` set the gzip JSON object in GCS is the raw
+    record and the ``raw_tote_probable_odds`` row points at it (``gcs_uri``,
+    ``payload_bytes``, ``gzip_bytes``). The row's ``payload`` then keeps only
+    the product ids and odds lines, because ``vw_tote_probable_odds`` parses
+    them from it. Without a bucket, or if the upload fails, the full payload
+    goes into the row. Each batch is its own row so no payload grows with the
+    day size.
+    """
+    payload = json.dumps({"products": {"nodes": products_nodes}}, separators=(",", ":"))
+    row: Dict[str, Any] = {
+        "raw_id": rid,
+        "fetched_ts": ts_ms,
+        "payload": payload,
+        "product_id": None,  # This is a batch, not for a single product
+    }
+    bucket = cfg.tote_raw_bucket
+    if bucket:
+        data = payload.encode("utf-8")
+        gz = gzip.compress(data)
+        blob = "tote/raw/products/" + rid.replace(":", "/") + ".json.gz"
+        try:
+            from ..gcp import upload_bytes_to_bucket
+            upload_bytes_to_bucket(bucket, blob, gz, content_type="application/json", content_encoding="gzip")
+            odds = [{"id": n.get("id"), "lines": n.get("lines")} for n in products_nodes if n.get("lines")]
+            row.update(
+                payload=json.dumps({"products": {"nodes": odds}}, separators=(",", ":")),
+                gcs_uri=f"gs://{bucket}/{blob}",
+                payload_bytes=len(data),
+                gzip_bytes=len(gz),
+            )
+        except Exception as e:
+            print(f"Warning: failed to upload raw products to gs://{bucket}, keeping the payload in BigQuery: {e}")
     try:
-        import time as _t
-        ts_ms = int(_t.time() * 1000)
-        payload_for_raw = {"products": {"nodes": products_nodes}}
-        # Generate an ID based on the request params
-        req_id_part = date_iso or "live"
-        if bet_types:
-            req_id_part += "_" + "_".join(bet_types)
-        rid = f"probable:{req_id_part}:{ts_ms}"
-        
-        db.upsert_raw_tote_probable_odds([
-            {
-                "raw_id": rid,
-                "fetched_ts": ts_ms,
-                "payload": json.dumps(payload_for_raw),
-                "product_id": None # This is a batch, not for a single product
-            }
-        ])
-        print("Stored raw probable odds payload.")
+        db.upsert_raw_tote_probable_odds([row])
+        where = f" -> {row['gcs_uri']}" if row.get("gcs_uri") else ""
+        print(f"Stored raw probable odds payload ({len(products_nodes)} products){where}.")
     except Exception as e:
         print(f"Warning: failed to store raw probable odds payload: {e}")
 
+
+def _upsert_changed(upsert: Any, table: str, rows: List[Dict[str, Any]], key_fields: tuple) -> None:
+    """Upsert only rows whose content changed since they were last written.
+
+    Fingerprints are only used for BigQuerySink writes and are scoped to that
+    sink's dataset; other sinks (LocalSink, test doubles) always get every row.
+    """
+    sink = getattr(upsert, "__self__", None)
+    if not isinstance(sink, BigQuerySink):
+        if rows:
+            print(f"Inserting {len(rows)} rows into {table}")
+            upsert(rows)
+        return
+    cache = get_row_cache()
+    scope = f"{sink.project}.{sink.dataset}"
+    changed, pending = cache.changed_rows(table, rows, key_fields, scope=scope)
+    skipped = len(rows) - len(changed)
+    if changed:
+        print(f"Inserting {len(changed)} rows into {table}" + (f" ({skipped} unchanged skipped)" if skipped else ""))
+        upsert(changed)
+    elif rows:
+        print(f"Skipping {skipped} unchanged rows for {table}")
+    cache.commit(table, pending, scope=scope)
+
+
+def _ingest_product_batch(db: BigQuerySink, products_nodes: List[Dict[str, Any]], rid: str, ts_ms: int, seen_events: set, raise_errors: bool = False) -> int:
+    """Normalize one batch of product nodes and upsert the rows; returns products written."""
+    _store_raw_products(db, products_nodes, rid, ts_ms)
+
     rows_products: List[Dict[str, Any]] = []
     rows_selections: List[Dict[str, Any]] = []
     rows_events: List[Dict[str, Any]] = []
@@ -563,8 +666,7 @@ def ingest_products(db: BigQuerySink, client: ToteClient, date_iso: str | None,
                 if pid:
                     _pmap[pid] = r
             prod_rows = list(_pmap.values()) if _pmap else rows_products
-            print(f"Inserting {len(prod_rows)} rows into tote_products")
-            db.upsert_tote_products(prod_rows)
+            _upsert_changed(db.upsert_tote_products, "tote_products", prod_rows, ("product_id",))
         if rows_selections:
             # Deduplicate by (product_id, leg_index, selection_id)
             seen_sel = set()
@@ -575,8 +677,7 @@ def ingest_products(db: BigQuerySink, client: ToteClient, date_iso: str | None,
                     continue
                 seen_sel.add(k)
                 sel_rows.append(r)
-            print(f"Inserting {len(sel_rows)} rows into tote_product_selections")
-            db.upsert_tote_product_selections(sel_rows)
+            _upsert_changed(db.upsert_tote_product_selections, "tote_product_selections", sel_rows, ("product_id", "leg_index", "selection_id"))
         if rows_dividends:
             # Deduplicate by (product_id, selection, ts)
             _dmap: Dict[tuple, Dict[str, Any]] = {}
@@ -591,17 +692,18 @@ def ingest_products(db: BigQuerySink, client: ToteClient, date_iso: str | None,
                 else:
                     _dmap[k] = r
             div_rows = list(_dmap.values()) if _dmap else rows_dividends
-            print(f"Inserting {len(div_rows)} rows into tote_product_dividends")
-            db.upsert_tote_product_dividends(div_rows)
+            _upsert_changed(db.upsert_tote_product_dividends, "tote_product_dividends", div_rows, ("product_id", "selection", "ts"))
         if rows_events:
             # De-dup rows by event_id to reduce upsert work
             dedup = {}
             for r in rows_events:
                 if r.get("event_id"):
                     dedup[r["event_id"]] = r
-            ev_rows = list(dedup.values()) if dedup else rows_events
-            print(f"Inserting {len(ev_rows)} rows into tote_events")
-            db.upsert_tote_events(ev_rows)
+            ev_rows = [r for r in (list(dedup.values()) if dedup else rows_events) if r.get("event_id") not in seen_events]
+            # Events repeat across products; only upsert each once per run
+            seen_events.update(r.get("event_id") for r in ev_rows)
+            if ev_rows:
+                _upsert_changed(db.upsert_tote_events, "tote_events", ev_rows, ("event_id",))
         if rows_rules:
             # Deduplicate by product_id
             _rmap: Dict[str, Dict[str, Any]] = {}
@@ -610,9 +712,8 @@ def ingest_products(db: BigQuerySink, client: ToteClient, date_iso: str | None,
                 if pid:
                     _rmap[pid] = r
             rules_rows = list(_rmap.values())
-            print(f"Inserting {len(rows_rules)} rows into tote_bet_rules")
             try:
-                db.upsert_tote_bet_rules(rules_rows)
+                _upsert_changed(db.upsert_tote_bet_rules, "tote_bet_rules", rules_rows, ("product_id",))
             except Exception as ee:
                 print(f"Warning: bet rules upsert failed: {ee}")
         if rows_runs:
@@ -622,10 +723,10 @@ def ingest_products(db: BigQuerySink, client: ToteClient, date_iso: str | None,
                 k = (r.get("horse_id"), r.get("event_id"))
                 _fmap[k] = r
             finish_rows = list(_fmap.values())
-            print(f"Inserting {len(finish_rows)} rows into hr_horse_runs")
-            db.upsert_hr_horse_runs(finish_rows)
-        print("Successfully ingested product data.")
+            _upsert_changed(db.upsert_hr_horse_runs, "hr_horse_runs", finish_rows, ("horse_id", "event_id"))
         return len(rows_products)
     except Exception as e:
         print(f"Failed to insert product data into BigQuery: {e}")
+        if raise_errors:
+            raise
         return 0
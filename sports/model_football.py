@@ -1,28 +1,138 @@
 import math
+import numpy as np
 import pandas as pd
 
-def fit_poisson(df_matches: pd.DataFrame):
-    """Fit a simple team attack/defence model using goals for/against.
-    df must have columns: home, away, fthg, ftag
+try:  # Optional; without SciPy the plain Poisson fit uses closed-form alternating updates
+    from scipy.optimize import minimize  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    minimize = None  # type: ignore
+
+
+def _prepare_matches(df_matches: pd.DataFrame, xi: float, ref_date=None):
+    df = df_matches.dropna(subset=['home', 'away', 'fthg', 'ftag'])
+    codes, teams = pd.factorize(pd.concat([df['home'], df['away']], ignore_index=True), sort=True)
+    n = len(df)
+    hi = codes[:n].astype(np.int64)
+    ai = codes[n:].astype(np.int64)
+    x = df['fthg'].to_numpy(dtype=float)
+    y = df['ftag'].to_numpy(dtype=float)
+    w = np.ones(n)
+    if xi and 'date' in df.columns:
+        dates = pd.to_datetime(df['date'], errors='coerce')
+        ref = pd.Timestamp(ref_date) if ref_date is not None else dates.max()
+        age_days = (ref - dates).dt.days.fillna(0).clip(lower=0).to_numpy(dtype=float)
+        w = np.exp(-xi * age_days)
+    return list(teams), hi, ai, x, y, w
+
+
+def _fit_alternating(hi, ai, x, y, w, n_teams: int, iters: int = 200, tol: float = 1e-9):
+    """Poisson MLE by alternating exact updates of attack, defence and the two baselines."""
+    att = np.ones(n_teams); dfn = np.ones(n_teams)  # dfn multiplies goals conceded
+    mu_h = max(np.average(x, weights=w), 1e-3); mu_a = max(np.average(y, weights=w), 1e-3)
+    gf = np.bincount(hi, w * x, n_teams) + np.bincount(ai, w * y, n_teams)
+    ga = np.bincount(ai, w * x, n_teams) + np.bincount(hi, w * y, n_teams)
+    for _ in range(iters):
+        prev = att.copy()
+        exp_for = np.bincount(hi, w * mu_h * dfn[ai], n_teams) + np.bincount(ai, w * mu_a * dfn[hi], n_teams)
+        att = gf / np.maximum(exp_for, 1e-12)
+        exp_against = np.bincount(ai, w * mu_h * att[hi], n_teams) + np.bincount(hi, w * mu_a * att[ai], n_teams)
+        dfn = ga / np.maximum(exp_against, 1e-12)
+        mu_h = (w * x).sum() / max((w * att[hi] * dfn[ai]).sum(), 1e-12)
+        mu_a = (w * y).sum() / max((w * att[ai] * dfn[hi]).sum(), 1e-12)
+        if np.max(np.abs(att - prev)) < tol:
+            break
+    la = np.log(np.maximum(att, 1e-12)); ld = np.log(np.maximum(dfn, 1e-12))
+    return la, ld, np.log(mu_h), np.log(mu_a)
+
+
+def _fit_lbfgs(hi, ai, x, y, w, n_teams: int, dixon_coles: bool, init):
+    """Joint MLE of attack/defence/home advantage (and Dixon-Coles rho) with analytic gradients."""
+    la0, ld0, g_h0, g_a0 = init
+    p0 = np.concatenate([la0, ld0, [g_a0, g_h0 - g_a0, 0.0]])
+    m00 = (x == 0) & (y == 0); m01 = (x == 0) & (y == 1)
+    m10 = (x == 1) & (y == 0); m11 = (x == 1) & (y == 1)
+
+    def nll(p):
+        a = p[:n_teams]; d = p[n_teams:2 * n_teams]; gamma, home, rho = p[2 * n_teams:]
+        eta_h = gamma + home + a[hi] + d[ai]
+        eta_a = gamma + a[ai] + d[hi]
+        lam = np.exp(eta_h); mu = np.exp(eta_a)
+        ll = x * eta_h - lam + y * eta_a - mu
+        g_h = x - lam; g_a = y - mu
+        g_rho = 0.0
+        if dixon_coles:
+            tau = np.ones_like(lam)
+            tau[m00] = 1 - lam[m00] * mu[m00] * rho
+            tau[m01] = 1 + lam[m01] * rho
+            tau[m10] = 1 + mu[m10] * rho
+            tau[m11] = 1 - rho
+            tau = np.maximum(tau, 1e-10)
+            ll = ll + np.log(tau)
+            d00 = -lam[m00] * mu[m00] / tau[m00]
+            g_h[m00] += d00 * rho; g_a[m00] += d00 * rho
+            g_h[m01] += lam[m01] * rho / tau[m01]
+            g_a[m10] += mu[m10] * rho / tau[m10]
+            g_rho = (w[m00] * d00).sum() + (w[m01] * lam[m01] / tau[m01]).sum() \
+                + (w[m10] * mu[m10] / tau[m10]).sum() - (w[m11] / tau[m11]).sum()
+        wg_h = w * g_h; wg_a = w * g_a
+        # Small ridge keeps attack/defence identifiable; re-centred after the fit
+        ridge = 1e-6
+        grad = np.empty_like(p)
+        grad[:n_teams] = -(np.bincount(hi, wg_h, n_teams) + np.bincount(ai, wg_a, n_teams)) + 2 * ridge * a
+        grad[n_teams:2 * n_teams] = -(np.bincount(ai, wg_h, n_teams) + np.bincount(hi, wg_a, n_teams)) + 2 * ridge * d
+        grad[2 * n_teams] = -(wg_h.sum() + wg_a.sum())
+        grad[2 * n_teams + 1] = -wg_h.sum()
+        grad[2 * n_teams + 2] = -g_rho
+        return -(w * ll).sum() + ridge * (a @ a + d @ d), grad
+
+    bounds = [(None, None)] * (2 * n_teams + 2) + [((-0.3, 0.3) if dixon_coles else (0.0, 0.0))]
+    res = minimize(nll, p0, jac=True, method='L-BFGS-B', bounds=bounds, options={'maxiter': 500})
+    p = res.x
+    return p[:n_teams], p[n_teams:2 * n_teams], p[2 * n_teams], p[2 * n_teams + 1], p[2 * n_teams + 2], bool(res.success)
+
+
+def fit_team_strengths(df_matches: pd.DataFrame, *, dixon_coles: bool = False, xi: float = 0.0, ref_date=None) -> dict:
+    """Maximum-likelihood team strengths for home/away goal counts.
+
+    Model: home goals ~ Poisson(mu_home * att[h] / deff[a]), away goals ~
+    Poisson(mu_away * att[a] / deff[h]), optionally with the Dixon-Coles
+    low-score correction (``rho``). ``xi`` > 0 down-weights older matches by
+    exp(-xi * days) using the ``date`` column, relative to ``ref_date`` (default:
+    latest match).
+    Returns dict with att, deff, mu_home, mu_away, rho, home_adv, converged.
+    """
+    teams, hi, ai, x, y, w = _prepare_matches(df_matches, xi, ref_date)
+    if not teams:
+        return {'att': {}, 'deff': {}, 'mu_home': 1.3, 'mu_away': 1.1, 'rho': 0.0, 'home_adv': 1.3 / 1.1, 'converged': True}
+    n_teams = len(teams)
+    la, ld, g_h, g_a = _fit_alternating(hi, ai, x, y, w, n_teams)
+    rho = 0.0; converged = True
+    if minimize is not None and dixon_coles:
+        la, ld, gamma, home, rho, converged = _fit_lbfgs(hi, ai, x, y, w, n_teams, True, (la, ld, g_h, g_a))
+        g_a = gamma; g_h = gamma + home
+    # Centre log-attack and log-defence at zero; the baselines absorb the shift
+    ca = la.mean(); cd = ld.mean()
+    la = la - ca; ld = ld - cd
+    g_h = g_h + ca + cd; g_a = g_a + ca + cd
+    return {
+        'att': dict(zip(teams, np.exp(la).tolist())),
+        # match_goal_rates divides by deff, so store the inverse of the conceding multiplier
+        'deff': dict(zip(teams, np.exp(-ld).tolist())),
+        'mu_home': float(np.exp(g_h)),
+        'mu_away': float(np.exp(g_a)),
+        'rho': float(rho),
+        'home_adv': float(np.exp(g_h - g_a)),
+        'converged': converged,
+    }
+
+
+def fit_poisson(df_matches: pd.DataFrame, *, dixon_coles: bool = False, xi: float = 0.0, ref_date=None):
+    """Fit team attack/defence by maximum likelihood (see ``fit_team_strengths``).
+    df must have columns: home, away, fthg, ftag (and date for time decay).
     Returns team attack/defence dicts and league average goals.
     """
-    teams = sorted(set(df_matches['home']).union(df_matches['away']))
-    att = {t: 0.0 for t in teams}
-    deff = {t: 0.0 for t in teams}
-    mu_home = df_matches['fthg'].mean() if len(df_matches) else 1.3
-    mu_away = df_matches['ftag'].mean() if len(df_matches) else 1.1
-    # Simple iterative scaling (not full MLE but ok for starter)
-    for _ in range(10):
-        for t in teams:
-            gf_home = df_matches.loc[df_matches['home']==t, 'fthg']
-            gf_away = df_matches.loc[df_matches['away']==t, 'ftag']
-            ga_home = df_matches.loc[df_matches['home']==t, 'ftag']
-            ga_away = df_matches.loc[df_matches['away']==t, 'fthg']
-            gf = pd.concat([gf_home, gf_away]).mean() if len(gf_home)+len(gf_away)>0 else (mu_home+mu_away)/2
-            ga = pd.concat([ga_home, ga_away]).mean() if len(ga_home)+len(ga_away)>0 else (mu_home+mu_away)/2
-            att[t] = 0.7*att[t] + 0.3*(gf/((mu_home+mu_away)/2))
-            deff[t] = 0.7*deff[t] + 0.3*(ga/((mu_home+mu_away)/2))
-    return att, deff, mu_home, mu_away
+    fit = fit_team_strengths(df_matches, dixon_coles=dixon_coles, xi=xi, ref_date=ref_date)
+    return fit['att'], fit['deff'], fit['mu_home'], fit['mu_away']
 
 
 def match_goal_rates(home_team, away_team, att, deff, mu_home, mu_away):
@@ -31,19 +141,83 @@ def match_goal_rates(home_team, away_team, att, deff, mu_home, mu_away):
     return max(lam_h, 0.05), max(lam_a, 0.05)
 
 
+def goal_rates_batch(home_teams, away_teams, att, deff, mu_home, mu_away):
+    """Vectorized ``match_goal_rates`` for arrays of fixtures; returns (lam_h, lam_a) arrays."""
+    home = pd.Series(list(home_teams), dtype=object)
+    away = pd.Series(list(away_teams), dtype=object)
+    att_h = home.map(att).fillna(1.0).to_numpy(dtype=float)
+    att_a = away.map(att).fillna(1.0).to_numpy(dtype=float)
+    def_h = np.maximum(home.map(deff).fillna(1.0).to_numpy(dtype=float), 1e-6)
+    def_a = np.maximum(away.map(deff).fillna(1.0).to_numpy(dtype=float), 1e-6)
+    return np.maximum(mu_home * att_h / def_a, 0.05), np.maximum(mu_away * att_a / def_h, 0.05)
+
+
 def poisson_pmf(lam, k):
     return math.exp(-lam) * (lam**k) / math.factorial(k)
 
 
 def match_probs_from_rates(lam_h, lam_a, max_goals=10):
-    p_home = p_draw = p_away = 0.0
-    for hg in range(0, max_goals+1):
-        for ag in range(0, max_goals+1):
-            p = poisson_pmf(lam_h, hg) * poisson_pmf(lam_a, ag)
-            if hg > ag: p_home += p
-            elif hg == ag: p_draw += p
-            else: p_away += p
-    # Normalise to 1
-    s = p_home + p_draw + p_away
-    if s <= 0: return 1/3, 1/3, 1/3
-    return p_home/s, p_draw/s, p_away/s
+    out = match_probs_batch([lam_h], [lam_a], max_goals=max_goals, lines=())
+    return float(out['home'][0]), float(out['draw'][0]), float(out['away'][0])
+
+
+# log(k!) for k up to the largest grid we price; extended on demand
+_LOG_FACT = np.cumsum(np.log(np.maximum(np.arange(41, dtype=float), 1.0)))
+
+
+def poisson_pmf_table(rates, max_goals=10):
+    """P(k goals) for k = 0..max_goals, one row per rate: shape (N, max_goals+1)."""
+    global _LOG_FACT
+    if max_goals >= len(_LOG_FACT):
+        _LOG_FACT = np.cumsum(np.log(np.maximum(np.arange(max_goals + 1, dtype=float), 1.0)))
+    lam = np.maximum(np.asarray(rates, dtype=float).reshape(-1, 1), 1e-12)
+    k = np.arange(max_goals + 1, dtype=float)
+    return np.exp(k * np.log(lam) - lam - _LOG_FACT[:max_goals + 1])
+
+
+def score_matrices(lam_h, lam_a, max_goals=10, rho=0.0):
+    """Correct-score matrices for N fixtures: shape (N, G+1, G+1), [n, home goals, away goals].
+
+    ``rho`` applies the Dixon-Coles low-score correction. Each matrix is
+    normalised to sum to 1 over the truncated grid.
+    """
+    lam_h = np.asarray(lam_h, dtype=float).ravel()
+    lam_a = np.asarray(lam_a, dtype=float).ravel()
+    m = poisson_pmf_table(lam_h, max_goals)[:, :, None] * poisson_pmf_table(lam_a, max_goals)[:, None, :]
+    if rho:
+        m[:, 0, 0] *= np.maximum(1 - lam_h * lam_a * rho, 0.0)
+        m[:, 0, 1] *= np.maximum(1 + lam_h * rho, 0.0)
+        m[:, 1, 0] *= np.maximum(1 + lam_a * rho, 0.0)
+        m[:, 1, 1] *= max(1 - rho, 0.0)
+    total = m.sum(axis=(1, 2), keepdims=True)
+    return np.divide(m, total, out=np.full_like(m, 1.0 / (max_goals + 1) ** 2), where=total > 0)
+
+
+def match_probs_batch(lam_h, lam_a, max_goals=10, rho=0.0, lines=(0.5, 1.5, 2.5, 3.5, 4.5), return_matrix=False):
+    """Price N fixtures at once from home/away goal rates.
+
+    Returns a dict of arrays (length N): ``home``, ``draw``, ``away``, and
+    ``over_<line>`` / ``under_<line>`` for each total-goals line (e.g.
+    ``over_2.5``); ``matrix`` holds the (N, G+1, G+1) correct-score grids when
+    ``return_matrix`` is set.
+    """
+    m = score_matrices(lam_h, lam_a, max_goals=max_goals, rho=rho)
+    out = {
+        'home': np.tril(m, -1).sum(axis=(1, 2)),
+        'draw': np.trace(m, axis1=1, axis2=2),
+        'away': np.triu(m, 1).sum(axis=(1, 2)),
+    }
+    if lines:
+        # Distribution of total goals per fixture (anti-diagonal sums), then cumulative for every line at once
+        total_pmf = np.zeros((len(m), 2 * max_goals + 1))
+        for hg in range(max_goals + 1):
+            total_pmf[:, hg:hg + max_goals + 1] += m[:, hg, :]
+        cdf = np.cumsum(total_pmf, axis=1)
+        for line in lines:
+            # Lines past the grid's maximum total (2 * max_goals) are certain unders
+            under = cdf[:, min(int(math.floor(line)), 2 * max_goals)] if line >= 0 else np.zeros(len(m))
+            out[f'under_{line}'] = under
+            out[f'over_{line}'] = 1.0 - under
+    if return_matrix:
+        out['matrix'] = m
+    return out
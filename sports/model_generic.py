@@ -1,3 +1,10 @@
+import bisect
+import os
+
+import numpy as np
+import pandas as pd
+
+
 def elo_update(r_a, r_b, score_a, k=20):
     exp_a = 1.0/(1.0+10**((r_b-r_a)/400.0))
     return r_a + k*(score_a-exp_a)
@@ -16,3 +23,228 @@ def fit_elo(matches):
         rb_new = elo_update(rb, ra, 1.0-score_a)
         ratings[h] = ra_new; ratings[a] = rb_new
     return ratings
+
+
+_SCORE = {'H': 1.0, 'D': 0.5, 'A': 0.0}
+
+
+def _match_frame(matches) -> pd.DataFrame:
+    """Normalise matches (list of dicts or DataFrame with home, away, result[, date]) sorted by date."""
+    df = matches if isinstance(matches, pd.DataFrame) else pd.DataFrame(list(matches))
+    if df.empty:
+        return df
+    if 'date' in df.columns:
+        dates = pd.to_datetime(df['date'], errors='coerce', utc=True).dt.tz_localize(None)
+        df = df.assign(_ts=dates).sort_values('_ts', kind='stable')
+    else:
+        df = df.assign(_ts=pd.NaT)
+    return df
+
+
+def _match_arrays(matches):
+    df = _match_frame(matches)
+    if df.empty:
+        return [], [], np.array([]), np.array([], dtype='datetime64[s]')
+    ts = df['_ts'].to_numpy(dtype='datetime64[s]')
+    score = df['result'].map(_SCORE).to_numpy(dtype=float)
+    return df['home'].tolist(), df['away'].tolist(), score, ts
+
+
+def _match_keys(df: pd.DataFrame, ts) -> list:
+    """Identity of each match: its match_id if given, else (home, away, date, n-th such row in the frame)."""
+    if 'match_id' in df.columns:
+        return [('id', str(m)) for m in df['match_id'].tolist()]
+    seen = {}
+    keys = []
+    for h, a, t in zip(df['home'].tolist(), df['away'].tolist(), ts):
+        base = (str(h), str(a), str(t))
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        keys.append(base + (n,))
+    return keys
+
+
+class EloEngine:
+    """Incremental Elo ratings with array-backed state, snapshots and persistence.
+
+    Ratings live in a float array indexed by team id, so thousands of teams
+    stay compact; ``apply`` only processes new results. Every applied match
+    is kept in a compact history and a full ratings snapshot is taken every
+    ``snapshot_every`` matches, so ``ratings_as_of(date)`` restores the
+    nearest earlier snapshot and replays only the matches after it.
+
+    Applied matches are remembered by key (``match_id`` if the frame has one,
+    else home, away and date), so re-applying a frame is a no-op. History must
+    stay in date order for the snapshots to be valid: matches dated before the
+    last applied one (and undated matches once dated ones were applied) are
+    rejected and counted in ``last_skipped``.
+    """
+
+    def __init__(self, k: float = 20.0, home_adv: float = 0.0, initial: float = 1500.0, snapshot_every: int = 500):
+        self.k = float(k)
+        self.home_adv = float(home_adv)
+        self.initial = float(initial)
+        self.snapshot_every = max(1, int(snapshot_every))
+        self.team_index = {}
+        self.teams = []
+        self.ratings = np.empty(0)
+        self.last_updated = np.empty(0, dtype='datetime64[s]')
+        self.games = np.empty(0, dtype=np.int64)
+        # Applied match history (parallel lists, converted to arrays on save)
+        self._h = []; self._a = []; self._s = []; self._ts = []
+        # Snapshots: (history length, ts, ratings copy)
+        self._snapshots = []
+        self._keys = set()
+        self.last_ts = np.datetime64('NaT', 's')
+        self.last_skipped = {'duplicate': 0, 'out_of_order': 0}
+
+    def _team_id(self, name) -> int:
+        idx = self.team_index.get(name)
+        if idx is None:
+            idx = len(self.teams)
+            self.team_index[name] = idx
+            self.teams.append(name)
+            if idx >= len(self.ratings):
+                grow = max(64, len(self.ratings))
+                self.ratings = np.concatenate([self.ratings, np.full(grow, self.initial)])
+                self.last_updated = np.concatenate([self.last_updated, np.full(grow, np.datetime64('NaT'), dtype='datetime64[s]')])
+                self.games = np.concatenate([self.games, np.zeros(grow, dtype=np.int64)])
+        return idx
+
+    def expected(self, r_home, r_away):
+        return 1.0 / (1.0 + 10 ** ((r_away - r_home - self.home_adv) / 400.0))
+
+    def apply(self, matches) -> int:
+        """Apply new results in date order; returns the number applied.
+
+        Already applied matches are skipped; matches older than the last
+        applied one are rejected (see ``last_skipped``).
+        """
+        df = _match_frame(matches)
+        self.last_skipped = {'duplicate': 0, 'out_of_order': 0}
+        if df.empty:
+            return 0
+        ts = df['_ts'].to_numpy(dtype='datetime64[s]')
+        score = df['result'].map(_SCORE).to_numpy(dtype=float)
+        keys = _match_keys(df, ts)
+        n = 0
+        for h_name, a_name, s, t, key in zip(df['home'].tolist(), df['away'].tolist(), score, ts, keys):
+            if np.isnan(s):
+                continue
+            if key in self._keys:
+                self.last_skipped['duplicate'] += 1
+                continue
+            if not np.isnat(self.last_ts) and (np.isnat(t) or t < self.last_ts):
+                self.last_skipped['out_of_order'] += 1
+                continue
+            self._keys.add(key)
+            if not np.isnat(t):
+                self.last_ts = t
+            h = self._team_id(h_name); a = self._team_id(a_name)
+            delta = self.k * (s - self.expected(self.ratings[h], self.ratings[a]))
+            self.ratings[h] += delta
+            self.ratings[a] -= delta
+            self.last_updated[h] = t; self.last_updated[a] = t
+            self.games[h] += 1; self.games[a] += 1
+            self._h.append(h); self._a.append(a); self._s.append(float(s)); self._ts.append(t)
+            n += 1
+            if len(self._h) % self.snapshot_every == 0:
+                self._snapshots.append((len(self._h), t, self.ratings[:len(self.teams)].copy()))
+        return n
+
+    def rating(self, team) -> float:
+        idx = self.team_index.get(team)
+        return float(self.ratings[idx]) if idx is not None else self.initial
+
+    def ratings_dict(self) -> dict:
+        return dict(zip(self.teams, self.ratings[:len(self.teams)].tolist()))
+
+    def ratings_as_of(self, when) -> dict:
+        """Ratings after all matches dated on or before ``when``."""
+        cutoff = np.datetime64(pd.Timestamp(when).tz_localize(None) if pd.Timestamp(when).tzinfo else pd.Timestamp(when), 's')
+        ts = np.array(self._ts, dtype='datetime64[s]')
+        # apply() keeps history in date order, so matches at or before the cutoff form a prefix (undated count as before)
+        end = int(np.sum(~(ts > cutoff)))
+        pos = bisect.bisect_right([snap[0] for snap in self._snapshots], end) - 1
+        if pos >= 0:
+            start, _, snap = self._snapshots[pos]
+            r = np.full(len(self.teams), self.initial); r[:len(snap)] = snap
+        else:
+            start, r = 0, np.full(len(self.teams), self.initial)
+        for i in range(start, end):
+            h = self._h[i]; a = self._a[i]
+            delta = self.k * (self._s[i] - self.expected(r[h], r[a]))
+            r[h] += delta; r[a] -= delta
+        seen = set(self._h[:end]) | set(self._a[:end])
+        return {self.teams[i]: float(r[i]) for i in sorted(seen)}
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        n = len(self.teams)
+        snaps_len = np.array([s[0] for s in self._snapshots], dtype=np.int64)
+        snaps_ts = np.array([s[1] for s in self._snapshots], dtype='datetime64[s]')
+        snaps = np.full((len(self._snapshots), n), self.initial)
+        for i, (_, _, r) in enumerate(self._snapshots):
+            snaps[i, :len(r)] = r
+        keys = np.empty(len(self._keys), dtype=object)
+        for i, key in enumerate(self._keys):
+            keys[i] = key
+        tmp = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp,
+            params=np.array([self.k, self.home_adv, self.initial, self.snapshot_every]),
+            teams=np.array(self.teams, dtype=object),
+            ratings=self.ratings[:n], last_updated=self.last_updated[:n], games=self.games[:n],
+            hist_h=np.array(self._h, dtype=np.int32), hist_a=np.array(self._a, dtype=np.int32),
+            hist_s=np.array(self._s, dtype=np.float32), hist_ts=np.array(self._ts, dtype='datetime64[s]'),
+            snaps_len=snaps_len, snaps_ts=snaps_ts, snaps=snaps,
+            keys=keys, last_ts=np.array([self.last_ts], dtype='datetime64[s]'),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "EloEngine":
+        z = np.load(path, allow_pickle=True)
+        k, home_adv, initial, snapshot_every = z['params']
+        eng = cls(k=k, home_adv=home_adv, initial=initial, snapshot_every=int(snapshot_every))
+        eng.teams = list(z['teams'])
+        eng.team_index = {t: i for i, t in enumerate(eng.teams)}
+        eng.ratings = z['ratings'].astype(float)
+        eng.last_updated = z['last_updated']
+        eng.games = z['games']
+        eng._h = z['hist_h'].tolist(); eng._a = z['hist_a'].tolist(); eng._s = z['hist_s'].astype(float).tolist()
+        eng._ts = list(z['hist_ts'])
+        eng._snapshots = [(int(l), t, r) for l, t, r in zip(z['snaps_len'], z['snaps_ts'], z['snaps'])]
+        if 'keys' in z.files:
+            eng._keys = set(tuple(k) for k in z['keys'])
+            eng.last_ts = z['last_ts'][0]
+        return eng
+
+
+def elo_sweep(matches, ks, home_advs, initial: float = 1500.0) -> pd.DataFrame:
+    """Replay a history once for every (k, home_adv) combination in parallel.
+
+    Ratings are a (combos, teams) array updated per match with broadcasting,
+    so a grid sweep costs one pass over the matches. Returns a DataFrame of
+    k, home_adv, log_loss and brier on the pre-match expectations (draws
+    count as 0.5).
+    """
+    homes, aways, score, _ = _match_arrays(matches)
+    keep = ~np.isnan(score)
+    codes, _teams = pd.factorize(pd.Series(homes + aways, dtype=object))
+    n = len(homes)
+    hi = codes[:n][keep]; ai = codes[n:][keep]; s = score[keep]
+    grid_k, grid_h = np.meshgrid(np.asarray(ks, dtype=float), np.asarray(home_advs, dtype=float), indexing='ij')
+    k = grid_k.ravel(); ha = grid_h.ravel()
+    r = np.full((len(k), len(_teams)), float(initial))
+    ll = np.zeros(len(k)); br = np.zeros(len(k))
+    for h, a, sc in zip(hi, ai, s):
+        e = 1.0 / (1.0 + 10 ** ((r[:, a] - r[:, h] - ha) / 400.0))
+        ec = np.clip(e, 1e-12, 1 - 1e-12)
+        ll -= sc * np.log(ec) + (1 - sc) * np.log(1 - ec)
+        br += (e - sc) ** 2
+        delta = k * (sc - e)
+        r[:, h] += delta
+        r[:, a] -= delta
+    m = max(1, len(s))
+    return pd.DataFrame({'k': k, 'home_adv': ha, 'log_loss': ll / m, 'brier': br / m}).sort_values('log_loss').reset_index(drop=True)
@@ -0,0 +1,335 @@
+"""Product context (event, bet type, start time) for the pool subscriber.
+
+The subscriber enriches every pool snapshot with its product's event_id,
+bet_type, currency and start_iso. ``ProductContextCache`` keeps those in a
+compact record per product and keeps them fresh without rescanning BigQuery:
+
+- A warm load of products starting within the last ~36 hours, then an
+  incremental refresh every few seconds of only the rows whose
+  ``tote_products.updated_ts`` is past the last watermark, re-reading a
+  short overlap window so rows stamped before a slower commit landed are
+  not missed. Only ``refresh`` advances the watermark.
+- Misses are loaded asynchronously: ``get()`` never blocks, it queues the id
+  for a background loader that batches all queued ids into one BigQuery
+  lookup, falls back to the Tote API for products not ingested yet, and
+  remembers ids found nowhere for a short while. Each id is loaded at most
+  once at a time (single-flight); ``ensure()`` lets worker threads wait for
+  those loads.
+- Contexts for races that went off hours ago are evicted.
+
+Intervals default to the ``tote_ctx_*`` settings in ``sports/config.py``.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..config import cfg
+
+PRODUCT_CONTEXT_QUERY = """
+query GetProductContext($id: String!) {
+  product(id: $id) {
+    id
+    type {
+      ... on BettingProduct {
+        betType { code }
+        legs { nodes { event { id scheduledStartDateTime { iso8601 } } } }
+      }
+    }
+  }
+}
+"""
+
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_.:\-]+$")
+
+
+def _parse_start(start_iso: Optional[str]) -> Optional[float]:
+    if not start_iso:
+        return None
+    try:
+        return datetime.fromisoformat(str(start_iso).replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+class ProductCtx:
+    """Context for one product; ``get`` keeps dict-style call sites working."""
+
+    __slots__ = ("event_id", "bet_type", "currency", "start_iso", "start_ts", "loaded_at")
+
+    def __init__(self, event_id: Optional[str], bet_type: Optional[str], currency: Optional[str], start_iso: Optional[str]) -> None:
+        self.event_id = event_id or None
+        self.bet_type = (bet_type or "").upper() or None
+        self.currency = currency or None
+        self.start_iso = start_iso or None
+        self.start_ts = _parse_start(start_iso)
+        self.loaded_at = time.time()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        v = getattr(self, key, None) if key in self.__slots__ else None
+        return default if v is None else v
+
+
+def _ctx_from_product_node(node: Dict[str, Any]) -> Optional[ProductCtx]:
+    src = (node.get("type") or node) or {}
+    legs = ((src.get("legs") or {}).get("nodes") or [])
+    evt = (legs[0].get("event") or {}) if legs else {}
+    if not evt.get("id"):
+        return None
+    return ProductCtx(
+        evt.get("id"),
+        (src.get("betType") or {}).get("code"),
+        None,
+        (evt.get("scheduledStartDateTime") or {}).get("iso8601"),
+    )
+
+
+class ProductContextCache:
+    def __init__(
+        self,
+        conn: Any,
+        *,
+        http_fetch: Optional[Callable[[List[str]], Dict[str, ProductCtx]]] = None,
+        refresh_s: Optional[float] = None,
+        evict_after_s: Optional[float] = None,
+        negative_ttl_s: Optional[float] = None,
+        overlap_s: Optional[float] = None,
+        batch_max: int = 500,
+    ) -> None:
+        self.conn = conn
+        self.http_fetch = http_fetch
+        self.refresh_s = max(1.0, refresh_s if refresh_s is not None else cfg.tote_ctx_refresh_s)
+        self.evict_after_s = max(600.0, evict_after_s if evict_after_s is not None else cfg.tote_ctx_evict_after_s)
+        self.negative_ttl_s = max(1.0, negative_ttl_s if negative_ttl_s is not None else cfg.tote_ctx_negative_ttl_s)
+        self.overlap_ms = int(1000 * max(0.0, overlap_s if overlap_s is not None else cfg.tote_ctx_overlap_s))
+        self.batch_max = batch_max
+        self._items: Dict[str, ProductCtx] = {}
+        self._negative: Dict[str, float] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self._wanted: Set[str] = set()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self._watermark: Optional[int] = None
+        self._next_refresh = 0.0
+        self._next_evict = 0.0
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "loaded_bq": 0,
+            "loaded_http": 0,
+            "not_found": 0,
+            "refreshes": 0,
+            "refreshed_rows": 0,
+            "evicted": 0,
+            "errors": 0,
+        }
+
+    # -- lookups -----------------------------------------------------------
+    def get(self, pid: str) -> Optional[ProductCtx]:
+        """Cached context, or None after queueing a background load."""
+        ctx = self._items.get(pid)
+        if ctx is not None:
+            self.counters["hits"] += 1
+            return ctx
+        self.counters["misses"] += 1
+        self._request([pid])
+        return None
+
+    def ensure(self, pids: Iterable[str], timeout: float = 5.0) -> Dict[str, ProductCtx]:
+        """Blocking lookup for worker threads: wait (bounded) for queued loads."""
+        pids = [p for p in dict.fromkeys(pids) if p]
+        self._request(pids)
+        deadline = time.monotonic() + timeout
+        for pid in pids:
+            ev = self._inflight.get(pid)
+            if ev is not None:
+                ev.wait(max(0.0, deadline - time.monotonic()))
+        return {pid: self._items[pid] for pid in pids if pid in self._items}
+
+    def _request(self, pids: Iterable[str]) -> None:
+        now = time.monotonic()
+        with self._cond:
+            queued = False
+            for pid in pids:
+                if not pid or pid in self._items or pid in self._inflight:
+                    continue
+                if self._negative.get(pid, 0.0) > now:
+                    continue
+                self._inflight[pid] = threading.Event()
+                self._wanted.add(pid)
+                queued = True
+            if queued:
+                self._cond.notify()
+
+    # -- background loader -------------------------------------------------
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="product-ctx", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stop and not self._wanted and time.monotonic() < self._next_refresh:
+                    self._cond.wait(timeout=max(0.05, self._next_refresh - time.monotonic()))
+                if self._stop:
+                    break
+                batch = list(self._wanted)[: self.batch_max]
+                self._wanted.difference_update(batch)
+            if batch:
+                self._load_ids(batch)
+            now = time.monotonic()
+            if now >= self._next_refresh:
+                self._next_refresh = now + self.refresh_s
+                self.refresh()
+            if now >= self._next_evict:
+                self._next_evict = now + 60.0
+                self.evict()
+        # Release anyone still waiting
+        with self._cond:
+            for ev in self._inflight.values():
+                ev.set()
+            self._inflight.clear()
+
+    def _finish(self, pids: Iterable[str]) -> None:
+        with self._cond:
+            for pid in pids:
+                ev = self._inflight.pop(pid, None)
+                if ev is not None:
+                    ev.set()
+
+    def _store_rows(self, rows: Iterable[Any]) -> Tuple[int, Optional[int]]:
+        """Cache rows; returns (rows stored, max updated_ts seen)."""
+        n = 0
+        max_ts: Optional[int] = None
+        for row in rows:
+            try:
+                pid = str(getattr(row, "product_id", "") or "")
+                if not pid:
+                    continue
+                self._items[pid] = ProductCtx(
+                    str(getattr(row, "event_id", "") or "") or None,
+                    str(getattr(row, "bet_type", "") or "") or None,
+                    str(getattr(row, "currency", "") or "") or None,
+                    str(getattr(row, "start_iso", "") or "") or None,
+                )
+                self._negative.pop(pid, None)
+                ts = getattr(row, "updated_ts", None)
+                if ts is not None and (max_ts is None or int(ts) > max_ts):
+                    max_ts = int(ts)
+                n += 1
+            except Exception:
+                continue
+        return n, max_ts
+
+    def _load_ids(self, pids: List[str]) -> None:
+        self.counters["loads"] += 1
+        try:
+            safe = [p for p in pids if _SAFE_ID.match(p)]
+            if safe:
+                ids = ",".join(f"'{p}'" for p in safe)
+                rs = self.conn.query(
+                    "SELECT product_id, event_id, UPPER(bet_type) AS bet_type, currency, start_iso, updated_ts "
+                    f"FROM tote_products WHERE product_id IN ({ids})"
+                )
+                self.counters["loaded_bq"] += self._store_rows(rs)[0]
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"[PoolSub] product context lookup failed: {e}")
+        missing = [p for p in pids if p not in self._items]
+        if missing and self.http_fetch is not None:
+            try:
+                found = self.http_fetch(missing) or {}
+                for pid, ctx in found.items():
+                    self._items[pid] = ctx
+                self.counters["loaded_http"] += len(found)
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"[PoolSub] product context HTTP fallback failed: {e}")
+        retry_at = time.monotonic() + self.negative_ttl_s
+        for pid in pids:
+            if pid not in self._items:
+                self._negative[pid] = retry_at
+                self.counters["not_found"] += 1
+        self._finish(pids)
+
+    def refresh(self) -> None:
+        """Warm load on first call, then only products updated past the watermark (minus the overlap)."""
+        t0 = time.time()
+        if self._watermark is None:
+            sql = (
+                "SELECT product_id, event_id, UPPER(bet_type) AS bet_type, currency, start_iso, updated_ts "
+                "FROM tote_products "
+                "WHERE SAFE.PARSE_TIMESTAMP('%Y-%m-%dT%H:%M:%SZ', start_iso) >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 36 HOUR)"
+            )
+        else:
+            sql = (
+                "SELECT product_id, event_id, UPPER(bet_type) AS bet_type, currency, start_iso, updated_ts "
+                f"FROM tote_products WHERE updated_ts > {int(self._watermark) - self.overlap_ms}"
+            )
+        try:
+            rs = self.conn.query(sql)
+            n, max_ts = self._store_rows(rs)
+            self.counters["refreshes"] += 1
+            self.counters["refreshed_rows"] += n
+            if self._watermark is None:
+                # Rows written before updated_ts existed carry none; start from now
+                self._watermark = int(t0 * 1000)
+            elif max_ts is not None and max_ts > self._watermark:
+                self._watermark = max_ts
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"[PoolSub] product context refresh failed: {e}")
+
+    def evict(self) -> None:
+        cutoff = time.time() - self.evict_after_s
+        stale = [pid for pid, ctx in list(self._items.items()) if ctx.start_ts is not None and ctx.start_ts < cutoff]
+        for pid in stale:
+            self._items.pop(pid, None)
+        now = time.monotonic()
+        for pid in [p for p, t in list(self._negative.items()) if t <= now]:
+            self._negative.pop(pid, None)
+        self.counters["evicted"] += len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        c = dict(self.counters)
+        c.update({
+            "entries": len(self._items),
+            "inflight": len(self._inflight),
+            "negative": len(self._negative),
+            "watermark": self._watermark,
+            "refresh_s": self.refresh_s,
+            "overlap_ms": self.overlap_ms,
+        })
+        return c
+
+
+def tote_http_fetch(client_factory: Callable[[], Any]) -> Callable[[List[str]], Dict[str, ProductCtx]]:
+    """Fallback loader using ``ToteClient.products_by_id`` (one aliased request per batch)."""
+    holder: Dict[str, Any] = {}
+
+    def _fetch(pids: List[str]) -> Dict[str, ProductCtx]:
+        client = holder.get("client")
+        if client is None:
+            client = holder["client"] = client_factory()
+        out: Dict[str, ProductCtx] = {}
+        for pid, res in zip(pids, client.products_by_id(pids, PRODUCT_CONTEXT_QUERY)):
+            if isinstance(res, Exception):
+                continue
+            ctx = _ctx_from_product_node((res or {}).get("product") or {})
+            if ctx is not None:
+                out[pid] = ctx
+        return out
+
+    return _fetch
@@ -0,0 +1,85 @@
+"""Async single-flight with short-lived result caching and a concurrency cap.
+
+Used by the pool subscriber for its HTTP fallback fetches: a burst of WS
+messages for one product triggers at most one Tote request per
+(query, product) at a time. Callers arriving while it is in flight await the
+same result; callers within ``ttl_s`` of it finishing get the cached result
+(failures are cached too, so a failing product is not hammered).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class AsyncSingleFlight:
+    def __init__(self, *, ttl_s: float = 1.5, max_concurrency: int = 4, max_entries: int = 5000) -> None:
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.max_entries = max(100, int(max_entries))
+        self._sem = asyncio.Semaphore(max(1, int(max_concurrency)))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # key -> (expires_at, ok, value_or_exception)
+        self._cache: Dict[Hashable, Tuple[float, bool, Any]] = {}
+        self.counters = {"calls": 0, "executed": 0, "coalesced": 0, "cache_hits": 0, "errors": 0}
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.counters["calls"] += 1
+        now = time.monotonic()
+        hit = self._cache.get(key)
+        if hit is not None:
+            if hit[0] > now:
+                self.counters["cache_hits"] += 1
+                if hit[1]:
+                    return hit[2]
+                raise hit[2]
+            del self._cache[key]
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            async with self._sem:
+                self.counters["executed"] += 1
+                value = await fn()
+        except Exception as e:
+            self.counters["errors"] += 1
+            self._remember(key, False, e)
+            fut.set_exception(e)
+            # Mark retrieved so an unawaited future does not log "exception never retrieved"
+            fut.exception()
+            raise
+        else:
+            self._remember(key, True, value)
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+            if not fut.done():
+                fut.cancel()
+
+    def _remember(self, key: Hashable, ok: bool, value: Any) -> None:
+        if not self.ttl_s:
+            return
+        if len(self._cache) >= self.max_entries:
+            now = time.monotonic()
+            for k in [k for k, v in self._cache.items() if v[0] <= now]:
+                del self._cache[k]
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+        self._cache[key] = (time.monotonic() + self.ttl_s, ok, value)
+
+    def stats(self) -> Dict[str, Any]:
+        c = dict(self.counters)
+        c.update({
+            "inflight": len(self._inflight),
+            "cached": len(self._cache),
+            "ttl_ms": int(self.ttl_s * 1000),
+            "max_concurrency": self.max_concurrency,
+            "coalesce_ratio": round((c["coalesced"] + c["cache_hits"]) / c["calls"], 4) if c["calls"] else None,
+        })
+        return c
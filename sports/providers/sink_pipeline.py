@@ -0,0 +1,451 @@
+"""Per-table BigQuery flush pipelines for the Tote pool subscriber.
+
+``BigQuerySink.upsert_*`` calls run a load job plus a MERGE and routinely
+take seconds. Calling them from the subscriber's event loop stalls
+``ws.recv()`` long enough for ping timeouts and reconnects. ``SinkPipeline``
+keeps one buffer and one flusher task per sink method (i.e. per table) and
+runs the blocking writes on a dedicated thread pool, so:
+
+- ``submit()`` never awaits; the WebSocket read loop only appends to a list.
+- A slow table only delays its own rows; other tables keep flushing.
+- Each table has at most ``max_inflight`` writes running; while it is at the
+  limit rows accumulate in its buffer up to ``max_pending`` and the oldest
+  are dropped (and counted) beyond that.
+
+With a spool directory (``cfg.tote_sub_spool_dir``) rows are appended to a
+``DiskSpool`` instead of the in-memory buffers. A drainer task reads them back
+into the per-table buffers and the spool checkpoint only advances past rows
+that were written (at-least-once; rows in the spool when the process dies are
+replayed on the next start). Failed writes are retried with backoff instead
+of dropped: transient errors (timeouts, quota, open circuit) indefinitely,
+others ``max_attempts`` times, after which the batch is bisected to find the
+rows that keep failing; those go to ``deadletter.jsonl`` in the spool
+directory and are acknowledged. When a table's buffer is full its further
+rows are parked on disk (only their spool positions are kept) and re-read
+once it has room, so a stuck table never stops the others.
+
+Defaults come from the ``tote_sub_flush_*`` / ``tote_sub_spool_*`` settings
+in ``sports/config.py``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from ..config import cfg
+from ..retry_utils import CircuitOpenError, is_quota_error, is_temporary_error
+from .spool import DiskSpool, SpoolPos
+
+
+def _transient(error: Exception) -> bool:
+    return isinstance(error, CircuitOpenError) or is_quota_error(error) or is_temporary_error(error)
+
+
+class _Ack:
+    __slots__ = ("pos", "done")
+
+    def __init__(self, pos: SpoolPos) -> None:
+        self.pos = pos
+        self.done = False
+
+
+class _TablePipeline:
+    """Buffer, counters and flusher state for one sink method."""
+
+    def __init__(self, method: str) -> None:
+        self.method = method
+        self.buffer: List[Dict[str, Any]] = []
+        # Spool mode only: acknowledgement handle per buffered row, same order
+        self.acks: List[_Ack] = []
+        # Spool mode only: (record position, ack) of rows left on disk while the buffer is full
+        self.parked: Deque[tuple] = deque()
+        self.retries = 0
+        self.wakeup = asyncio.Event()
+        self.inflight = 0
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.task: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.flushes = 0
+        self.last_flush_ms: Optional[float] = None
+        self.max_flush_ms = 0.0
+        self.avg_flush_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def record_flush(self, ms: float) -> None:
+        self.flushes += 1
+        self.last_flush_ms = ms
+        self.max_flush_ms = max(self.max_flush_ms, ms)
+        self.avg_flush_ms = ms if self.avg_flush_ms is None else 0.8 * self.avg_flush_ms + 0.2 * ms
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self.buffer),
+            "inflight": self.inflight,
+            "rows_submitted": self.submitted,
+            "rows_written": self.written,
+            "rows_dropped": self.dropped,
+            "rows_failed": self.failed,
+            "rows_dead_lettered": self.dead_lettered,
+            "rows_parked": len(self.parked),
+            "retry_streak": self.retries,
+            "flushes": self.flushes,
+            "flush_ms_last": None if self.last_flush_ms is None else round(self.last_flush_ms, 1),
+            "flush_ms_avg": None if self.avg_flush_ms is None else round(self.avg_flush_ms, 1),
+            "flush_ms_max": round(self.max_flush_ms, 1),
+            "last_error": self.last_error,
+        }
+
+
+class SinkPipeline:
+    """Independent per-table flushers that run sink writes off the event loop.
+
+    Create and ``submit`` from inside a running event loop; call ``aclose``
+    before the loop ends to flush what is left.
+    """
+
+    def __init__(
+        self,
+        conn: Any,
+        *,
+        name: str = "tote_subscriber",
+        workers: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+        flush_interval_s: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        spool_dir: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+    ) -> None:
+        self.conn = conn
+        self.name = name
+        self.workers = max(1, int(workers or cfg.tote_sub_flush_workers))
+        self.max_inflight = max(1, int(max_inflight or cfg.tote_sub_flush_inflight))
+        self.flush_interval_s = max(0.01, float(flush_interval_s or cfg.tote_sub_flush_interval_ms / 1000.0))
+        self.max_batch = max(1, int(max_batch or cfg.tote_sub_flush_max_batch))
+        self.max_pending = max(self.max_batch, int(max_pending or cfg.tote_sub_flush_max_pending))
+        self.max_attempts = max(1, int(max_attempts or cfg.tote_sub_flush_max_attempts))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-flush")
+        self._tables: Dict[str, _TablePipeline] = {}
+        self._closing = False
+        self._started = time.time()
+        self._extra_stats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._prepare: Dict[str, Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = {}
+        self._inputs_done = False
+        self._spool: Optional[DiskSpool] = None
+        self._spool_task: Optional[asyncio.Task] = None
+        self._acks: Deque[_Ack] = deque()
+        spool_dir = spool_dir if spool_dir is not None else cfg.tote_sub_spool_dir
+        if spool_dir:
+            self._spool = DiskSpool(spool_dir, segment_bytes=cfg.tote_sub_spool_segment_mb << 20)
+            self._dead_letter_path = os.path.join(spool_dir, "deadletter.jsonl")
+            self._spool_sync_s = max(0.05, cfg.tote_sub_spool_sync_ms / 1000.0)
+            self._spool_wakeup = asyncio.Event()
+            self._spool_task = asyncio.get_running_loop().create_task(self._drain_spool())
+            if self._spool.pending():
+                print(f"[PoolSub] replaying spooled rows from {spool_dir} (checkpoint {self._spool.committed})")
+        _register(self)
+
+    def attach_stats(self, name: str, fn: Callable[[], Dict[str, Any]]) -> None:
+        """Include ``fn()`` under ``name`` in ``stats()`` (e.g. an upstream coalescing stage)."""
+        self._extra_stats[name] = fn
+
+    def set_prepare(self, method: str, fn: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]) -> None:
+        """Run ``fn(rows)`` on the flush thread before each ``conn.<method>`` write (may block)."""
+        self._prepare[method] = fn
+
+    def _table(self, method: str) -> _TablePipeline:
+        tp = self._tables.get(method)
+        if tp is None:
+            tp = _TablePipeline(method)
+            tp.slots = asyncio.Semaphore(self.max_inflight)
+            tp.task = asyncio.get_running_loop().create_task(self._run_table(tp))
+            self._tables[method] = tp
+        return tp
+
+    def submit(self, method: str, row: Dict[str, Any]) -> None:
+        """Queue one row for ``conn.<method>``; never blocks the caller."""
+        if self._closing:
+            return
+        tp = self._table(method)
+        tp.submitted += 1
+        if self._spool is not None:
+            self._spool.append({"m": method, "r": row})
+            self._spool_wakeup.set()
+            return
+        tp.buffer.append(row)
+        over = len(tp.buffer) - self.max_pending
+        if over > 0:
+            # Sink can't keep up: shed the oldest rows rather than stall the reader
+            del tp.buffer[:over]
+            tp.dropped += over
+        if len(tp.buffer) == 1 or len(tp.buffer) >= self.max_batch:
+            tp.wakeup.set()
+
+    async def _drain_spool(self) -> None:
+        """Feed spooled rows into the table buffers and checkpoint acknowledged ones."""
+        sp = self._spool
+        assert sp is not None
+        last_sync = last_commit = time.monotonic()
+        while True:
+            self._unpark()
+            if sp.pending():
+                for start, pos, rec in sp.read_entries(self.max_batch):
+                    ack = _Ack(pos)
+                    self._acks.append(ack)
+                    try:
+                        method, row = rec["m"], rec["r"]
+                    except Exception:
+                        ack.done = True
+                        continue
+                    tp = self._table(method)
+                    if tp.parked or len(tp.buffer) >= self.max_pending:
+                        # This table is backed up: leave the row on disk, keep its order
+                        tp.parked.append((start, ack))
+                        continue
+                    tp.buffer.append(row)
+                    tp.acks.append(ack)
+                    if len(tp.buffer) == 1 or len(tp.buffer) >= self.max_batch:
+                        tp.wakeup.set()
+                await asyncio.sleep(0)
+                continue
+            now = time.monotonic()
+            if now - last_sync >= self._spool_sync_s:
+                last_sync = now
+                await asyncio.get_running_loop().run_in_executor(self._executor, sp.sync)
+            if now - last_commit >= 1.0:
+                last_commit = now
+                self._commit_acked()
+            if self._closing and not sp.pending() and not any(tp.parked for tp in self._tables.values()):
+                break
+            self._spool_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._spool_wakeup.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+        self._inputs_done = True
+        for tp in self._tables.values():
+            tp.wakeup.set()
+
+    def _unpark(self) -> None:
+        """Move parked rows back from disk into buffers that have room again."""
+        sp = self._spool
+        for tp in list(self._tables.values()):
+            while tp.parked and len(tp.buffer) < self.max_pending:
+                start, ack = tp.parked.popleft()
+                rec = sp.read_record(start) if sp is not None else None
+                if rec is None:
+                    ack.done = True
+                    continue
+                tp.buffer.append(rec["r"])
+                tp.acks.append(ack)
+                tp.wakeup.set()
+
+    def _dead_letter(self, tp: _TablePipeline, rows: List[Dict[str, Any]], error: Exception) -> None:
+        """Record rows that keep failing next to the spool so the checkpoint can move on."""
+        tp.failed += len(rows)
+        tp.dead_lettered += len(rows)
+        try:
+            with open(self._dead_letter_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps({"m": tp.method, "r": row, "error": str(error)[:300], "ts": int(time.time())}, default=str) + "\n")
+        except Exception as e:
+            print(f"[PoolSub] dead-letter write failed for {tp.method}: {e}")
+        print(f"[PoolSub] {tp.method}: {len(rows)} row(s) moved to dead-letter after repeated failures: {error}")
+
+    def _commit_acked(self) -> None:
+        pos: Optional[SpoolPos] = None
+        while self._acks and self._acks[0].done:
+            pos = self._acks.popleft().pos
+        if pos is not None and self._spool is not None:
+            try:
+                self._spool.commit(pos)
+            except Exception as e:
+                print(f"[PoolSub] spool checkpoint failed: {e}")
+
+    def _write(self, method: str, fn: Callable[[List[Dict[str, Any]]], Any], rows: List[Dict[str, Any]]) -> float:
+        t0 = time.perf_counter()
+        prep = self._prepare.get(method)
+        if prep is not None:
+            try:
+                rows = prep(rows)
+            except Exception as e:
+                print(f"[PoolSub] {method} prepare failed, writing rows as-is: {e}")
+        fn(rows)
+        return (time.perf_counter() - t0) * 1000.0
+
+    async def _write_rows(self, tp: _TablePipeline, rows: List[Dict[str, Any]]) -> None:
+        fn = getattr(self.conn, tp.method, None)
+        if not callable(fn):
+            raise AttributeError(f"sink has no {tp.method}")
+        ms = await asyncio.get_running_loop().run_in_executor(self._executor, self._write, tp.method, fn, rows)
+        tp.written += len(rows)
+        tp.record_flush(ms)
+
+    async def _isolate(self, tp: _TablePipeline, rows: List[Dict[str, Any]], acks: List[_Ack], error: Exception) -> None:
+        """Bisect a batch that keeps failing: write the good halves, dead-letter single bad rows."""
+        if len(rows) == 1:
+            self._dead_letter(tp, rows, error)
+            acks[0].done = True
+            return
+        mid = len(rows) // 2
+        for part, part_acks in ((rows[:mid], acks[:mid]), (rows[mid:], acks[mid:])):
+            try:
+                await self._write_rows(tp, part)
+            except Exception as e:
+                if _transient(e):
+                    raise
+                await self._isolate(tp, part, part_acks, e)
+                continue
+            for a in part_acks:
+                a.done = True
+
+    async def _flush_batch(self, tp: _TablePipeline, rows: List[Dict[str, Any]], acks: List[_Ack]) -> None:
+        attempts = 0
+        try:
+            while True:
+                try:
+                    if attempts >= self.max_attempts:
+                        await self._isolate(tp, rows, acks, RuntimeError(tp.last_error or "write failed"))
+                    else:
+                        await self._write_rows(tp, rows)
+                        for a in acks:
+                            a.done = True
+                    tp.retries = 0
+                    return
+                except Exception as e:
+                    tp.last_error = str(e)[:300]
+                    try:
+                        print(f"[PoolSub] {tp.method} flush of {len(rows)} rows failed: {e}")
+                    except Exception:
+                        pass
+                    if not acks:
+                        # In-memory mode: the batch is dropped
+                        tp.failed += len(rows)
+                        return
+                    # Spooled rows are never dropped: back off and retry. Transient errors
+                    # retry until the sink recovers; others lead to isolating the bad rows.
+                    if not _transient(e):
+                        attempts += 1
+                    tp.retries += 1
+                    await asyncio.sleep(min(30.0, 0.5 * (2 ** min(tp.retries, 6))))
+                    # A bisect interrupted by a transient error may have written some halves
+                    kept = [(r, a) for r, a in zip(rows, acks) if not a.done]
+                    rows, acks = [r for r, _ in kept], [a for _, a in kept]
+                    if not rows:
+                        return
+        finally:
+            tp.inflight -= 1
+            if tp.slots is not None:
+                tp.slots.release()
+            if tp.parked and self._spool is not None:
+                self._spool_wakeup.set()
+
+    async def _run_table(self, tp: _TablePipeline) -> None:
+        assert tp.slots is not None
+        pending: set[asyncio.Task] = set()
+        while True:
+            if not tp.buffer:
+                if self._closing and self._inputs_done and not tp.inflight:
+                    break
+                tp.wakeup.clear()
+                await tp.wakeup.wait()
+                continue
+            if len(tp.buffer) < self.max_batch and not self._closing:
+                # Give small batches up to one interval to fill
+                tp.wakeup.clear()
+                try:
+                    await asyncio.wait_for(tp.wakeup.wait(), timeout=self.flush_interval_s)
+                except asyncio.TimeoutError:
+                    pass
+            await tp.slots.acquire()
+            rows, tp.buffer = tp.buffer[: self.max_batch], tp.buffer[self.max_batch:]
+            acks, tp.acks = tp.acks[: len(rows)], tp.acks[len(rows):]
+            if not rows:
+                tp.slots.release()
+                continue
+            tp.inflight += 1
+            t = asyncio.get_running_loop().create_task(self._flush_batch(tp, rows, acks))
+            t.add_done_callback(lambda _t, tp=tp: tp.wakeup.set())
+            pending.add(t)
+            t.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def aclose(self, timeout: float = 30.0) -> None:
+        """Flush buffered rows, wait for in-flight writes and stop the pool."""
+        self._closing = True
+        deadline = time.monotonic() + timeout
+        if self._spool_task is not None:
+            self._spool_wakeup.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._spool_task), timeout=timeout)
+            except Exception:
+                pass
+        self._inputs_done = True
+        tasks = []
+        for tp in self._tables.values():
+            tp.wakeup.set()
+            if tp.task is not None:
+                tasks.append(tp.task)
+        if tasks:
+            done, not_done = await asyncio.wait(tasks, timeout=max(0.1, deadline - time.monotonic()))
+            for t in not_done:
+                t.cancel()
+        if self._spool is not None:
+            if self._spool_task is not None and not self._spool_task.done():
+                self._spool_task.cancel()
+            # Anything not acknowledged stays in the spool and is replayed next start
+            self._commit_acked()
+            self._spool.close()
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        tables = {m: tp.stats() for m, tp in list(self._tables.items())}
+        out = {
+            "name": self.name,
+            "uptime_s": int(time.time() - self._started),
+            "closing": self._closing,
+            "workers": self.workers,
+            "max_inflight": self.max_inflight,
+            "max_batch": self.max_batch,
+            "max_pending": self.max_pending,
+            "queue_depth": sum(t["queue_depth"] for t in tables.values()),
+            "rows_dropped": sum(t["rows_dropped"] for t in tables.values()),
+            "tables": tables,
+        }
+        if self._spool is not None:
+            out["spool"] = self._spool.stats()
+            out["spool"]["unacked"] = len(self._acks)
+        for name, fn in list(self._extra_stats.items()):
+            try:
+                out[name] = fn()
+            except Exception as e:
+                out[name] = {"error": str(e)}
+        return out
+
+
+_pipelines: Dict[str, SinkPipeline] = {}
+_pipelines_lock = threading.Lock()
+
+
+def _register(pipeline: SinkPipeline) -> None:
+    with _pipelines_lock:
+        _pipelines[pipeline.name] = pipeline
+
+
+def sink_pipeline_stats() -> Dict[str, Any]:
+    """Backpressure metrics for the most recent pipeline of each name."""
+    with _pipelines_lock:
+        items = list(_pipelines.items())
+    return {name: p.stats() for name, p in items}
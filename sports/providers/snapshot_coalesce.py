@@ -0,0 +1,183 @@
+"""Per-product coalescing of WebSocket pool-total snapshots.
+
+Busy pools send several ``PoolTotalChanged`` messages per second close to
+the off, and most of the resulting ``tote_pool_snapshots`` rows are
+redundant. ``SnapshotCoalescer`` sits between the subscriber and the sink:
+
+- At most one row per product per window; within a window only the latest
+  value is kept and it is written when the window closes.
+- Updates whose gross and net moved less than the change threshold since
+  the last written row are dropped.
+- Inside the near-off period every real change is written straight away,
+  and a product status change writes any held value immediately.
+
+The window, thresholds and near-off period default to the
+``tote_snapshot_*`` settings in ``sports/config.py``.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional
+
+from ..config import cfg
+from .product_context import _parse_start
+
+
+class _ProductState:
+    __slots__ = ("last", "last_emit", "pending", "status", "start_ts", "seen")
+
+    def __init__(self) -> None:
+        self.last: Optional[Dict[str, Any]] = None
+        self.last_emit = 0.0
+        self.pending: Optional[Dict[str, Any]] = None
+        self.status: Optional[str] = None
+        self.start_ts: Optional[float] = None
+        self.seen = 0.0
+
+
+class SnapshotCoalescer:
+    """Decide which pool snapshot rows are worth writing.
+
+    ``offer`` returns the rows to write now; ``due`` returns held rows whose
+    window has closed and should be called periodically (see ``tick_s``).
+    """
+
+    def __init__(
+        self,
+        *,
+        window_ms: Optional[float] = None,
+        min_change: Optional[float] = None,
+        min_change_pct: Optional[float] = None,
+        near_off_s: Optional[float] = None,
+        idle_evict_s: float = 6 * 3600,
+    ) -> None:
+        self.window_s = max(0.0, (window_ms if window_ms is not None else cfg.tote_snapshot_window_ms) / 1000.0)
+        self.min_change = max(0.0, min_change if min_change is not None else cfg.tote_snapshot_min_change)
+        self.min_change_pct = max(0.0, min_change_pct if min_change_pct is not None else cfg.tote_snapshot_min_change_pct)
+        self.near_off_s = max(0.0, near_off_s if near_off_s is not None else cfg.tote_snapshot_near_off_s)
+        self.idle_evict_s = idle_evict_s
+        self._products: Dict[str, _ProductState] = {}
+        self._last_evict = time.monotonic()
+        self.counters = {
+            "received": 0,
+            "written": 0,
+            "superseded": 0,
+            "below_threshold": 0,
+            "status_flushes": 0,
+            "near_off": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_s > 0
+
+    @property
+    def tick_s(self) -> float:
+        return max(0.05, self.window_s / 2.0)
+
+    def _moved(self, prev: Optional[Dict[str, Any]], row: Dict[str, Any]) -> bool:
+        if prev is None:
+            return True
+        for k in ("total_gross", "total_net", "rollover"):
+            a, b = prev.get(k), row.get(k)
+            if a is None or b is None:
+                if a is not b:
+                    return True
+                continue
+            diff = abs(float(b) - float(a))
+            if diff >= self.min_change or (a and diff * 100.0 >= abs(float(a)) * self.min_change_pct):
+                return True
+        return False
+
+    def _emit(self, st: _ProductState, row: Dict[str, Any], now: float) -> List[Dict[str, Any]]:
+        st.last = row
+        st.last_emit = now
+        st.pending = None
+        self.counters["written"] += 1
+        return [row]
+
+    def offer(self, row: Dict[str, Any], *, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        self.counters["received"] += 1
+        if not self.enabled:
+            self.counters["written"] += 1
+            return [row]
+        now = time.monotonic() if now is None else now
+        pid = str(row.get("product_id") or "")
+        st = self._products.get(pid)
+        if st is None:
+            st = self._products[pid] = _ProductState()
+        st.seen = now
+        if st.start_ts is None:
+            st.start_ts = _parse_start(row.get("start_iso"))
+        status = row.get("status")
+        if status is not None and status != st.status:
+            st.status = status
+            self.counters["status_flushes"] += 1
+            return self._emit(st, row, now)
+        if not self._moved(st.last, row):
+            if st.pending is not None:
+                # Value drifted back to what was last written; nothing to hold
+                st.pending = None
+                self.counters["superseded"] += 1
+            self.counters["below_threshold"] += 1
+            return []
+        if st.start_ts is not None and abs(st.start_ts - time.time()) <= self.near_off_s:
+            self.counters["near_off"] += 1
+            if st.pending is not None:
+                self.counters["superseded"] += 1
+            return self._emit(st, row, now)
+        if now - st.last_emit >= self.window_s:
+            if st.pending is not None:
+                self.counters["superseded"] += 1
+            return self._emit(st, row, now)
+        if st.pending is not None:
+            self.counters["superseded"] += 1
+        st.pending = row
+        return []
+
+    def status_changed(self, product_id: str, status: Optional[str], *, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Record a product status change; returns the held row (if any) to write now."""
+        st = self._products.get(str(product_id))
+        if st is None or status is None or status == st.status:
+            if st is not None:
+                st.status = status if status is not None else st.status
+            return []
+        st.status = status
+        if st.pending is None:
+            return []
+        self.counters["status_flushes"] += 1
+        return self._emit(st, st.pending, time.monotonic() if now is None else now)
+
+    def due(self, *, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Held rows whose window has closed."""
+        now = time.monotonic() if now is None else now
+        out: List[Dict[str, Any]] = []
+        for st in self._products.values():
+            if st.pending is not None and now - st.last_emit >= self.window_s:
+                out.extend(self._emit(st, st.pending, now))
+        if now - self._last_evict > 60.0:
+            self._last_evict = now
+            stale = [pid for pid, st in self._products.items() if st.pending is None and now - st.seen > self.idle_evict_s]
+            for pid in stale:
+                del self._products[pid]
+        return out
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Every held row, regardless of window (used on shutdown)."""
+        now = time.monotonic()
+        return [r for st in self._products.values() if st.pending is not None for r in self._emit(st, st.pending, now)]
+
+    def stats(self) -> Dict[str, Any]:
+        c = dict(self.counters)
+        c.update({
+            "enabled": self.enabled,
+            "window_ms": int(self.window_s * 1000),
+            "min_change": self.min_change,
+            "min_change_pct": self.min_change_pct,
+            "near_off_s": self.near_off_s,
+            "products": len(self._products),
+            "held": sum(1 for st in self._products.values() if st.pending is not None),
+            "write_ratio": round(c["written"] / c["received"], 4) if c["received"] else None,
+        })
+        return c
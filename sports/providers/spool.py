@@ -0,0 +1,265 @@
+"""Append-only, segment-rotated on-disk spool backed by memory-mapped files.
+
+The pool subscriber writes every sink row here before it is flushed to
+BigQuery, so a slow or failing sink no longer means dropped rows: a drainer
+reads records back in order and commits a checkpoint only once everything
+before it has been written (at-least-once delivery).
+
+Layout of ``<dir>``:
+- ``seg-00000001.spool`` ...: fixed-size, preallocated segments. Each record
+  is framed as ``<u32 length><u32 crc32><payload>``; a zero length marks the
+  end of written data. A record that does not fit rolls over to a new segment.
+- ``checkpoint.json``: ``{"segment": n, "offset": o}`` of the first record not
+  yet acknowledged. Segments entirely before it are deleted on commit.
+
+Writes land in the page cache (they survive a process crash); ``sync()``
+msyncs the active segment for durability across a host crash. A torn last
+record fails its CRC and is discarded when the spool is reopened.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+_HEADER = struct.Struct("<II")
+_END = b"\x00" * _HEADER.size
+
+# (segment index, byte offset)
+SpoolPos = Tuple[int, int]
+
+
+class _Segment:
+    def __init__(self, path: str, index: int, size: int, *, create: bool) -> None:
+        self.path = path
+        self.index = index
+        mode = "w+b" if create else "r+b"
+        self._f = open(path, mode)
+        if create:
+            self._f.truncate(size)
+        self.size = os.fstat(self._f.fileno()).st_size
+        self.mm = mmap.mmap(self._f.fileno(), self.size)
+
+    def close(self) -> None:
+        try:
+            self.mm.close()
+        finally:
+            self._f.close()
+
+    def read_at(self, off: int) -> Tuple[Optional[bytes], int]:
+        """Return (payload, next offset); payload None at end of data or a torn record."""
+        if off + _HEADER.size > self.size:
+            return None, off
+        length, crc = _HEADER.unpack_from(self.mm, off)
+        end = off + _HEADER.size + length
+        if length == 0 or end > self.size:
+            return None, off
+        payload = self.mm[off + _HEADER.size:end]
+        if zlib.crc32(payload) != crc:
+            return None, off
+        return payload, end
+
+
+class DiskSpool:
+    """Single-writer, single-reader persistent queue of JSON records."""
+
+    def __init__(self, directory: str, *, segment_bytes: int = 64 << 20) -> None:
+        self.dir = directory
+        self.segment_bytes = max(1 << 16, int(segment_bytes))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments: Dict[int, _Segment] = {}
+        self.appended = 0
+        self.read_records = 0
+        self.syncs = 0
+        indexes = sorted(self._list_indexes())
+        self.committed: SpoolPos = self._load_checkpoint() or ((indexes[0], 0) if indexes else (1, 0))
+        if indexes:
+            # Resume writing after the last intact record of the newest segment
+            seg = self._open(indexes[-1])
+            off = 0
+            while True:
+                payload, nxt = seg.read_at(off)
+                if payload is None:
+                    break
+                off = nxt
+            self._mark_end(seg, off)
+            self.write_pos: SpoolPos = (seg.index, off)
+        else:
+            self._open(1, create=True)
+            self.write_pos = (1, 0)
+        if self.committed > self.write_pos:
+            self.committed = self.write_pos
+        self.read_pos: SpoolPos = self.committed
+
+    # -- files -------------------------------------------------------------
+    def _list_indexes(self) -> List[int]:
+        out = []
+        for name in os.listdir(self.dir):
+            if name.startswith("seg-") and name.endswith(".spool"):
+                try:
+                    out.append(int(name[4:-6]))
+                except ValueError:
+                    continue
+        return out
+
+    def _path(self, index: int) -> str:
+        return os.path.join(self.dir, f"seg-{index:08d}.spool")
+
+    def _open(self, index: int, *, create: bool = False, size: Optional[int] = None) -> _Segment:
+        seg = self._segments.get(index)
+        if seg is None:
+            seg = _Segment(self._path(index), index, size or self.segment_bytes, create=create)
+            self._segments[index] = seg
+        return seg
+
+    def _load_checkpoint(self) -> Optional[SpoolPos]:
+        try:
+            with open(os.path.join(self.dir, "checkpoint.json"), "r", encoding="utf-8") as f:
+                rec = json.load(f)
+            return int(rec["segment"]), int(rec["offset"])
+        except Exception:
+            return None
+
+    @staticmethod
+    def _mark_end(seg: _Segment, off: int) -> None:
+        if off + _HEADER.size <= seg.size:
+            seg.mm[off:off + _HEADER.size] = _END
+
+    # -- writer ------------------------------------------------------------
+    def append(self, record: Any) -> SpoolPos:
+        payload = json.dumps(record, separators=(",", ":"), default=str).encode("utf-8")
+        frame_len = _HEADER.size + len(payload)
+        with self._lock:
+            index, off = self.write_pos
+            seg = self._open(index)
+            if off + frame_len + _HEADER.size > seg.size:
+                # Roll over; oversized records get a segment of their own size
+                index += 1
+                seg = self._open(index, create=True, size=max(self.segment_bytes, frame_len + _HEADER.size))
+                off = 0
+            seg.mm[off + _HEADER.size:off + frame_len] = payload
+            self._mark_end(seg, off + frame_len)
+            _HEADER.pack_into(seg.mm, off, len(payload), zlib.crc32(payload))
+            self.write_pos = (index, off + frame_len)
+            self.appended += 1
+            return self.write_pos
+
+    def sync(self) -> None:
+        with self._lock:
+            seg = self._segments.get(self.write_pos[0])
+            if seg is not None:
+                seg.mm.flush()
+                self.syncs += 1
+
+    # -- reader ------------------------------------------------------------
+    def pending(self) -> bool:
+        return self.read_pos < self.write_pos
+
+    def read(self, max_records: int = 1000) -> List[Tuple[SpoolPos, Any]]:
+        """Next records after the read cursor as (position after record, record)."""
+        return [(end, rec) for _start, end, rec in self.read_entries(max_records)]
+
+    def read_entries(self, max_records: int = 1000) -> List[Tuple[SpoolPos, SpoolPos, Any]]:
+        """Like ``read`` but as (record position, position after record, record)."""
+        out: List[Tuple[SpoolPos, SpoolPos, Any]] = []
+        with self._lock:
+            index, off = self.read_pos
+            while len(out) < max_records and (index, off) < self.write_pos:
+                if not os.path.exists(self._path(index)) and index not in self._segments:
+                    index, off = index + 1, 0
+                    continue
+                seg = self._open(index)
+                payload, nxt = seg.read_at(off)
+                if payload is None:
+                    if index < self.write_pos[0]:
+                        index, off = index + 1, 0
+                        continue
+                    break
+                start, off = (index, off), nxt
+                try:
+                    out.append((start, (index, off), json.loads(payload)))
+                except Exception:
+                    continue
+            self.read_pos = (index, off)
+            self.read_records += len(out)
+        return out
+
+    def read_record(self, pos: SpoolPos) -> Any:
+        """Re-read the record stored at ``pos`` (a position from ``read_entries``); None if gone."""
+        with self._lock:
+            if pos < self.committed or not os.path.exists(self._path(pos[0])):
+                return None
+            payload, _ = self._open(pos[0]).read_at(pos[1])
+        if payload is None:
+            return None
+        try:
+            return json.loads(payload)
+        except Exception:
+            return None
+
+    def rewind(self) -> None:
+        """Move the read cursor back to the last checkpoint (records are re-read)."""
+        with self._lock:
+            self.read_pos = self.committed
+
+    def commit(self, pos: SpoolPos) -> None:
+        """Persist ``pos`` as the first unacknowledged record; drop older segments."""
+        with self._lock:
+            if pos <= self.committed:
+                return
+            self.committed = pos
+            path = os.path.join(self.dir, "checkpoint.json")
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"segment": pos[0], "offset": pos[1]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            for index in sorted(self._list_indexes()):
+                if index >= pos[0]:
+                    break
+                seg = self._segments.pop(index, None)
+                if seg is not None:
+                    seg.close()
+                try:
+                    os.remove(self._path(index))
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        with self._lock:
+            for seg in self._segments.values():
+                try:
+                    seg.mm.flush()
+                    seg.close()
+                except Exception:
+                    pass
+            self._segments.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segs = self._list_indexes()
+            backlog = 0
+            if self.committed[0] == self.write_pos[0]:
+                backlog = self.write_pos[1] - self.committed[1]
+            else:
+                backlog = (self._segments[self.committed[0]].size - self.committed[1]) if self.committed[0] in self._segments else 0
+                backlog += sum(self._segments[i].size for i in segs if self.committed[0] < i < self.write_pos[0] and i in self._segments)
+                backlog += self.write_pos[1]
+            return {
+                "dir": self.dir,
+                "segments": len(segs),
+                "write_pos": list(self.write_pos),
+                "read_pos": list(self.read_pos),
+                "committed": list(self.committed),
+                "backlog_bytes": backlog,
+                "appended": self.appended,
+                "read": self.read_records,
+                "syncs": self.syncs,
+            }
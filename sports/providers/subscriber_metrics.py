@@ -0,0 +1,132 @@
+"""Message counters, processing latency and a raw-frame tap for the pool subscriber.
+
+``MessageStats`` times every frame from ``ws.recv()`` returning to its rows
+being handed to the sink, per message type (i.e. per handler), keeps a
+bounded sample of latencies for percentiles and counts frames of types no
+handler was registered for.
+
+``MessageTap`` records the raw frames the subscriber receives so a
+production stream can be replayed offline (``scripts/bench_tote_ws_replay.py``).
+Enable it with TOTE_WS_TAP=<path> (``.gz`` for gzip); each line is
+``{"t": <receive ts ms>, "raw": <frame text>}``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+def _percentile(sorted_vals, q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return round(sorted_vals[i], 4)
+
+
+class MessageStats:
+    def __init__(self, sample_size: int = 20000) -> None:
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=sample_size)
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.messages = 0
+            self.errors = 0
+            self.skipped: Dict[str, int] = {}
+            self.by_type: Dict[str, Dict[str, float]] = {}
+            self._samples.clear()
+
+    def record(self, message_type: str, seconds: float, *, error: bool = False) -> None:
+        with self._lock:
+            self.messages += 1
+            if error:
+                self.errors += 1
+            t = self.by_type.get(message_type)
+            if t is None:
+                t = self.by_type[message_type] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            ms = seconds * 1000.0
+            t["count"] += 1
+            t["total_ms"] += ms
+            if ms > t["max_ms"]:
+                t["max_ms"] = ms
+            self._samples.append(ms)
+
+    def skip(self, message_type: str) -> None:
+        with self._lock:
+            self.skipped[message_type] = self.skipped.get(message_type, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            elapsed = max(1e-9, time.time() - self.started)
+            return {
+                "messages": self.messages,
+                "errors": self.errors,
+                "skipped": dict(self.skipped),
+                "messages_per_s": round(self.messages / elapsed, 1),
+                "latency_ms": {
+                    "p50": _percentile(samples, 0.50),
+                    "p95": _percentile(samples, 0.95),
+                    "p99": _percentile(samples, 0.99),
+                    "max": round(samples[-1], 4) if samples else None,
+                },
+                "by_type": {
+                    k: {
+                        "count": int(v["count"]),
+                        "avg_ms": round(v["total_ms"] / v["count"], 4) if v["count"] else None,
+                        "max_ms": round(v["max_ms"], 3),
+                    }
+                    for k, v in self.by_type.items()
+                },
+            }
+
+
+class MessageTap:
+    def __init__(self, path: str) -> None:
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._f = gzip.open(path, "at", encoding="utf-8") if path.endswith(".gz") else open(path, "a", encoding="utf-8")
+        self._last_flush = time.monotonic()
+        self.frames = 0
+
+    def write(self, ts_ms: int, raw: Any) -> None:
+        if isinstance(raw, (bytes, bytearray)):
+            raw = raw.decode("utf-8", errors="replace")
+        self._f.write(json.dumps({"t": ts_ms, "raw": raw}, separators=(",", ":")) + "\n")
+        self.frames += 1
+        now = time.monotonic()
+        if now - self._last_flush > 5.0:
+            self._last_flush = now
+            self._f.flush()
+
+    def close(self) -> None:
+        try:
+            self._f.close()
+        except Exception:
+            pass
+
+
+def open_tap_from_env() -> Optional[MessageTap]:
+    path = (os.getenv("TOTE_WS_TAP") or "").strip()
+    if not path:
+        return None
+    try:
+        tap = MessageTap(path)
+        print(f"[PoolSub] tapping raw frames to {path}")
+        return tap
+    except Exception as e:
+        print(f"[PoolSub] could not open tap {path}: {e}")
+        return None
+
+
+# Process-wide; also reported under "messages" in the subscriber's sink pipeline stats
+message_stats = MessageStats()
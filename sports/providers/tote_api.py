@@ -1,14 +1,25 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import random
+import re
 import time
-from typing import Any, Dict, List, Optional
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 import os
 import threading
 
+try:
+    import ijson  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    ijson = None  # type: ignore
+
 from ..config import cfg
+from ..retry_utils import CircuitOpenError, get_circuit_breaker, get_retry_budget
+from .tote_cassette import CassetteMiss, ToteCassette, default_cassette
 from urllib.parse import urljoin, urlparse, urlunparse
 
 
@@ -22,9 +33,12 @@ class ToteClient:
     Expects env/config:
     - cfg.tote_api_key: API key string (required)
     - cfg.tote_graphql_url: HTTPS GraphQL endpoint base (required)
+
+    Pass ``cassette=`` (or set TOTE_CASSETTE) to record responses to, or
+    replay them from, an on-disk cassette; see ``tote_cassette``.
     """
 
-    def __init__(self, *, timeout: float = 15.0, max_retries: int = 2, base_url: Optional[str] = None, api_key: Optional[str] = None) -> None:
+    def __init__(self, *, timeout: float = 15.0, max_retries: int = 2, base_url: Optional[str] = None, api_key: Optional[str] = None, cassette: Optional[ToteCassette] = None) -> None:
         if not (base_url or cfg.tote_graphql_url):
             raise ToteError("TOTE_GRAPHQL_URL is not configured")
         if not (api_key or cfg.tote_api_key):
@@ -45,6 +59,7 @@ class ToteClient:
             "Accept": "application/json",
             "User-Agent": "autobet/0.1 (+tote)",
         }
+        self.cassette = cassette if cassette is not None else default_cassette()
 
     # No alternate URL swapping for HTTP GraphQL; stick to gateway
 
@@ -72,25 +87,56 @@ class ToteClient:
     def base_url(self, value: str) -> None:
         self._base_url = self._normalize_http_endpoint(value or "")
 
-    def _post_json(self, url: str, payload: Dict[str, Any], *, headers_override: Optional[Dict[str, Any]] = None, keep_auth: Optional[bool] = None) -> Dict[str, Any]:
+    def _post_json(self, url: str, payload: Dict[str, Any], *, headers_override: Optional[Dict[str, Any]] = None, keep_auth: Optional[bool] = None, stream: bool = False) -> Any:
+        """POST with retries; returns parsed JSON, or the open response when ``stream=True``."""
+        if self.cassette is not None and self.cassette.replaying:
+            try:
+                return self.cassette.replay(payload.get("query", ""), payload.get("variables"))
+            except CassetteMiss as e:
+                raise ToteError(str(e)) from e
         last_err: Optional[Exception] = None
+        # Shared across all Tote call sites: fail fast while the API is down and
+        # keep retries to a fraction of recent traffic.
+        breaker = get_circuit_breaker("tote")
+        budget = get_retry_budget("tote")
+        budget.record_request()
         for attempt in range(self.max_retries + 1):
+            retry_after: Optional[float] = None
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                raise ToteError(str(e)) from e
             try:
                 _rate_limiter.acquire()
-                send_headers = dict(headers_override or self.headers)
-                resp = self.session.post(url, headers=send_headers, json=payload, timeout=self.timeout)
-                # Handle redirects explicitly (301/302/303/307/308)
-                if 300 <= resp.status_code < 400:
-                    loc = resp.headers.get("Location")
-                    if loc:
-                        try:
-                            target = urljoin(url + ("/" if not url.endswith("/") else ""), loc)
-                            resp = self.session.post(target, headers=send_headers, json=payload, timeout=self.timeout)
-                        except Exception as e:
-                            last_err = e
-                            raise
+                status: Optional[int] = None
+                t0 = time.monotonic()
+                try:
+                    send_headers = dict(headers_override or self.headers)
+                    resp = self.session.post(url, headers=send_headers, json=payload, timeout=self.timeout, stream=stream)
+                    # Handle redirects explicitly (301/302/303/307/308)
+                    if 300 <= resp.status_code < 400:
+                        loc = resp.headers.get("Location")
+                        if loc:
+                            try:
+                                target = urljoin(url + ("/" if not url.endswith("/") else ""), loc)
+                                resp = self.session.post(target, headers=send_headers, json=payload, timeout=self.timeout, stream=stream)
+                            except Exception as e:
+                                last_err = e
+                                raise
+                        else:
+                            raise requests.HTTPError(f"{resp.status_code} Redirect without Location for url: {url}")
+                    status = resp.status_code
+                    retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                finally:
+                    # Feed the adaptive limiter with the outcome (status None = transport error)
+                    _rate_limiter.release(status, time.monotonic() - t0, retry_after)
+                    if status is None or status == 429 or status >= 500:
+                        breaker.record_failure(RuntimeError(f"HTTP {status} from {url}" if status else f"No response from {url}"))
+                    elif status >= 400:
+                        # A rejected request says nothing about the upstream's health either way
+                        breaker.record_neutral()
                     else:
-                        raise requests.HTTPError(f"{resp.status_code} Redirect without Location for url: {url}")
+                        breaker.record_success()
                 if resp.status_code >= 400:
                     # Include a snippet of body to aid debugging of 4xx/5xx
                     snippet = ""
@@ -100,9 +146,13 @@ class ToteClient:
                     except Exception:
                         snippet = ""
                     raise requests.HTTPError(f"{resp.status_code} Client Error: {resp.reason} for url: {url}{snippet}")
+                if stream:
+                    # Caller parses the body incrementally (and closes the response)
+                    resp.raw.decode_content = True
+                    return resp
                 # OK – parse JSON or raise a descriptive error
                 try:
-                    return resp.json()
+                    data = resp.json()
                 except Exception:
                     ctype = resp.headers.get("Content-Type", "")
                     t = None
@@ -112,11 +162,16 @@ class ToteClient:
                         t = ""
                     snippet = (t[:300].replace("\n"," ") if t else "")
                     raise requests.HTTPError(f"Invalid JSON (Content-Type: {ctype}) for url: {resp.url}: {snippet}")
+                if self.cassette is not None and self.cassette.recording:
+                    self.cassette.record(payload.get("query", ""), payload.get("variables"), data, url=url)
+                return data
             except Exception as e:
                 last_err = e
-                # simple backoff
+                # Jittered exponential backoff; Retry-After pauses are applied by the limiter
                 if attempt < self.max_retries:
-                    time.sleep(0.5 * (2 ** attempt))
+                    if not budget.try_retry():
+                        break
+                    time.sleep(_rate_limiter.backoff_delay(attempt, retry_after))
         raise ToteError(str(last_err) if last_err else "request failed")
 
     def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None, *, keep_auth: Optional[bool] = None) -> Dict[str, Any]:
@@ -150,6 +205,112 @@ class ToteClient:
             raise ToteError(f"GraphQL errors on {url}: {json.dumps(errs)}")
         return (data.get("data") if isinstance(data, dict) else data) or {}
 
+    def product(self, product_id: str, query: str) -> Dict[str, Any]:
+        """Fetch one product with a single-product query, coalescing concurrent calls.
+
+        ``query`` is any ``product(id: $id) { ... }`` document; concurrent
+        callers (across threads and ToteClient instances) using the same
+        selection are merged into one aliased request. Returns the same
+        ``{"product": ...}`` shape as ``graphql(query, {"id": product_id})``.
+        """
+        if self.cassette is not None:
+            # Timing-dependent batches would not replay; keep one request per id
+            res = self.products_by_id([product_id], query)[0]
+            if isinstance(res, Exception):
+                raise res
+            return res
+        return _product_batcher.submit(self, product_selection(query), str(product_id))
+
+    def products_by_id(self, product_ids: List[str], query: str, *, batch_size: Optional[int] = None) -> List[Any]:
+        """Fetch many products as aliased batch requests of up to ``batch_size``.
+
+        Results are in input order: ``{"product": ...}`` per id, or the
+        exception for ids the API rejected.
+        """
+        selection = product_selection(query)
+        size = max(1, int(batch_size or PRODUCT_BATCH_MAX))
+        out: List[Any] = []
+        for i in range(0, len(product_ids), size):
+            chunk = [str(pid) for pid in product_ids[i:i + size]]
+            doc, variables = build_product_batch_query(selection, chunk)
+            try:
+                raw = self.graphql_raw(doc, variables)
+                out.extend(split_product_batch(raw, len(chunk)))
+            except Exception as e:
+                out.extend([e] * len(chunk))
+        return out
+
+    def graphql_raw(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """POST a GraphQL document and return the full response (data and errors) without raising on errors."""
+        data = self._post_json(self.base_url, {"query": query, "variables": variables or {}})
+        return data if isinstance(data, dict) else {}
+
+    def iter_connection_nodes(self, query: str, variables: Optional[Dict[str, Any]], field: str, *, page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield ``data.<field>.nodes`` one node at a time across all pages.
+
+        With ijson installed the response body is parsed incrementally, so
+        only the page's nodes are kept, never the raw body or a full parse
+        tree; otherwise (or while a cassette is active) each page is loaded
+        with ``graphql``. Either way a page is read to the end, its response
+        closed and its GraphQL errors raised before any of its nodes is
+        yielded, so callers never write part of a failed page and never hold
+        the connection open during their own I/O. Pagination follows
+        ``pageInfo { hasNextPage endCursor }`` via ``$after``.
+        """
+        variables = dict(variables or {})
+        if page_size:
+            variables["first"] = page_size
+        while True:
+            if ijson is not None and self.cassette is None:
+                nodes, page_info = self._read_page_nodes(query, variables, field)
+                yield from nodes
+            else:
+                data = self.graphql(query, variables)
+                conn = (data.get(field) or {}) if isinstance(data, dict) else {}
+                yield from (conn.get("nodes") or [])
+                page_info = conn.get("pageInfo") or {}
+            if page_info.get("hasNextPage") and page_info.get("endCursor"):
+                variables["after"] = page_info["endCursor"]
+            else:
+                break
+
+    def _read_page_nodes(self, query: str, variables: Dict[str, Any], field: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Parse one page off the wire with ijson; returns (nodes, pageInfo) once the response is closed."""
+        url = self.base_url
+        resp = self._post_json(url, {"query": query, "variables": variables}, stream=True)
+        node_prefix = f"data.{field}.nodes.item"
+        info_prefix = f"data.{field}.pageInfo."
+        nodes: List[Dict[str, Any]] = []
+        page_info: Dict[str, Any] = {}
+        errors: List[Any] = []
+        builder = None
+        building = None
+        try:
+            for prefix, event, value in ijson.parse(resp.raw, use_float=True):
+                if builder is not None:
+                    builder.event(event, value)
+                    if prefix == building and event == "end_map":
+                        if building == node_prefix:
+                            nodes.append(builder.value)
+                        else:
+                            errors.append(builder.value)
+                        builder = building = None
+                    continue
+                if event == "start_map" and prefix in (node_prefix, "errors.item"):
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                    building = prefix
+                elif prefix.startswith(info_prefix) and event in ("boolean", "string", "null"):
+                    page_info[prefix[len(info_prefix):]] = value
+        except ijson.JSONError as e:
+            ctype = resp.headers.get("Content-Type", "")
+            raise ToteError(f"Invalid JSON (Content-Type: {ctype}) for url: {url}: {e}")
+        finally:
+            resp.close()
+        if errors:
+            raise ToteError(f"GraphQL errors on {url}: {json.dumps(errors)}")
+        return nodes, page_info
+
     def graphql_sdl(self) -> str:
         """Return schema SDL. Tries introspection; falls back to GET ?sdl on gateway.
 
@@ -270,6 +431,160 @@ class ToteClient:
             return resp.text
 
 
+# Aliased batching of single-product lookups.
+# TOTE_PRODUCT_BATCH_MAX       – max products per aliased request (default 25)
+# TOTE_PRODUCT_BATCH_WINDOW_MS – how long the first caller waits for others (default 20)
+try:
+    PRODUCT_BATCH_MAX = max(1, int(os.getenv("TOTE_PRODUCT_BATCH_MAX", "25")))
+    PRODUCT_BATCH_WINDOW_S = max(0.0, float(os.getenv("TOTE_PRODUCT_BATCH_WINDOW_MS", "20")) / 1000.0)
+except Exception:
+    PRODUCT_BATCH_MAX, PRODUCT_BATCH_WINDOW_S = 25, 0.02
+
+_PRODUCT_FIELD_RE = re.compile(r"product\s*\(\s*id\s*:\s*\$\w+\s*\)\s*\{")
+
+
+def product_selection(query: str) -> str:
+    """Return the ``{ ... }`` selection set of ``product(id: $id)`` in a single-product query."""
+    m = _PRODUCT_FIELD_RE.search(query or "")
+    if not m:
+        raise ToteError("query does not contain a product(id: $id) { ... } field")
+    start = m.end() - 1
+    depth = 0
+    for i in range(start, len(query)):
+        ch = query[i]
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return " ".join(query[start:i + 1].split())
+    raise ToteError("unbalanced braces in product query")
+
+
+def build_product_batch_query(selection: str, product_ids: List[str]) -> tuple[str, Dict[str, Any]]:
+    """Build ``p1: product(id: $id1) {...} p2: ...`` with one variable per id."""
+    n = len(product_ids)
+    var_defs = ", ".join(f"$id{i}: String!" for i in range(1, n + 1))
+    fields = " ".join(f"p{i}: product(id: $id{i}) {selection}" for i in range(1, n + 1))
+    variables = {f"id{i}": pid for i, pid in enumerate(product_ids, start=1)}
+    return f"query BatchProducts({var_defs}) {{ {fields} }}", variables
+
+
+def split_product_batch(raw: Dict[str, Any], n: int) -> List[Any]:
+    """Fan an aliased batch response back out to per-product results.
+
+    Errors whose ``path`` starts with an alias fail that product, even if
+    a partial node came back (as ``graphql()`` raises on any error); errors
+    without a path fail every product that came back without data.
+    """
+    data = (raw or {}).get("data") or {}
+    errors = (raw or {}).get("errors") or []
+    by_alias: Dict[str, List[Any]] = {}
+    unscoped: List[Any] = []
+    for err in errors:
+        path = err.get("path") if isinstance(err, dict) else None
+        if path:
+            by_alias.setdefault(str(path[0]), []).append(err)
+        else:
+            unscoped.append(err)
+    out: List[Any] = []
+    for i in range(1, n + 1):
+        alias = f"p{i}"
+        node = data.get(alias)
+        errs = by_alias.get(alias) or ([] if node is not None else unscoped)
+        if errs:
+            out.append(ToteError(f"GraphQL errors: {json.dumps(errs)}"))
+        else:
+            out.append({"product": node})
+    return out
+
+
+class _PendingProduct:
+    __slots__ = ("product_id", "done", "result", "error")
+
+    def __init__(self, product_id: str) -> None:
+        self.product_id = product_id
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[Exception] = None
+
+
+class _ProductGroup:
+    """One batch being collected; ``closed`` is set when it is full and no longer joinable."""
+
+    __slots__ = ("items", "closed")
+
+    def __init__(self) -> None:
+        self.items: List[_PendingProduct] = []
+        self.closed = threading.Event()
+
+
+class _ProductBatcher:
+    """Coalesces concurrent ToteClient.product() calls into aliased requests.
+
+    The first caller for a (endpoint, credentials, selection) key leads a
+    group: it waits up to the batch window for others to join (waking early
+    when a caller fills the group to the max size), detaches the group and
+    sends one request for it. Each leader only ever sends its own group.
+    """
+
+    def __init__(self, window_s: float, max_size: int) -> None:
+        self.window_s = window_s
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, _ProductGroup] = {}
+        self.stats = {"requests": 0, "products": 0}
+
+    def submit(self, client: "ToteClient", selection: str, product_id: str) -> Dict[str, Any]:
+        key = (client.base_url, client.headers.get("Authorization"), selection)
+        item = _PendingProduct(product_id)
+        with self._lock:
+            group = self._pending.get(key)
+            leader = group is None
+            if leader:
+                group = self._pending[key] = _ProductGroup()
+            group.items.append(item)
+            if len(group.items) >= self.max_size:
+                # Full: later callers start a new group
+                del self._pending[key]
+                group.closed.set()
+        if leader:
+            if self.window_s > 0:
+                group.closed.wait(self.window_s)
+            with self._lock:
+                if self._pending.get(key) is group:
+                    del self._pending[key]
+            self._flush(client, key[2], group.items)
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result or {}
+
+    def _flush(self, client: "ToteClient", selection: str, items: List[_PendingProduct]) -> None:
+        ids = list(dict.fromkeys(it.product_id for it in items))
+        try:
+            doc, variables = build_product_batch_query(selection, ids)
+            results = dict(zip(ids, split_product_batch(client.graphql_raw(doc, variables), len(ids))))
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["products"] += len(items)
+            for it in items:
+                res = results.get(it.product_id)
+                if isinstance(res, Exception):
+                    it.error = res
+                else:
+                    it.result = res
+        except Exception as e:
+            for it in items:
+                it.error = e
+        finally:
+            for it in items:
+                it.done.set()
+
+
+_product_batcher = _ProductBatcher(PRODUCT_BATCH_WINDOW_S, PRODUCT_BATCH_MAX)
+
+
 def normalize_probable_lines(line_nodes: Any) -> List[Dict[str, Any]]:
     """Normalize GraphQL probable odds lines into the raw REST-like structure."""
 
@@ -344,11 +659,20 @@ def normalize_probable_lines(line_nodes: Any) -> List[Dict[str, Any]]:
 
 
 class _RateLimiter:
-    """Simple token-bucket rate limiter shared across Tote requests.
+    """Adaptive (AIMD) token-bucket limiter shared across Tote requests.
+
+    The allowed rate and the number of concurrent in-flight requests grow
+    additively while responses are healthy and are cut multiplicatively on
+    429/5xx, Retry-After or responses slower than the latency target. A
+    Retry-After header pauses all callers until it has elapsed.
 
     Controlled via env vars:
-      TOTE_RPS   – average requests per second (default 5)
-      TOTE_BURST – bucket size (default 10)
+      TOTE_RPS               – starting requests per second (default 5)
+      TOTE_BURST             – bucket size (default 10)
+      TOTE_RPS_MIN           – floor for the adaptive rate (default 0.5)
+      TOTE_RPS_MAX           – ceiling for the adaptive rate (default 4x TOTE_RPS)
+      TOTE_MAX_INFLIGHT      – ceiling for concurrent requests (default 8)
+      TOTE_TARGET_LATENCY_MS – latency treated as congestion (default 2500)
     """
     def __init__(self) -> None:
         try:
@@ -356,38 +680,198 @@ class _RateLimiter:
             burst = int(os.getenv("TOTE_BURST", "10"))
         except Exception:
             rps, burst = 5.0, 10
+        try:
+            rps_min = float(os.getenv("TOTE_RPS_MIN", "0.5"))
+            rps_max = float(os.getenv("TOTE_RPS_MAX", str(rps * 4)))
+            max_inflight = int(os.getenv("TOTE_MAX_INFLIGHT", "8"))
+            target_ms = float(os.getenv("TOTE_TARGET_LATENCY_MS", "2500"))
+        except Exception:
+            rps_min, rps_max, max_inflight, target_ms = 0.5, rps * 4, 8, 2500.0
         self.capacity = max(1, burst)
-        self.refill_per_sec = max(0.1, rps)
+        self.min_rate = max(0.1, rps_min)
+        self.max_rate = max(self.min_rate, rps_max)
+        self.refill_per_sec = min(self.max_rate, max(self.min_rate, rps))
+        self.max_concurrency = max(1, max_inflight)
+        self.concurrency = float(self.max_concurrency)
+        self.target_latency = max(0.05, target_ms / 1000.0)
+        self.decrease_factor = 0.5
+        # Only cut once per window so a burst of concurrent 429s counts as one congestion signal
+        self.decrease_cooldown = 1.0
         self.tokens = float(self.capacity)
-        self.last = time.time()
-        self._lock = threading.Lock()
+        self.last = time.monotonic()
+        self.in_flight = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, Any] = {
+            "requests": 0,
+            "successes": 0,
+            "throttle_events": 0,
+            "server_errors": 0,
+            "slow_responses": 0,
+            "rate_decreases": 0,
+            "retry_after_pauses": 0,
+            "last_throttle_ts": None,
+            "last_retry_after_s": None,
+        }
+
+    def _refill(self, now: float) -> None:
+        dt = now - self.last
+        if dt > 0:
+            self.tokens = min(self.capacity, self.tokens + dt * self.refill_per_sec)
+            self.last = now
+
+    def _try_acquire_locked(self) -> float:
+        now = time.monotonic()
+        wait = self._blocked_until - now
+        if wait > 0:
+            return wait
+        if self.in_flight >= max(1, int(self.concurrency)):
+            # Slot-bound: woken by release(); short poll for async waiters
+            return 0.05
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            self.in_flight += 1
+            self._metrics["requests"] += 1
+            return 0.0
+        return (1.0 - self.tokens) / self.refill_per_sec
+
+    def try_acquire(self) -> float:
+        """Non-blocking acquire for async callers.
+
+        Returns 0.0 when a token and slot were taken, otherwise the number of
+        seconds to wait before trying again.
+        """
+        with self._cond:
+            return self._try_acquire_locked()
 
     def acquire(self) -> None:
-        with self._lock:
-            now = time.time()
-            dt = now - self.last
-            if dt > 0:
-                self.tokens = min(self.capacity, self.tokens + dt * self.refill_per_sec)
-                self.last = now
-            if self.tokens >= 1.0:
-                self.tokens -= 1.0
+        """Block until a token and an in-flight slot are available.
+
+        Every acquire()/try_acquire() must be paired with a release() once the
+        response (or failure) is known.
+        """
+        with self._cond:
+            while True:
+                wait = self._try_acquire_locked()
+                if wait <= 0:
+                    return
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self) -> None:
+        """Await a token and an in-flight slot without blocking the event loop."""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
                 return
-            # need to wait
-            need = 1.0 - self.tokens
-            wait = need / self.refill_per_sec
-        if wait > 0:
-            time.sleep(wait)
-        # After sleeping, try to deduct token
-        with self._lock:
-            self.tokens = max(0.0, self.tokens - 1.0)
+            await asyncio.sleep(wait)
+
+    def release(self, status: Optional[int] = None, latency: Optional[float] = None, retry_after: Optional[float] = None) -> None:
+        """Free an in-flight slot and adapt limits from the observed outcome.
+
+        status is the HTTP status (None for transport errors such as timeouts),
+        latency the request duration in seconds, retry_after a parsed
+        Retry-After delay in seconds.
+        """
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+            if retry_after is not None and retry_after > 0:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                self._metrics["retry_after_pauses"] += 1
+                self._metrics["last_retry_after_s"] = retry_after
+            if status == 429 or (retry_after is not None and retry_after > 0):
+                self._metrics["throttle_events"] += 1
+                self._metrics["last_throttle_ts"] = time.time()
+                self._decrease(now, f"throttled ({status})")
+            elif status is None or status >= 500:
+                self._metrics["server_errors"] += 1
+                self._decrease(now, f"server error ({status or 'no response'})")
+            elif latency is not None and latency > self.target_latency:
+                self._metrics["slow_responses"] += 1
+                self._decrease(now, f"slow response ({latency:.2f}s)")
+            elif status < 400:
+                self._metrics["successes"] += 1
+                self._increase()
+            self._cond.notify_all()
+
+    def _increase(self) -> None:
+        # Roughly +1 rps per second of healthy traffic and +1 slot per window of successes
+        self.refill_per_sec = min(self.max_rate, self.refill_per_sec + 1.0 / max(1.0, self.refill_per_sec))
+        self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / max(1.0, self.concurrency))
+
+    def _decrease(self, now: float, reason: str) -> None:
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self.refill_per_sec = max(self.min_rate, self.refill_per_sec * self.decrease_factor)
+        self.concurrency = max(1.0, self.concurrency * self.decrease_factor)
+        self.tokens = min(self.tokens, 1.0)
+        self._metrics["rate_decreases"] += 1
+        try:
+            print(f"[ToteLimiter] {reason}: rate={self.refill_per_sec:.2f}/s concurrency={int(self.concurrency)}")
+        except Exception:
+            pass
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before a retry. Retry-After pauses are enforced by acquire()."""
+        if retry_after is not None and retry_after > 0:
+            return 0.0
+        return random.uniform(0.5, 1.0) * min(30.0, 0.5 * (2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._metrics)
+            out.update({
+                "rate_per_sec": round(self.refill_per_sec, 3),
+                "rate_min": self.min_rate,
+                "rate_max": self.max_rate,
+                "concurrency_limit": max(1, int(self.concurrency)),
+                "concurrency_max": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "tokens": round(self.tokens, 2),
+                "blocked_for_s": round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            })
+        return out
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds, capped at 120."""
+    if not value:
+        return None
+    try:
+        return min(120.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        pass
+    try:
+        dt = parsedate_to_datetime(value)
+        return min(120.0, max(0.0, dt.timestamp() - time.time()))
+    except Exception:
+        return None
 
 
 _rate_limiter = _RateLimiter()
 
 
+def limiter_stats() -> Dict[str, Any]:
+    """Current adaptive limits and throttle counters for the shared Tote limiter."""
+    out = _rate_limiter.stats()
+    out["product_batches"] = dict(_product_batcher.stats)
+    return out
+
+
 def rate_limited_get(url: str, *, headers: Dict[str, Any] | None = None, timeout: float = 15.0) -> requests.Response:
     _rate_limiter.acquire()
-    resp = requests.get(url, headers=headers or {}, timeout=timeout)
+    status: Optional[int] = None
+    retry_after: Optional[float] = None
+    t0 = time.monotonic()
+    try:
+        resp = requests.get(url, headers=headers or {}, timeout=timeout)
+        status = resp.status_code
+        retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+    finally:
+        _rate_limiter.release(status, time.monotonic() - t0, retry_after)
     return resp
 
 # Note: Legacy SQLite helpers removed. All raw payload archiving is handled via
@@ -0,0 +1,311 @@
+"""Asyncio Tote GraphQL client on a pooled HTTP/2 connection.
+
+Same ``graphql`` / ``graphql_audit`` surface as ``ToteClient`` but awaitable,
+so many product/odds fetches can be in flight at once from the pool
+subscriber, the ingest service and the ingest scripts. Concurrent
+single-product lookups are coalesced into aliased batch requests.
+Requests share the process-wide adaptive limiter and the "tote" circuit
+breaker/retry budget with the synchronous client.
+
+Requires ``httpx`` (``h2`` enables HTTP/2; without it HTTP/1.1 keep-alive
+is used).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import httpx  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    httpx = None  # type: ignore
+
+from ..config import cfg
+from ..retry_utils import CircuitOpenError, get_circuit_breaker, get_retry_budget
+from .tote_api import (
+    PRODUCT_BATCH_MAX,
+    PRODUCT_BATCH_WINDOW_S,
+    ToteClient,
+    ToteError,
+    _parse_retry_after,
+    _rate_limiter,
+    build_product_batch_query,
+    product_selection,
+    split_product_batch,
+)
+from .tote_cassette import CassetteMiss, ToteCassette, default_cassette
+from urllib.parse import urljoin
+
+
+def async_client_available() -> bool:
+    return httpx is not None
+
+
+class AsyncToteClient:
+    """Async Tote API client with a pooled, keep-alive, gzip-enabled connection.
+
+    Use as an async context manager (or call ``aclose()``) so the pool is
+    closed on the loop that created it.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 15.0,
+        max_retries: int = 2,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_connections: int = 20,
+        http2: bool = True,
+        cassette: Optional[ToteCassette] = None,
+    ) -> None:
+        if httpx is None:
+            raise ToteError("httpx is not installed; pip install 'httpx[http2]'")
+        if not (base_url or cfg.tote_graphql_url):
+            raise ToteError("TOTE_GRAPHQL_URL is not configured")
+        if not (api_key or cfg.tote_api_key):
+            raise ToteError("TOTE_API_KEY is not configured")
+        self.base_url = ToteClient._normalize_http_endpoint((base_url or cfg.tote_graphql_url or "").strip())
+        self.timeout = timeout
+        self.max_retries = max(0, int(max_retries))
+        self.api_key = (api_key or cfg.tote_api_key)
+        self.auth_scheme = (cfg.tote_auth_scheme or "Api-Key").strip()
+        self.headers = {
+            "Authorization": f"{self.auth_scheme} {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "User-Agent": "autobet/0.1 (+tote)",
+        }
+        # HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive
+        use_http2 = bool(http2) and importlib.util.find_spec("h2") is not None
+        self._http = httpx.AsyncClient(
+            http2=use_http2,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max(1, max_connections),
+                max_keepalive_connections=max(1, max_connections),
+                keepalive_expiry=30.0,
+            ),
+        )
+        # Pending single-product lookups per selection, flushed as aliased batches
+        self._pending: Dict[str, List[tuple]] = {}
+        self._flush_tasks: set = set()
+        self.batch_window_s = PRODUCT_BATCH_WINDOW_S
+        self.batch_max = PRODUCT_BATCH_MAX
+        self.cassette = cassette if cassette is not None else default_cassette()
+
+    @classmethod
+    def from_client(cls, client: ToteClient, **kwargs: Any) -> "AsyncToteClient":
+        """Async client with the same endpoint, credentials, timeouts and cassette as ``client``."""
+        kwargs.setdefault("timeout", client.timeout)
+        kwargs.setdefault("max_retries", client.max_retries)
+        out = cls(base_url=client.base_url, api_key=client.api_key, cassette=client.cassette, **kwargs)
+        out.auth_scheme = client.auth_scheme
+        out.headers["Authorization"] = client.headers.get("Authorization", out.headers["Authorization"])
+        return out
+
+    async def __aenter__(self) -> "AsyncToteClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        try:
+            await self._http.aclose()
+        except Exception:
+            pass
+
+    async def _post_json(self, url: str, payload: Dict[str, Any], *, headers_override: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if self.cassette is not None and self.cassette.replaying:
+            try:
+                data = self.cassette.lookup(payload.get("query", ""), payload.get("variables"))
+            except CassetteMiss as e:
+                raise ToteError(str(e)) from e
+            if self.cassette.latency_s:
+                await asyncio.sleep(self.cassette.latency_s)
+            return data
+        last_err: Optional[Exception] = None
+        breaker = get_circuit_breaker("tote")
+        budget = get_retry_budget("tote")
+        budget.record_request()
+        for attempt in range(self.max_retries + 1):
+            retry_after: Optional[float] = None
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                raise ToteError(str(e)) from e
+            try:
+                await _rate_limiter.acquire_async()
+                status: Optional[int] = None
+                t0 = time.monotonic()
+                try:
+                    send_headers = dict(headers_override or self.headers)
+                    resp = await self._http.post(url, headers=send_headers, json=payload)
+                    # Follow redirects explicitly so the POST body is preserved
+                    if 300 <= resp.status_code < 400:
+                        loc = resp.headers.get("Location")
+                        if not loc:
+                            raise ToteError(f"{resp.status_code} Redirect without Location for url: {url}")
+                        target = urljoin(url + ("/" if not url.endswith("/") else ""), loc)
+                        resp = await self._http.post(target, headers=send_headers, json=payload)
+                    status = resp.status_code
+                    retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                finally:
+                    _rate_limiter.release(status, time.monotonic() - t0, retry_after)
+                    if status is None or status == 429 or status >= 500:
+                        breaker.record_failure(RuntimeError(f"HTTP {status} from {url}" if status else f"No response from {url}"))
+                    elif status >= 400:
+                        # A rejected request says nothing about the upstream's health either way
+                        breaker.record_neutral()
+                    else:
+                        breaker.record_success()
+                if resp.status_code >= 400:
+                    snippet = (": " + resp.text[:300].replace("\n", " ")) if resp.text else ""
+                    raise ToteError(f"{resp.status_code} Client Error: {resp.reason_phrase} for url: {url}{snippet}")
+                try:
+                    data = resp.json()
+                except Exception:
+                    ctype = resp.headers.get("Content-Type", "")
+                    snippet = (resp.text or "")[:300].replace("\n", " ")
+                    raise ToteError(f"Invalid JSON (Content-Type: {ctype}) for url: {resp.url}: {snippet}")
+                if self.cassette is not None and self.cassette.recording:
+                    self.cassette.record(payload.get("query", ""), payload.get("variables"), data, url=url)
+                return data
+            except Exception as e:
+                last_err = e
+                if attempt < self.max_retries:
+                    if not budget.try_retry():
+                        break
+                    await asyncio.sleep(_rate_limiter.backoff_delay(attempt, retry_after))
+        raise ToteError(str(last_err) if last_err else "request failed")
+
+    async def graphql(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        url = self.base_url
+        payload = {"query": query, "variables": variables or {}}
+        data = await self._post_json(url, payload)
+        if isinstance(data, dict) and data.get("errors"):
+            raise ToteError(f"GraphQL errors on {url}: {json.dumps(data.get('errors'))}")
+        return (data.get("data") if isinstance(data, dict) else data) or {}
+
+    async def graphql_audit(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Audit endpoint/credentials when configured, as in ToteClient.graphql_audit."""
+        url = ToteClient._normalize_http_endpoint((cfg.tote_audit_graphql_url or self.base_url).strip())
+        audit_key = (cfg.tote_audit_api_key or self.api_key)
+        audit_scheme = (cfg.tote_audit_auth_scheme or self.auth_scheme)
+        headers = dict(self.headers)
+        headers["Authorization"] = f"{audit_scheme} {audit_key}"
+        payload = {"query": query, "variables": variables or {}}
+        data = await self._post_json(url, payload, headers_override=headers)
+        if isinstance(data, dict) and data.get("errors"):
+            raise ToteError(f"GraphQL errors on {url}: {json.dumps(data.get('errors'))}")
+        return (data.get("data") if isinstance(data, dict) else data) or {}
+
+    async def graphql_raw(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Return the full response (data and errors) without raising on GraphQL errors."""
+        data = await self._post_json(self.base_url, {"query": query, "variables": variables or {}})
+        return data if isinstance(data, dict) else {}
+
+    async def product(self, product_id: str, query: str) -> Dict[str, Any]:
+        """Coalescing single-product lookup; see ``ToteClient.product``."""
+        if self.cassette is not None:
+            # Timing-dependent batches would not replay; keep one request per id
+            res = (await self.products_by_id([product_id], query))[0]
+            if isinstance(res, Exception):
+                raise res
+            return res
+        selection = product_selection(query)
+        fut = asyncio.get_running_loop().create_future()
+        items = self._pending.setdefault(selection, [])
+        items.append((str(product_id), fut))
+        if len(items) >= self.batch_max:
+            self._spawn(self._flush(selection))
+        elif len(items) == 1:
+            self._spawn(self._flush_after_window(selection))
+        return await fut
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_after_window(self, selection: str) -> None:
+        await asyncio.sleep(self.batch_window_s)
+        await self._flush(selection)
+
+    async def _flush(self, selection: str) -> None:
+        items = self._pending.pop(selection, [])
+        if not items:
+            return
+        ids = list(dict.fromkeys(pid for pid, _ in items))
+        try:
+            doc, variables = build_product_batch_query(selection, ids)
+            results = dict(zip(ids, split_product_batch(await self.graphql_raw(doc, variables), len(ids))))
+        except Exception as e:
+            results = {pid: e for pid in ids}
+        for pid, fut in items:
+            if fut.done():
+                continue
+            res = results.get(pid)
+            if isinstance(res, Exception):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res or {})
+
+    async def products_by_id(self, product_ids: List[str], query: str, *, batch_size: Optional[int] = None, concurrency: int = 8) -> List[Any]:
+        """Aliased batch fetch with the batches in flight concurrently; see ``ToteClient.products_by_id``."""
+        selection = product_selection(query)
+        size = max(1, int(batch_size or self.batch_max))
+        chunks = [[str(pid) for pid in product_ids[i:i + size]] for i in range(0, len(product_ids), size)]
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def _one(chunk: List[str]) -> List[Any]:
+            async with sem:
+                doc, variables = build_product_batch_query(selection, chunk)
+                try:
+                    return split_product_batch(await self.graphql_raw(doc, variables), len(chunk))
+                except Exception as e:
+                    return [e] * len(chunk)
+
+        out: List[Any] = []
+        for res in await asyncio.gather(*(_one(c) for c in chunks)):
+            out.extend(res)
+        return out
+
+
+def run_products_by_id(product_ids: List[str], query: str, *, client: Optional[ToteClient] = None, concurrency: int = 8) -> Optional[List[Any]]:
+    """Synchronous wrapper around ``AsyncToteClient.products_by_id``.
+
+    With ``client`` the async client reuses its endpoint, credentials and
+    cassette; otherwise it is configured from ``cfg``.
+
+    Returns None when the async client cannot be used here (httpx missing or
+    called from inside a running event loop) so callers can fall back to
+    ``ToteClient.products_by_id``.
+    """
+    if httpx is None or not product_ids:
+        return None
+    try:
+        asyncio.get_running_loop()
+        return None
+    except RuntimeError:
+        pass
+
+    async def _run() -> List[Any]:
+        if client is not None:
+            aclient = AsyncToteClient.from_client(client, max_connections=concurrency)
+        else:
+            aclient = AsyncToteClient(max_connections=concurrency)
+        async with aclient:
+            return await aclient.products_by_id(product_ids, query, concurrency=concurrency)
+
+    try:
+        return asyncio.run(_run())
+    except ToteError as e:
+        print(f"Async Tote client unavailable ({e}); falling back to sequential requests")
+        return None
@@ -139,7 +139,7 @@ def _resolve_audit_ids_for_simple(
             q = (
                 "query Product($id: String){ product(id:$id){ ... on BettingProduct { legs{ nodes{ selections{ nodes{ id eventCompetitor{ __typename ... on HorseRacingEventCompetitor{ clothNumber } ... on GreyhoundRacingEventCompetitor{ trapNumber } } competitor{ details{ __typename ... on HorseDetails{ clothNumber } ... on GreyhoundDetails{ trapNumber } } } } } } } } }"
             )
-            d = live_client.graphql(q, {"id": live_product_id})
+            d = live_client.product(live_product_id, q)
             prod_node = d.get("product") or {}
             legs = ((prod_node.get("legs") or {}).get("nodes")) or []
             for lg in legs:
@@ -237,7 +237,7 @@ def _resolve_audit_ids_for_simple(
                 q_live = (
                     "query Product($id: String){ product(id:$id){ ... on BettingProduct { betType{ code } legs{ nodes{ event{ venue{ name } scheduledStartDateTime{ iso8601 } } } } } } }"
                 )
-                d_live = live_client.graphql(q_live, {"id": live_product_id})
+                d_live = live_client.product(live_product_id, q_live)
                 prod_live = d_live.get("product") or {}
                 bt_live = (((prod_live.get("betType") or {}).get("code")) or bet_type)
                 legs_live = ((prod_live.get("legs") or {}).get("nodes")) or []
@@ -491,7 +491,7 @@ def place_audit_simple_bet(
             query = (
                 "query ProductLegs($id: String){ product(id: $id){ ... on BettingProduct { legs{ nodes{ id selections{ nodes{ id } } } } } } }"
             )
-            data = query_client.graphql(query, {"id": product_id})
+            data = query_client.product(product_id, query)
             legs = (((data.get("product") or {}).get("legs") or {}).get("nodes")) or []
             # Prefer the leg that contains our selection
             for lg in legs:
@@ -697,7 +697,7 @@ def place_audit_superfecta(
         try:
             query_client = ToteClient()  # live
             query = "query ProductLegs($id: String){ product(id: $id){ ... on BettingProduct { legs{ nodes{ id } } } } }"
-            data = query_client.graphql(query, {"id": product_id})
+            data = query_client.product(product_id, query)
             legs = (((data.get("product") or {}).get("legs") or {}).get("nodes")) or []
             if legs:
                 product_leg_id = legs[0].get("id")
@@ -733,7 +733,7 @@ def place_audit_superfecta(
                 }
             }
             """
-            data = query_client.graphql(query, {"id": product_id})
+            data = query_client.product(product_id, query)
             prod = data.get("product") or {}
             legs = ((prod.get("legs") or {}).get("nodes")) or []
             # Use first leg
@@ -796,7 +796,7 @@ def place_audit_superfecta(
                 q_live = (
                     "query Product($id: String){ product(id:$id){ ... on BettingProduct { betType{ code } legs{ nodes{ event{ venue{ name } scheduledStartDateTime{ iso8601 } } } } } } }"
                 )
-                d_live = live_client.graphql(q_live, {"id": product_id})
+                d_live = live_client.product(product_id, q_live)
                 prod_live = d_live.get("product") or {}
                 legs_live = ((prod_live.get("legs") or {}).get("nodes")) or []
                 if legs_live:
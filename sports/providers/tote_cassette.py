@@ -0,0 +1,179 @@
+"""Record/replay cassettes for Tote GraphQL traffic.
+
+A cassette is a gzip-compressed JSON-lines file of request/response pairs
+keyed by a hash of the GraphQL document and its variables. In ``record``
+mode every successful response from ``ToteClient`` / ``AsyncToteClient`` is
+written, replacing any earlier recording at the same path on the first
+flush (re-recording never accumulates duplicates); in ``replay`` mode responses are served from the file without
+touching the network, rate limiter or circuit breaker, optionally with a
+simulated per-request latency.
+
+Configure via env (picked up by clients created without an explicit
+``cassette=``):
+- TOTE_CASSETTE: path to the cassette file (e.g. ``data/cassettes/2025-09-20.jsonl.gz``)
+- TOTE_CASSETTE_MODE: ``record`` or ``replay`` (default ``replay``)
+- TOTE_REPLAY_LATENCY_MS: simulated latency per replayed request (default 0)
+"""
+
+from __future__ import annotations
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request was not recorded."""
+
+
+def request_key(query: str, variables: Optional[Dict[str, Any]] = None) -> str:
+    """Stable key for a GraphQL request: whitespace-normalized query hash + canonical variables."""
+    q = " ".join((query or "").split())
+    qh = hashlib.sha256(q.encode("utf-8")).hexdigest()[:16]
+    vs = json.dumps(variables or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{qh}:{vs}"
+
+
+class ToteCassette:
+    """On-disk store of GraphQL request/response pairs.
+
+    Repeated identical requests (e.g. polling the same product) are replayed
+    in recorded order, sticking on the last response once exhausted.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", *, latency_s: float = 0.0) -> None:
+        mode = (mode or "replay").strip().lower()
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_s = max(0.0, float(latency_s or 0.0))
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Any]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._pending: List[Dict[str, Any]] = []
+        # First flush of a recording session overwrites the file instead of appending
+        self._truncate = mode == "record"
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if mode == "replay":
+            self._load()
+        else:
+            d = os.path.dirname(os.path.abspath(path))
+            os.makedirs(d, exist_ok=True)
+            atexit.register(self.flush)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    continue
+                self._entries.setdefault(rec.get("key"), []).append(rec.get("response"))
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._entries.values())
+
+    def lookup(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Any:
+        """Return the recorded response for a request, or raise CassetteMiss."""
+        key = request_key(query, variables)
+        with self._lock:
+            responses = self._entries.get(key)
+            if not responses:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response for {key[:120]}")
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = min(i + 1, len(responses) - 1)
+            self.hits += 1
+            return responses[i]
+
+    def replay(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Any:
+        resp = self.lookup(query, variables)
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return resp
+
+    def record(self, query: str, variables: Optional[Dict[str, Any]], response: Any, *, url: str = "") -> None:
+        rec = {
+            "key": request_key(query, variables),
+            "url": url,
+            "query": query,
+            "variables": variables or {},
+            "response": response,
+            "ts_ms": int(time.time() * 1000),
+        }
+        with self._lock:
+            self._pending.append(rec)
+            self.recorded += 1
+            should_flush = len(self._pending) >= 200
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending recordings to the cassette (later flushes append; gzip members concatenate)."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            file_mode = "wt" if self._truncate else "at"
+            self._truncate = False
+            with gzip.open(self.path, file_mode, encoding="utf-8") as f:
+                for rec in batch:
+                    f.write(json.dumps(rec, separators=(",", ":"), default=str) + "\n")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "mode": self.mode,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+
+_default_cassette: Optional[ToteCassette] = None
+_default_lock = threading.Lock()
+
+
+def set_default_cassette(cassette: Optional[ToteCassette]) -> None:
+    """Install (or clear) the cassette used by clients created without one."""
+    global _default_cassette
+    with _default_lock:
+        _default_cassette = cassette
+
+
+def default_cassette() -> Optional[ToteCassette]:
+    """Cassette configured via TOTE_CASSETTE, created on first use."""
+    global _default_cassette
+    with _default_lock:
+        if _default_cassette is None:
+            path = (os.getenv("TOTE_CASSETTE") or "").strip()
+            if path:
+                try:
+                    latency_ms = float(os.getenv("TOTE_REPLAY_LATENCY_MS", "0") or 0)
+                except Exception:
+                    latency_ms = 0.0
+                _default_cassette = ToteCassette(path, os.getenv("TOTE_CASSETTE_MODE", "replay"), latency_s=latency_ms / 1000.0)
+                print(f"Tote cassette {_default_cassette.mode}: {path}")
+        return _default_cassette
@@ -11,10 +11,23 @@ except Exception:  # pragma: no cover
 
 from ..config import cfg
 from .tote_api import ToteClient  # HTTP GraphQL fallback for totals
+from .tote_async import AsyncToteClient, async_client_available
+from .sink_pipeline import SinkPipeline
+from .snapshot_coalesce import SnapshotCoalescer
+from .single_flight import AsyncSingleFlight
+from .product_context import ProductContextCache, ProductCtx, tote_http_fetch
+from .subscriber_metrics import message_stats, open_tap_from_env
 try:
     from ..realtime import bus as rt_bus  # optional; not required for ingest
 except Exception:  # pragma: no cover
     rt_bus = None
+try:  # Optional faster JSON decoding for WS frames
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+_KEEPALIVE_TYPES = frozenset(("ka", "connection_ack", "complete", "ping", "pong"))
 
 
 def _now_ms() -> int:
@@ -25,13 +38,23 @@ def _is_bq_sink(obj) -> bool:
     return hasattr(obj, "upsert_tote_pool_snapshots") and hasattr(obj, "upsert_tote_events")
 
 
-async def _subscribe_pools(url: str, conn, *, duration: Optional[int] = None, event_callback=None) -> None:
+async def _subscribe_pools(
+    url: str,
+    conn,
+    *,
+    duration: Optional[int] = None,
+    event_callback=None,
+    stop: Optional[asyncio.Event] = None,
+) -> None:
     """Subscribe to Tote WS channels and persist snapshots + logs.
 
     Updated to match official Tote API WebSocket format:
     - Uses standard WebSocket with JSON messages (not GraphQL subscriptions)
     - Handles x-message-type header for message routing
     - Matches official API message structure from documentation
+
+    ``stop`` (optional) ends the subscription like ``duration`` does; the
+    replay harness uses it to shut down once a stream has been consumed.
     """
     assert websockets is not None, "websockets package not installed"
 
@@ -60,23 +83,36 @@ async def _subscribe_pools(url: str, conn, *, duration: Optional[int] = None, ev
     # Official Tote API uses standard WebSocket with Authorization header
     headers = {"Authorization": f"{cfg.tote_auth_scheme} {cfg.tote_api_key}"}
     started = time.time()
-    # Cache product context to enrich snapshots without repeated queries
-    ctx_cache: dict[str, dict] = {}
-    # Lazy HTTP client for fallback fetching of pool totals
+    # Product context (event, bet type, start) to enrich snapshots; loaded in the background
+    ctx_cache = ProductContextCache(conn, http_fetch=tote_http_fetch(ToteClient)) if _is_bq_sink(conn) else None
+    # Lazy HTTP clients for fallback fetching of pool totals/dividends.
+    # Prefer the pooled async client; fall back to the sync client in a thread.
     http_client: ToteClient | None = None
-    last_fetch_ts: dict[str, float] = {}
+    async_http_client: AsyncToteClient | None = None
+    # Concurrent fetches of the same (query, product) share one request; results are reused
+    # for cfg.tote_sub_http_cache_ms and at most cfg.tote_sub_http_concurrency fetches run at once.
+    # Async handlers run as tasks (below), so a burst for one product really is concurrent.
+    http_flight = AsyncSingleFlight(
+        ttl_s=cfg.tote_sub_http_cache_ms / 1000.0,
+        max_concurrency=cfg.tote_sub_http_concurrency,
+    )
+
+    async def _http_product_uncached(query: str, pid: str) -> dict:
+        # Single-product lookups are coalesced into aliased batch requests
+        nonlocal http_client, async_http_client
+        if async_client_available():
+            if async_http_client is None:
+                async_http_client = AsyncToteClient()
+            return await async_http_client.product(pid, query)
+        if http_client is None:
+            http_client = ToteClient()
+        return await asyncio.to_thread(http_client.product, pid, query)
+
+    async def _http_product(query: str, pid: str) -> dict:
+        return await http_flight.run((query, pid), lambda: _http_product_uncached(query, pid))
 
     async def _fetch_totals_http(pid: str) -> tuple[float | None, float | None]:
-        nonlocal http_client
         try:
-            now = time.time()
-            if now - last_fetch_ts.get(pid, 0) < 1.5:
-                return (None, None)
-            if http_client is None:
-                try:
-                    http_client = ToteClient()
-                except Exception:
-                    return (None, None)
             query = (
                 """
                 query GetTotals($id: String!) {
@@ -119,8 +155,7 @@ async def _subscribe_pools(url: str, conn, *, duration: Optional[int] = None, ev
                 }
                 """
             )
-            # Run sync HTTP request in a thread so we don't block the event loop
-            data = await asyncio.to_thread(http_client.graphql, query, {"id": pid})
+            data = await _http_product(query, pid)
             node = data.get("product") or {}
             src = (node.get("type") or node) or {}
             pool = (src.get("pool") or {})
@@ -132,141 +167,368 @@ async def _subscribe_pools(url: str, conn, *, duration: Optional[int] = None, ev
             
             g_val = _money_to_float(gross_amounts[0] if gross_amounts else None)
             n_val = _money_to_float(net_amounts[0] if net_amounts else None)
-            
-            try:
-                last_fetch_ts[pid] = now
-            except Exception:
-                pass
             return (n_val, g_val)
         except Exception:
             return (None, None)
 
-    # Async queue and batching worker for BigQuery writes
-    q: asyncio.Queue | None = None
+    # Per-table flush pipelines: sink writes run on a thread pool, never on this loop
+    sink: SinkPipeline | None = None
+    # Pool snapshots are coalesced per product before they reach the sink
+    coalescer = SnapshotCoalescer()
     stop_event = asyncio.Event()
 
-    async def _bq_worker():
-        assert q is not None
-        batch: dict[str, list[dict]] = {}
-        last_flush = time.monotonic()
-        flush_interval = 0.4  # seconds
-        max_batch = 1000
-
-        async def flush():
-            nonlocal batch
-            if not batch:
-                return
-            for method, rows in list(batch.items()):
-                if not rows:
-                    continue
-                try:
-                    fn = getattr(conn, method, None)
-                    if callable(fn):
-                        fn(rows)
-                except Exception:
-                    # best-effort; drop on error
-                    pass
-            batch = {}
-
+    async def _flush_due_snapshots_periodically():
         while not stop_event.is_set():
-            timeout = max(0.0, flush_interval - (time.monotonic() - last_flush))
             try:
-                item = await asyncio.wait_for(q.get(), timeout=timeout)
+                await asyncio.wait_for(stop_event.wait(), timeout=coalescer.tick_s)
             except asyncio.TimeoutError:
-                await flush()
-                last_flush = time.monotonic()
-                continue
-            except Exception:
-                # Unexpected wakeup; try flush and continue
-                await flush()
-                last_flush = time.monotonic()
-                continue
-
-            try:
-                method, row = item  # type: ignore
-                batch.setdefault(method, []).append(row)
-                # Flush on size threshold
-                if sum(len(v) for v in batch.values()) >= max_batch:
-                    await flush()
-                    last_flush = time.monotonic()
+                pass
             except Exception:
-                # Ignore malformed items
                 pass
+            if sink is not None:
+                for r in coalescer.due():
+                    sink.submit("upsert_tote_pool_snapshots", r)
+
+    def _get_product_ctx(pid: str) -> ProductCtx | None:
+        """Return product context without blocking; a miss queues a background load."""
+        if ctx_cache is None or not pid:
+            return None
+        return ctx_cache.get(pid)
+
+    def _fill_snapshot_ctx(rows: list[dict]) -> list[dict]:
+        # Runs on a flush thread: snapshots sent before their product's context
+        # was loaded are completed here, waiting briefly for the in-flight load.
+        missing = [r["product_id"] for r in rows if not r.get("event_id") and r.get("product_id")]
+        if not missing or ctx_cache is None:
+            return rows
+        found = ctx_cache.ensure(missing, timeout=2.0)
+        for r in rows:
+            ctx = found.get(r.get("product_id")) if not r.get("event_id") else None
+            if ctx is not None:
+                r["event_id"] = ctx.event_id
+                r["bet_type"] = r.get("bet_type") or ctx.bet_type
+                r["currency"] = r.get("currency") or ctx.currency
+                r["start_iso"] = r.get("start_iso") or ctx.start_iso
+        return rows
+
+    # --- Message handlers -------------------------------------------------
+    # Each handler is registered once for the message types it consumes. Types
+    # whose only consumers are the sink are not registered without one, so
+    # their frames are dropped right after decoding without building rows.
+    has_sink = _is_bq_sink(conn)
+    handlers: dict[str, tuple] = {}
+
+    def _on(*types: str, enabled: bool = True):
+        def deco(fn):
+            if enabled:
+                for t in types:
+                    handlers[t] = (fn, asyncio.iscoroutinefunction(fn))
+            return fn
+        return deco
+
+    def _bus_wants(topic: str) -> bool:
+        if rt_bus is None:
+            return False
+        try:
+            return rt_bus.has_subscribers(topic)
+        except Exception:
+            return True
 
-        # Final flush on stop
+    def _bus_publish(topic: str, payload: dict) -> None:
         try:
-            await flush()
+            rt_bus.publish(topic, payload)
         except Exception:
             pass
 
-    def _get_product_ctx(pid: str) -> dict | None:
-        """Return product context from the in-memory cache.
+    async def _fetch_dividends_http(pid: str) -> dict[str, float]:
+        query = (
+            """
+            query GetDividends($id: String!) {
+              product(id: $id) {
+                ... on BettingProduct {
+                  result { dividends { nodes {
+                    dividend { amounts { decimalAmount stringAmount minorUnitsTotalAmount currency { code } } }
+                    dividendLegs { nodes { dividendSelections { nodes { id } } } }
+                  } } }
+                }
+                type { ... on BettingProduct { result { dividends { nodes {
+                  dividend { amounts { decimalAmount stringAmount minorUnitsTotalAmount currency { code } } }
+                  dividendLegs { nodes { dividendSelections { nodes { id } } } }
+                } } } } }
+              }
+            }
+            """
+        )
+        data = await _http_product(query, pid)
+        node = (data.get("product") or {})
+        src = (node.get("type") or node) or {}
+        res = ((src.get("result") or {}).get("dividends") or {})
+        mp: dict[str, float] = {}
+        for nd in res.get("nodes") or []:
+            try:
+                amt_list = (((nd.get("dividend") or {}).get("amounts")) or [])
+                amt_val = _money_to_float(amt_list[0] if amt_list else None)
+                if amt_val is None:
+                    continue
+                for dl in ((nd.get("dividendLegs") or {}).get("nodes") or []):
+                    for dsel in ((dl.get("dividendSelections") or {}).get("nodes") or []):
+                        sid = dsel.get("id")
+                        if sid:
+                            mp[str(sid)] = float(amt_val)
+            except Exception:
+                continue
+        return mp
 
-        This is a cache-only lookup. The _refresh_ctx_cache_periodically task is
-        responsible for populating the cache, which prevents N+1 query storms on BQ.
-        """
-        if not _is_bq_sink(conn):
-            return None
+    # PoolTotalChanged → snapshots
+    @_on("PoolTotalChanged", enabled=has_sink or rt_bus is not None)
+    async def _on_pool_total(msg: dict, ts: int) -> None:
+        pid = msg.get("ProductId")
         if not pid:
-            return None
-        return ctx_cache.get(pid)
-
-    async def _refresh_ctx_cache_periodically():
-        if not _is_bq_sink(conn):
             return
-        # Initial warm load and periodic refresh
-        while not stop_event.is_set():
+        publish = _bus_wants("pool_total_changed")
+        if not (has_sink or publish):
+            return
+        total = msg.get("Total", {})
+        # Handle the official API structure with arrays
+        net_amounts = total.get("NetAmounts", [])
+        gross_amounts = total.get("GrossAmounts", [])
+        net = _money_to_float(net_amounts[0] if net_amounts else None)
+        gross = _money_to_float(gross_amounts[0] if gross_amounts else None)
+        # If values are still missing, fetch via HTTP GraphQL as a fallback
+        if net is None or gross is None:
             try:
-                # Load products in the last ~36 hours from the view with the latest totals.
-                sql = (
-                    """
-                    SELECT product_id, event_id, UPPER(bet_type) AS bet_type, currency, start_iso " +
-                    "FROM `autobet-470818.autobet.vw_products_latest_totals` " +
-                    WHERE SAFE.PARSE_TIMESTAMP('%Y-%m-%dT%H:%M:%SZ', start_iso) >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 36 HOUR)
-                    """
-                )
-                rs = conn.query(sql)
-                for row in rs:
-                    try:
-                        pid = str(getattr(row, "product_id", ""))
-                        if pid:
-                            ctx_cache[pid] = {
-                                "event_id": str(getattr(row, "event_id", "")) or None,
-                                "bet_type": str(getattr(row, "bet_type", "")) or None,
-                                "currency": str(getattr(row, "currency", "")) or None,
-                                "start_iso": str(getattr(row, "start_iso", "")) or None,
-                            }
-                    except Exception:
-                        continue
+                n2, g2 = await _fetch_totals_http(str(pid))
+                net = net if net is not None else n2
+                gross = gross if gross is not None else g2
             except Exception:
-                # ignore refresh errors
                 pass
-            # Sleep 5 minutes between refreshes (fast first loop handled below)
-            try:
-                await asyncio.wait_for(stop_event.wait(), timeout=300.0)
-            except asyncio.TimeoutError:
-                continue
-            except Exception:
-                continue
+        # Get carryIn from the message if available
+        carry_in_gross = msg.get("CarryIn", {}).get("GrossAmounts", [])
+        rollover = _money_to_float(carry_in_gross[0] if carry_in_gross else None) or 0.0
+        if publish:
+            # Realtime update for UI consumers
+            _bus_publish("pool_total_changed", {
+                "product_id": str(pid),
+                "total_net": net,
+                "total_gross": gross,
+                "rollover": rollover,
+                "ts_ms": ts,
+            })
+        if sink is not None:
+            ctx = _get_product_ctx(str(pid)) or {}
+            snap = {
+                "product_id": str(pid),
+                "event_id": ctx.get("event_id"),
+                "bet_type": ctx.get("bet_type"),
+                "status": None,
+                "currency": ctx.get("currency"),
+                "start_iso": ctx.get("start_iso"),
+                "ts_ms": ts,
+                "total_gross": gross,
+                "total_net": net,
+                "rollover": rollover,
+            }
+            for r in coalescer.offer(snap):
+                sink.submit("upsert_tote_pool_snapshots", r)
+            if event_callback:
+                event_callback("pool_total_changed", dict(
+                    product_id=str(pid),
+                    total_gross=gross,
+                    total_net=net,
+                    rollover=rollover,
+                    currency=ctx.get("currency"),
+                    ts_ms=ts,
+                ))
+
+    # EventStatusChanged → update tote_events.status
+    @_on("EventStatusChanged", enabled=has_sink or rt_bus is not None)
+    def _on_event_status(msg: dict, ts: int) -> None:
+        eid = msg.get("EventId")
+        status = msg.get("Status")
+        if not (eid and status):
+            return
+        if _bus_wants("event_status_changed"):
+            _bus_publish("event_status_changed", {"event_id": str(eid), "status": str(status), "ts_ms": ts})
+        if sink is not None:
+            # Log the status change for historical record.
+            sink.submit("upsert_tote_event_status_log", {"event_id": str(eid), "ts_ms": ts, "status": str(status)})
+            # Also update the main events table for UI freshness.
+            sink.submit("upsert_tote_events", {"event_id": str(eid), "status": str(status)})
+            if event_callback:
+                event_callback("event_status_changed", {"event_id": str(eid), "status": str(status), "ts_ms": ts})
+
+    # EventResultChanged → per-competitor finishing positions
+    @_on("EventResultChanged", enabled=has_sink)
+    def _on_event_result(msg: dict, ts: int) -> None:
+        eid = msg.get("EventId")
+        if not eid or sink is None:
+            return
+        for c in msg.get("CompetitorResults", []):
+            fp = c.get("FinishingPosition")
+            st = c.get("Status")
+            sink.submit("upsert_tote_event_results_log", {
+                "event_id": str(eid),
+                "ts_ms": ts,
+                "competitor_id": str(c.get("CompetitorId") or ""),
+                "finishing_position": int(fp) if fp is not None else None,
+                "status": str(st) if st is not None else None,
+            })
+
+    # PoolDividendChanged → append dividend updates per selection
+    @_on("PoolDividendChanged", enabled=has_sink)
+    async def _on_pool_dividend(msg: dict, ts: int) -> None:
+        pid = msg.get("ProductId")
+        dvs = msg.get("Dividends", [])
+        if not (pid and dvs) or sink is None:
+            return
+        rows = []
+        # HTTP fallback for amounts, fetched at most once per message when the WS payload lacks them
+        fetched_amounts: dict[str, float] | None = None
+        for d in dvs:
+            amounts_list = d.get("Dividend", {}).get("Amounts", [])
+            amount = _money_to_float(amounts_list[0] if amounts_list else None)
+            for lg in d.get("Legs", []):
+                for s in lg.get("Selections", []):
+                    sel_id = s.get("Id")
+                    if not sel_id:
+                        continue
+                    if amount is None:
+                        if fetched_amounts is None:
+                            try:
+                                fetched_amounts = await _fetch_dividends_http(str(pid))
+                            except Exception:
+                                fetched_amounts = {}
+                        amt = fetched_amounts.get(str(sel_id))
+                    else:
+                        amt = amount
+                    if amt is not None:
+                        rows.append({"product_id": str(pid), "selection": str(sel_id), "dividend": float(amt), "ts": str(ts)})
+        for r in rows:
+            sink.submit("upsert_tote_product_dividends", r)
+
+    # SelectionStatusChanged → selection status log
+    @_on("SelectionStatusChanged", enabled=has_sink)
+    def _on_selection_status(msg: dict, ts: int) -> None:
+        pid = msg.get("ProductId")
+        sid = msg.get("SelectionId")
+        st = msg.get("Status")
+        if pid and sid and st is not None and sink is not None:
+            sink.submit(
+                "upsert_tote_selection_status_log",
+                {"product_id": str(pid), "selection_id": str(sid), "ts_ms": ts, "status": str(st)},
+            )
+
+    # CompetitorStatusChanged → competitor status per event
+    @_on("CompetitorStatusChanged", enabled=has_sink)
+    def _on_competitor_status(msg: dict, ts: int) -> None:
+        eid = msg.get("EventId")
+        cid = msg.get("CompetitorId")
+        st = msg.get("Status")
+        if eid and cid and st is not None and sink is not None:
+            sink.submit(
+                "upsert_tote_competitor_status_log",
+                {"event_id": str(eid), "competitor_id": str(cid), "ts_ms": ts, "status": str(st)},
+            )
+
+    # ProductStatusChanged → product status log + realtime publish (with event context)
+    @_on("ProductStatusChanged")
+    def _on_product_status(msg: dict, ts: int) -> None:
+        pid = msg.get("ProductId")
+        st = msg.get("Status")
+        if not pid or st is None:
+            return
+        # Enrich with product context (event_id, bet_type) for UI consumers
+        ctx = _get_product_ctx(str(pid)) or {}
+        payload = {
+            "product_id": str(pid),
+            "event_id": ctx.get("event_id"),
+            "bet_type": ctx.get("bet_type"),
+            "status": str(st),
+            "ts_ms": ts,
+        }
+        if _bus_wants("product_status_changed"):
+            _bus_publish("product_status_changed", payload)
+        if sink is not None:
+            # Write any held snapshot so the last pre-change total lands
+            for r in coalescer.status_changed(str(pid), str(st)):
+                sink.submit("upsert_tote_pool_snapshots", r)
+            sink.submit("upsert_tote_product_status_log", {"product_id": str(pid), "ts_ms": ts, "status": str(st)})
+        if event_callback:
+            # Also publish via injected callback (used by webapp SSE bus)
+            event_callback("product_status_changed", dict(payload))
+
+    # Bet lifecycle messages
+    @_on("BetAccepted", "BetRejected", "BetFailed", "BetCancelled", "BetResulted", "BetSettled", enabled=has_sink)
+    def _on_bet(msg: dict, ts: int) -> None:
+        if sink is None:
+            return
+        message_type = msg.get("MessageType")
+        bet_id = msg.get("BetId")
+        sink.submit("upsert_raw_tote", {
+            "raw_id": f"sub:{message_type}:{ts}",
+            "endpoint": message_type,
+            "entity_id": str(bet_id or ""),
+            "sport": "horse_racing",
+            "fetched_ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts / 1000.0)),
+            "payload": json.dumps({
+                "MessageType": message_type,
+                "BetId": bet_id,
+                "CustomerBetId": msg.get("CustomerBetId"),
+                "Reason": msg.get("Reason"),
+                "ReturnAmount": msg.get("ReturnAmount"),
+            }, ensure_ascii=False),
+        })
+
+    # Async handlers (those with an HTTP fallback) run as tracked tasks so the
+    # receive loop keeps reading while a fallback fetch is in flight; at most
+    # cfg.tote_sub_handler_tasks run at once, after which the loop waits for one.
+    # Tasks for the same product are chained, so a message waiting on its
+    # fallback never lands after a later message for that product.
+    handler_tasks: set[asyncio.Task] = set()
+    product_tails: dict[str, asyncio.Task] = {}
+    max_handler_tasks = max(1, cfg.tote_sub_handler_tasks)
+
+    async def _after(prev: asyncio.Task | None, fn, msg: dict, ts: int) -> None:
+        if prev is not None:
+            await asyncio.wait({prev})
+        await fn(msg, ts)
+
+    def _handler_done(task: asyncio.Task, key: str | None, message_type: str, t_msg: float) -> None:
+        handler_tasks.discard(task)
+        if key is not None and product_tails.get(key) is task:
+            del product_tails[key]
+        error = task.cancelled() or task.exception() is not None
+        message_stats.record(message_type, time.perf_counter() - t_msg, error=error)
+
     backoff = 1.0
+    tap = open_tap_from_env()
 
-    # Initialize worker + cache refresher once (outside reconnect loop)
+    def _should_stop() -> bool:
+        if duration and (time.time() - started) > duration:
+            return True
+        return stop is not None and stop.is_set()
+
+    # Initialize flush pipelines + context loader once (outside reconnect loop)
     if _is_bq_sink(conn):
-        q = asyncio.Queue(maxsize=5000)
-        worker_task = asyncio.create_task(_bq_worker())
-        refresher_task = asyncio.create_task(_refresh_ctx_cache_periodically())
+        sink = SinkPipeline(conn, name="tote_subscriber")
+        sink.attach_stats("snapshot_coalescing", coalescer.stats)
+        sink.attach_stats("messages", message_stats.stats)
+        sink.attach_stats("product_context", ctx_cache.stats)
+        sink.attach_stats("http_fallback", http_flight.stats)
+        sink.set_prepare("upsert_tote_pool_snapshots", _fill_snapshot_ctx)
+        ctx_cache.start()
+        coalesce_task = asyncio.create_task(_flush_due_snapshots_periodically()) if coalescer.enabled else None
     else:
-        worker_task = None
-        refresher_task = None
+        coalesce_task = None
     while True:
-        if duration and (time.time() - started) > duration:
+        if _should_stop():
             break
         try:
             # Connect to Tote WebSocket using standard WebSocket (not GraphQL)
             async with websockets.connect(
                 url,
                 extra_headers=headers,
-                ssl=ssl.create_default_context(),
+                ssl=ssl.create_default_context() if url.startswith("wss://") else None,
                 ping_interval=20,
                 ping_timeout=20,
                 max_queue=None,
@@ -280,21 +542,27 @@ async def _subscribe_pools(url: str, conn, *, duration: Optional[int] = None, ev
 
                 backoff = 1.0
                 while True:
-                    if duration and (time.time() - started) > duration:
+                    if _should_stop():
                         break
                     try:
                         raw = await ws.recv()
                     except Exception:
                         raise
+                    t_msg = time.perf_counter()
                     ts = _now_ms()
+                    if tap is not None:
+                        try:
+                            tap.write(ts, raw)
+                        except Exception:
+                            pass
                     try:
-                        msg = json.loads(raw)
+                        msg = _json_loads(raw)
                     except Exception:
                         msg = {"type": "raw", "raw": raw}
-                    
+
                     # Handle official Tote API message format
                     message_type = msg.get("MessageType") or msg.get("type", "")
-                    
+
                     # Handle connection errors
                     if message_type in ("connection_error", "error"):
                         try:
@@ -308,352 +576,35 @@ async def _subscribe_pools(url: str, conn, *, duration: Optional[int] = None, ev
                                 pass
                             break  # reconnect
                         continue
-                    
-                    # Skip keep-alive messages
-                    if message_type in ("ka", "connection_ack", "complete", "ping", "pong"):
-                        continue
 
-                    # Parse message data based on official Tote API message types
+                    entry = handlers.get(message_type)
+                    if entry is None:
+                        # Keep-alives and types nobody consumes
+                        if message_type not in _KEEPALIVE_TYPES:
+                            message_stats.skip(str(message_type))
+                        continue
+                    fn, is_async = entry
+                    if is_async:
+                        if len(handler_tasks) >= max_handler_tasks:
+                            await asyncio.wait(handler_tasks, return_when=asyncio.FIRST_COMPLETED)
+                        pid = msg.get("ProductId")
+                        key = str(pid) if pid else None
+                        task = asyncio.create_task(_after(product_tails.get(key) if key else None, fn, msg, ts))
+                        handler_tasks.add(task)
+                        if key is not None:
+                            product_tails[key] = task
+                        task.add_done_callback(lambda t, k=key, mt=str(message_type), t0=t_msg: _handler_done(t, k, mt, t0))
+                        continue
                     try:
-                        # PoolTotalChanged → snapshots
-                        if message_type == "PoolTotalChanged":
-                            pid = msg.get("ProductId")
-                            total = msg.get("Total", {})
-                            
-                            # Handle the official API structure with arrays
-                            net_amounts = total.get("NetAmounts", [])
-                            gross_amounts = total.get("GrossAmounts", [])
-                            
-                            net = _money_to_float(net_amounts[0] if net_amounts else None)
-                            gross = _money_to_float(gross_amounts[0] if gross_amounts else None)
-                            
-                            # If values are still missing, fetch via HTTP GraphQL as a fallback
-                            if (net is None or gross is None) and pid:
-                                try:
-                                    n2, g2 = await _fetch_totals_http(str(pid))
-                                    net = net if net is not None else n2
-                                    gross = gross if gross is not None else g2
-                                except Exception:
-                                    pass
-                            
-                            # Get carryIn from the message if available
-                            carry_in = msg.get("CarryIn", {})
-                            carry_in_gross = carry_in.get("GrossAmounts", [])
-                            rollover = _money_to_float(carry_in_gross[0] if carry_in_gross else None) or 0.0
-                            
-                            if pid:
-                                # Publish realtime update for UI consumers
-                                try:
-                                    if rt_bus is not None:
-                                        rt_bus.publish("pool_total_changed", {
-                                            "product_id": str(pid),
-                                            "total_net": net,
-                                            "total_gross": gross,
-                                            "rollover": rollover,
-                                            "ts_ms": ts,
-                                        })
-                                except Exception:
-                                    pass
-                                if _is_bq_sink(conn):
-                                    try:
-                                        ctx = _get_product_ctx(str(pid)) or {}
-                                        if q is not None:
-                                            await q.put((
-                                                "upsert_tote_pool_snapshots",
-                                                {
-                                                    "product_id": str(pid),
-                                                    "event_id": ctx.get("event_id"),
-                                                    "bet_type": ctx.get("bet_type"),
-                                                    "status": None,
-                                                    "currency": ctx.get("currency"),
-                                                    "start_iso": ctx.get("start_iso"),
-                                                    "ts_ms": ts,
-                                                    "total_gross": gross,
-                                                    "total_net": net,
-                                                    "rollover": rollover,
-                                                },
-                                            ))
-                                            if event_callback:
-                                                event_callback("pool_total_changed", dict(
-                                                    product_id=str(pid),
-                                                    total_gross=gross,
-                                                    total_net=net,
-                                                    rollover=rollover,
-                                                    currency=ctx.get("currency"),
-                                                    ts_ms=ts,
-                                                ))
-                                    except asyncio.QueueFull:
-                                        pass
-                                    except Exception:
-                                        pass
-
-                        # EventStatusChanged → update tote_events.status
-                        elif message_type == "EventStatusChanged":
-                            eid = msg.get("EventId")
-                            status = msg.get("Status")
-                            if eid and status:
-                                # Publish realtime update for UI consumers
-                                try:
-                                    if rt_bus is not None:
-                                        rt_bus.publish("event_status_changed", {
-                                            "event_id": str(eid),
-                                            "status": str(status),
-                                            "ts_ms": ts,
-                                        })
-                                except Exception:
-                                    pass
-                                if _is_bq_sink(conn):
-                                    try:
-                                        if q is not None:
-                                            # Log the status change for historical record.
-                                            await q.put((
-                                                "upsert_tote_event_status_log",
-                                                {"event_id": str(eid), "ts_ms": ts, "status": str(status)},
-                                            ))
-                                            # Also update the main events table for UI freshness.
-                                            await q.put((
-                                                "upsert_tote_events",
-                                                {"event_id": str(eid), "status": str(status)},
-                                            ))
-                                            if event_callback:
-                                                event_callback(
-                                                    "event_status_changed",
-                                                    {"event_id": str(eid), "status": str(status), "ts_ms": ts},
-                                                )
-                                    except asyncio.QueueFull:
-                                        pass
-                                    except Exception:
-                                        pass
-
-                        # EventResultChanged → per-competitor finishing positions
-                        elif message_type == "EventResultChanged":
-                            eid = msg.get("EventId")
-                            comps = msg.get("CompetitorResults", [])
-                            if eid:
-                                if _is_bq_sink(conn):
-                                    try:
-                                        rows = []
-                                        for c in comps:
-                                            cid = str(c.get("CompetitorId") or "")
-                                            fp = c.get("FinishingPosition")
-                                            st = c.get("Status")
-                                            rows.append({
-                                                "event_id": str(eid),
-                                                "ts_ms": ts,
-                                                "competitor_id": cid,
-                                                "finishing_position": int(fp) if fp is not None else None,
-                                                "status": str(st) if st is not None else None,
-                                            })
-                                        if rows and q is not None:
-                                            for r in rows:
-                                                await q.put(("upsert_tote_event_results_log", r))
-                                    except Exception:
-                                        pass
-
-                        # PoolDividendChanged → append dividend updates per selection
-                        elif message_type == "PoolDividendChanged":
-                            pid = msg.get("ProductId")
-                            dvs = msg.get("Dividends", [])
-                            if pid and dvs and _is_bq_sink(conn):
-                                try:
-                                    rows = []
-                                    # Optional HTTP fallback for amounts if WS payload lacks them
-                                    fetched_amounts: dict[str, float] | None = None
-                                    for d in dvs:
-                                        dividend = d.get("Dividend", {})
-                                        amounts_list = dividend.get("Amounts", [])
-                                        amount = _money_to_float(amounts_list[0] if amounts_list else None)
-                                        legs = d.get("Legs", [])
-                                        for lg in legs:
-                                            sels = lg.get("Selections", [])
-                                            for s in sels:
-                                                sel_id = s.get("Id")
-                                                if sel_id:
-                                                    # If amount present in WS, use it; otherwise, fetch via HTTP once and map per selection
-                                                    if amount is not None:
-                                                        rows.append({
-                                                            "product_id": str(pid),
-                                                            "selection": str(sel_id),
-                                                            "dividend": float(amount),
-                                                            "ts": str(ts),
-                                                        })
-                                                    else:
-                                                        if fetched_amounts is None:
-                                                            # Debounced HTTP fetch
-                                                            fetched_amounts = {}
-                                                            try:
-                                                                # Run HTTP fetch once per message if we need amounts
-                                                                async def _fetch_map() -> dict[str, float]:
-                                                                    nonlocal http_client
-                                                                    if http_client is None:
-                                                                        try:
-                                                                            http_client = ToteClient()
-                                                                        except Exception:
-                                                                            return {}
-                                                                    q = (
-                                                                        """
-                                                                        query GetDividends($id: String!) {
-                                                                          product(id: $id) {
-                                                                            ... on BettingProduct {
-                                                                              result { dividends { nodes {
-                                                                                dividend { amounts { decimalAmount stringAmount minorUnitsTotalAmount currency { code } } }
-                                                                                dividendLegs { nodes { dividendSelections { nodes { id } } } }
-                                                                              } } }
-                                                                            }
-                                                                            type { ... on BettingProduct { result { dividends { nodes {
-                                                                              dividend { amounts { decimalAmount stringAmount minorUnitsTotalAmount currency { code } } }
-                                                                              dividendLegs { nodes { dividendSelections { nodes { id } } } }
-                                                                            } } } } }
-                                                                          }
-                                                                        }
-                                                                        """
-                                                                    )
-                                                                    data2 = await asyncio.to_thread(http_client.graphql, q, {"id": str(pid)})
-                                                                    node2 = (data2.get("product") or {})
-                                                                    src2 = (node2.get("type") or node2) or {}
-                                                                    res = ((src2.get("result") or {}).get("dividends") or {})
-                                                                    nds = res.get("nodes") or []
-                                                                    mp: dict[str, float] = {}
-                                                                    for nd in nds:
-                                                                        try:
-                                                                            amt_list = (((nd.get("dividend") or {}).get("amounts")) or [])
-                                                                            amt_val = _money_to_float(amt_list[0] if amt_list else None)
-                                                                            dlegs = ((nd.get("dividendLegs") or {}).get("nodes") or [])
-                                                                            if amt_val is not None:
-                                                                                for dl in dlegs:
-                                                                                    dsel_nodes = ((dl.get("dividendSelections") or {}).get("nodes") or [])
-                                                                                    for dsel in dsel_nodes:
-                                                                                        sid = dsel.get("id")
-                                                                                        if sid:
-                                                                                            mp[str(sid)] = float(amt_val)
-                                                                        except Exception:
-                                                                            continue
-                                                                    return mp
-                                                                fetched_amounts = await _fetch_map()
-                                                            except Exception:
-                                                                fetched_amounts = {}
-                                                        if fetched_amounts:
-                                                            amt = fetched_amounts.get(str(sel_id))
-                                                            if amt is not None:
-                                                                rows.append({
-                                                                    "product_id": str(pid),
-                                                                    "selection": str(sel_id),
-                                                                    "dividend": float(amt),
-                                                                    "ts": str(ts),
-                                                                })
-                                    if rows and q is not None:
-                                        for r in rows:
-                                            await q.put(("upsert_tote_product_dividends", r))
-                                except Exception:
-                                    pass
-
-                        # SelectionStatusChanged → selection status log
-                        elif message_type == "SelectionStatusChanged" and _is_bq_sink(conn):
-                            try:
-                                pid = msg.get("ProductId")
-                                sid = msg.get("SelectionId")
-                                st = msg.get("Status")
-                                if pid and sid and st is not None:
-                                    if q is not None:
-                                        await q.put((
-                                            "upsert_tote_selection_status_log",
-                                            {"product_id": str(pid), "selection_id": str(sid), "ts_ms": ts, "status": str(st)},
-                                        ))
-                            except Exception:
-                                pass
-
-                        # CompetitorStatusChanged → competitor status per event
-                        elif message_type == "CompetitorStatusChanged" and _is_bq_sink(conn):
-                            try:
-                                eid = msg.get("EventId")
-                                cid = msg.get("CompetitorId")
-                                st = msg.get("Status")
-                                if eid and cid and st is not None:
-                                    if q is not None:
-                                        await q.put((
-                                            "upsert_tote_competitor_status_log",
-                                            {"event_id": str(eid), "competitor_id": str(cid), "ts_ms": ts, "status": str(st)},
-                                        ))
-                            except Exception:
-                                pass
-
-                        # ProductStatusChanged → product status log + realtime publish (with event context)
-                        elif message_type == "ProductStatusChanged":
-                            try:
-                                pid = msg.get("ProductId")
-                                st = msg.get("Status")
-                                if pid and st is not None:
-                                    # Enrich with product context (event_id, bet_type) for UI consumers
-                                    ctx = _get_product_ctx(str(pid)) or {}
-                                    try:
-                                        if rt_bus is not None:
-                                            rt_bus.publish(
-                                                "product_status_changed",
-                                                {
-                                                    "product_id": str(pid),
-                                                    "event_id": ctx.get("event_id"),
-                                                    "bet_type": ctx.get("bet_type"),
-                                                    "status": str(st),
-                                                    "ts_ms": ts,
-                                                },
-                                            )
-                                    except Exception:
-                                        pass
-                                    if _is_bq_sink(conn) and q is not None:
-                                        await q.put((
-                                            "upsert_tote_product_status_log",
-                                            {"product_id": str(pid), "ts_ms": ts, "status": str(st)},
-                                        ))
-                                    if event_callback:
-                                        # Also publish via injected callback (used by webapp SSE bus)
-                                        event_callback(
-                                            "product_status_changed",
-                                            {
-                                                "product_id": str(pid),
-                                                "event_id": ctx.get("event_id"),
-                                                "bet_type": ctx.get("bet_type"),
-                                                "status": str(st),
-                                                "ts_ms": ts,
-                                            },
-                                        )
-                            except asyncio.QueueFull:
-                                pass
-                            except Exception:
-                                pass
-
-                        # Bet lifecycle messages
-                        elif message_type in ("BetAccepted", "BetRejected", "BetFailed", "BetCancelled", "BetResulted", "BetSettled"):
-                            if _is_bq_sink(conn):
-                                try:
-                                    bet_id = msg.get("BetId")
-                                    customer_bet_id = msg.get("CustomerBetId")
-                                    reason = msg.get("Reason")
-                                    return_amount = msg.get("ReturnAmount")
-                                    
-                                    row = {
-                                        "raw_id": f"sub:{message_type}:{ts}",
-                                        "endpoint": message_type,
-                                        "entity_id": str(bet_id or ""),
-                                        "sport": "horse_racing",
-                                        "fetched_ts": time.strftime(
-                                            "%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts / 1000.0)
-                                        ),
-                                        "payload": json.dumps({
-                                            "MessageType": message_type,
-                                            "BetId": bet_id,
-                                            "CustomerBetId": customer_bet_id,
-                                            "Reason": reason,
-                                            "ReturnAmount": return_amount
-                                        }, ensure_ascii=False),
-                                    }
-                                    if q is not None:
-                                        await q.put(("upsert_raw_tote", row))
-                                except Exception:
-                                    pass
+                        fn(msg, ts)
                     except Exception:
                         # best-effort parse; continue on errors
-                        pass
+                        message_stats.record(str(message_type), time.perf_counter() - t_msg, error=True)
+                        continue
+                    message_stats.record(str(message_type), time.perf_counter() - t_msg)
         except Exception:
+            if _should_stop():
+                break
             # Reconnect with backoff
             try:
                 await asyncio.sleep(min(30.0, backoff))
@@ -662,18 +613,30 @@ async def _subscribe_pools(url: str, conn, *, duration: Optional[int] = None, ev
             backoff = min(30.0, backoff * 2.0)
     # Ensure background tasks are stopped
     try:
+        if handler_tasks:
+            # Let in-flight handlers finish (their HTTP fallbacks are bounded), then cancel stragglers
+            _done, pending = await asyncio.wait(set(handler_tasks), timeout=10.0)
+            for t in pending:
+                t.cancel()
         stop_event.set()
-        if refresher_task:
-            await asyncio.sleep(0)  # allow task to see stop
+        if coalesce_task:
             try:
-                await asyncio.wait_for(refresher_task, timeout=1.0)
+                await asyncio.wait_for(coalesce_task, timeout=1.0)
             except Exception:
                 pass
-        if worker_task:
+        if sink is not None:
             try:
-                await asyncio.wait_for(worker_task, timeout=2.0)
+                for r in coalescer.drain():
+                    sink.submit("upsert_tote_pool_snapshots", r)
+                await sink.aclose(timeout=30.0)
             except Exception:
                 pass
+        if ctx_cache is not None:
+            ctx_cache.stop()
+        if async_http_client is not None:
+            await async_http_client.aclose()
+        if tap is not None:
+            tap.close()
     except Exception:
         pass
 
@@ -3,27 +3,131 @@ Pub/Sub Consumer for Real-time WebSocket Events
 
 This module handles consuming real-time events from Pub/Sub topics
 and publishing them to the in-memory event bus for SSE consumption.
+
+Each topic's subscription runs on streaming pull with flow control (bounded
+outstanding messages and bytes), and all of them share one callback thread
+pool. Callbacks only decode and buffer; a flusher thread hands buffered
+events to the bus in micro-batches and then acks the whole batch (the
+client library sends those acks to the stream in bulk). Limits and batch
+sizes come from the ``pubsub_*`` settings in ``sports/config.py``.
 """
 
 import json
 import threading
 import time
-from typing import Dict, Any, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
 from google.cloud import pubsub_v1
-from google.api_core import retry
+from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
 
 from .config import cfg
 from .realtime import bus as event_bus
 
 
+def _json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
+
+
+class _SharedScheduler(ThreadScheduler):
+    """Per-subscription scheduler on the consumer's shared executor.
+
+    The streaming pull manager shuts its scheduler down when its stream
+    closes; that must not take the executor away from the other topics, so
+    shutdown is left to ``PubSubConsumer.stop``.
+    """
+
+    def shutdown(self, await_msg_callbacks: bool = False):
+        return []
+
+
+class _TopicStats:
+    def __init__(self) -> None:
+        self.received = 0
+        self.delivered = 0
+        self.bytes = 0
+        self.errors = 0
+        self.last_lag_ms: Optional[float] = None
+        self.max_lag_ms = 0.0
+        self.lags: Deque[float] = deque(maxlen=2000)
+        self.window_start = time.time()
+        self.window_count = 0
+        self.rate = 0.0
+
+    def record(self, size: int, lag_ms: Optional[float]) -> None:
+        self.received += 1
+        self.bytes += size
+        self.window_count += 1
+        if lag_ms is not None:
+            self.last_lag_ms = lag_ms
+            self.lags.append(lag_ms)
+            if lag_ms > self.max_lag_ms:
+                self.max_lag_ms = lag_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        span = now - self.window_start
+        if span >= 10.0:
+            self.rate = self.window_count / span
+            self.window_start, self.window_count = now, 0
+        rate = self.rate if self.rate or span >= 10.0 else self.window_count / max(span, 1e-9)
+        lags = sorted(self.lags)
+
+        def pct(q: float) -> Optional[float]:
+            return round(lags[min(len(lags) - 1, int(q * (len(lags) - 1)))], 1) if lags else None
+
+        return {
+            "received": self.received,
+            "delivered": self.delivered,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "messages_per_s": round(rate, 2),
+            "lag_ms": {
+                "last": round(self.last_lag_ms, 1) if self.last_lag_ms is not None else None,
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "max": round(self.max_lag_ms, 1),
+            },
+        }
+
+
 class PubSubConsumer:
     """Consumes Pub/Sub messages and publishes to event bus"""
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        *,
+        max_messages: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        callback_workers: Optional[int] = None,
+        batch_ms: Optional[int] = None,
+        batch_max: Optional[int] = None,
+    ):
         self.subscriber = pubsub_v1.SubscriberClient()
         self.running = False
         self.threads = []
-        
+        self.flow_control = pubsub_v1.types.FlowControl(
+            max_messages=max(1, max_messages or cfg.pubsub_max_messages),
+            max_bytes=max(1 << 16, max_bytes or cfg.pubsub_max_bytes),
+        )
+        self.callback_workers = max(1, callback_workers or cfg.pubsub_callback_workers)
+        self.batch_s = max(1, batch_ms or cfg.pubsub_bus_batch_ms) / 1000.0
+        self.batch_max = max(1, batch_max or cfg.pubsub_bus_batch_max)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._cond = threading.Condition()
+        self._buffer: List[Tuple[str, Dict[str, Any], Any]] = []
+        self.stats_by_topic: Dict[str, _TopicStats] = {}
+        self.batches = 0
+
         # Topic mappings
         self.topics = {
             'tote-pool-total-changed': 'pool_total_changed',
@@ -35,66 +139,99 @@ class PubSubConsumer:
             'tote-competitor-status-changed': 'competitor_status_changed',
             'tote-bet-lifecycle': 'bet_lifecycle'
         }
-    
+        for event_type in self.topics.values():
+            self.stats_by_topic[event_type] = _TopicStats()
+
     def callback(self, message, event_type: str):
-        """Process incoming Pub/Sub message"""
+        """Decode an incoming message and buffer it for the next bus batch (acked after delivery)."""
+        st = self.stats_by_topic[event_type]
         try:
-            # Decode message data
-            data = json.loads(message.data.decode('utf-8'))
-            
+            data = _json_loads(message.data)
+
             # Extract event data
             event_data = data.get('data', {})
             timestamp = data.get('timestamp', time.time())
-            
+
             # Add timestamp if not present
             if 'ts_ms' not in event_data:
                 event_data['ts_ms'] = int(timestamp * 1000)
-            
-            # Publish to in-memory event bus
-            event_bus.publish(event_type, event_data)
-            
-            print(f"Processed {event_type} event: {event_data.get('product_id', event_data.get('event_id', 'unknown'))}")
-            
+
+            lag_ms = None
+            try:
+                lag_ms = max(0.0, (time.time() - message.publish_time.timestamp()) * 1000.0)
+            except Exception:
+                pass
+            st.record(len(message.data), lag_ms)
         except Exception as e:
+            st.errors += 1
             print(f"Error processing {event_type} message: {e}")
-        finally:
-            # Acknowledge message
+            # Undecodable: ack so it is not redelivered forever
             message.ack()
-    
+            return
+        with self._cond:
+            self._buffer.append((event_type, event_data, message))
+            if len(self._buffer) >= self.batch_max:
+                self._cond.notify()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                if self.running and len(self._buffer) < self.batch_max:
+                    self._cond.wait(timeout=self.batch_s)
+                batch, self._buffer = self._buffer, []
+                if not batch and not self.running:
+                    return
+            if batch:
+                self._deliver(batch)
+
+    def _deliver(self, batch: List[Tuple[str, Dict[str, Any], Any]]) -> None:
+        try:
+            event_bus.publish_many((event_type, event_data) for event_type, event_data, _ in batch)
+        except Exception as e:
+            print(f"Error publishing Pub/Sub batch to event bus: {e}")
+        for event_type, _, message in batch:
+            self.stats_by_topic[event_type].delivered += 1
+            try:
+                message.ack()
+            except Exception:
+                pass
+        self.batches += 1
+
     def subscribe_to_topic(self, topic_name: str, event_type: str):
         """Subscribe to a specific Pub/Sub topic"""
         try:
             subscription_path = self.subscriber.subscription_path(
-                cfg.gcp_project, 
+                cfg.gcp_project,
                 f"{topic_name}-sub"
             )
-            
-            # Create callback with event type
-            callback_func = lambda message: self.callback(message, event_type)
-            
-            # Start streaming pull
-            streaming_pull_future = self.subscriber.pull(
-                request={"subscription": subscription_path},
-                callback=callback_func,
-                retry=retry.Retry(deadline=300)
+
+            # Start streaming pull on the shared callback pool
+            streaming_pull_future = self.subscriber.subscribe(
+                subscription_path,
+                callback=lambda message: self.callback(message, event_type),
+                flow_control=self.flow_control,
+                scheduler=_SharedScheduler(executor=self._executor),
             )
-            
+
             print(f"Subscribed to {topic_name} -> {event_type}")
             return streaming_pull_future
-            
+
         except Exception as e:
             print(f"Error subscribing to {topic_name}: {e}")
             return None
-    
+
     def start(self):
         """Start consuming from all topics"""
         if self.running:
             print("Consumer already running")
             return
-        
+
         self.running = True
         print("Starting Pub/Sub consumer...")
-        
+        self._executor = ThreadPoolExecutor(max_workers=self.callback_workers, thread_name_prefix="pubsub-cb")
+        self._flusher = threading.Thread(target=self._flush_loop, name="pubsub-bus-flush", daemon=True)
+        self._flusher.start()
+
         # Subscribe to all topics
         for topic_name, event_type in self.topics.items():
             try:
@@ -103,31 +240,52 @@ class PubSubConsumer:
                     self.threads.append(future)
             except Exception as e:
                 print(f"Failed to subscribe to {topic_name}: {e}")
-        
+
         print(f"Started {len(self.threads)} topic subscriptions")
-    
+
     def stop(self):
         """Stop consuming from all topics"""
         if not self.running:
             return
-        
+
         self.running = False
         print("Stopping Pub/Sub consumer...")
-        
+
         # Cancel all futures
         for future in self.threads:
             try:
                 future.cancel()
             except Exception as e:
                 print(f"Error canceling subscription: {e}")
-        
+
         self.threads.clear()
+        # Deliver and ack whatever is buffered, then release the callback pool
+        with self._cond:
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+            self._flusher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         print("Pub/Sub consumer stopped")
-    
+
     def is_running(self) -> bool:
         """Check if consumer is running"""
         return self.running
 
+    def stats(self) -> Dict[str, Any]:
+        """Per-topic throughput, lag (publish to receipt) and delivery counters"""
+        return {
+            "running": self.running,
+            "subscriptions": len(self.threads),
+            "buffered": len(self._buffer),
+            "batches": self.batches,
+            "flow_control": {"max_messages": self.flow_control.max_messages, "max_bytes": self.flow_control.max_bytes},
+            "callback_workers": self.callback_workers,
+            "topics": {t: s.snapshot() for t, s in self.stats_by_topic.items()},
+        }
+
 
 # Global consumer instance
 _consumer: Optional[PubSubConsumer] = None
@@ -140,22 +298,15 @@ def get_consumer() -> PubSubConsumer:
     return _consumer
 
 def start_pubsub_consumer():
-    """Start the Pub/Sub consumer in a background thread"""
+    """Start the Pub/Sub consumer (streaming pull runs on the client library's own threads)"""
     consumer = get_consumer()
-    
+
     if consumer.is_running():
         print("Pub/Sub consumer already running")
         return
-    
-    def run_consumer():
-        consumer.start()
-        # Keep the thread alive
-        while consumer.is_running():
-            time.sleep(1)
-    
-    thread = threading.Thread(target=run_consumer, daemon=True)
-    thread.start()
-    print("Pub/Sub consumer started in background thread")
+
+    consumer.start()
+    print("Pub/Sub consumer started")
 
 def stop_pubsub_consumer():
     """Stop the Pub/Sub consumer"""
@@ -166,3 +317,7 @@ def is_consumer_running() -> bool:
     """Check if consumer is running"""
     consumer = get_consumer()
     return consumer.is_running()
+
+def consumer_stats() -> Dict[str, Any]:
+    """Stats of the global consumer, or an empty dict if it was never created"""
+    return _consumer.stats() if _consumer is not None else {}
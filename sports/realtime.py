@@ -1,71 +1,217 @@
 import threading
 import time
-from queue import Queue, Empty
-from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, Mapping, Optional, Set, Tuple
+
+from .config import cfg
+
+# Field identifying "the same thing" per topic; in "latest" mode a newer
+# message for the same key replaces the one still waiting in the queue.
+DEFAULT_KEYS: Dict[str, str] = {
+    "pool_total_changed": "product_id",
+    "product_status_changed": "product_id",
+    "selection_status_changed": "selection_id",
+    "event_status_changed": "event_id",
+}
+
+MODES = ("queue", "latest")
 
 
 class _Subscriber:
-    def __init__(self, topics: Set[str], flt: Optional[Callable[[str, Dict[str, Any]], bool]], maxsize: int = 512):
+    """One consumer's topics, filters and pending messages.
+
+    Modes:
+    - ``queue``: FIFO; when full the oldest message is dropped (never the newest).
+    - ``latest``: one pending message per (topic, key); an update for a key
+      still waiting replaces it in place, so a slow reader always gets the
+      current state instead of a stale backlog.
+
+    ``keys`` maps a payload field to the values the subscriber wants (e.g.
+    ``{"event_id": {"E1", "E2"}}``); a message passes only if every field's
+    value is in its set. Checked with set lookups, not callbacks.
+    """
+
+    def __init__(
+        self,
+        topics: Set[str],
+        flt: Optional[Callable[[str, Dict[str, Any]], bool]],
+        maxsize: int = 512,
+        *,
+        keys: Optional[Mapping[str, Iterable[Any]]] = None,
+        mode: str = "queue",
+        coalesce_key: Optional[Mapping[str, str]] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"unknown subscriber mode: {mode}")
         self.topics = topics
         self.filter = flt
-        self.q: "Queue[Tuple[str, Dict[str, Any]]]" = Queue(maxsize=maxsize)
+        self.keys: Tuple[Tuple[str, frozenset], ...] = tuple(
+            (field, frozenset(str(v) for v in values)) for field, values in (keys or {}).items()
+        )
+        self.mode = mode
+        self.maxsize = max(1, int(maxsize))
+        self.coalesce_key = dict(DEFAULT_KEYS)
+        if coalesce_key:
+            self.coalesce_key.update(coalesce_key)
+        self._cond = threading.Condition(threading.Lock())
+        self._fifo: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._latest: "OrderedDict[Hashable, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._seq = 0
         self.alive = True
+        self.created = time.time()
+        self.delivered = 0
+        self.filtered = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def matches(self, payload: Dict[str, Any]) -> bool:
+        for field, allowed in self.keys:
+            v = payload.get(field)
+            if v is None or str(v) not in allowed:
+                return False
+        return True
 
     def put(self, topic: str, payload: Dict[str, Any]) -> None:
         if not self.alive:
             return
         try:
+            if self.keys and not self.matches(payload):
+                self.filtered += 1
+                return
             if self.filter and not self.filter(topic, payload):
+                self.filtered += 1
                 return
-            self.q.put_nowait((topic, payload))
         except Exception:
-            # Drop on overflow or any queue error
-            pass
+            return
+        with self._cond:
+            if self.mode == "latest":
+                field = self.coalesce_key.get(topic)
+                kv = payload.get(field) if field else None
+                if kv is None:
+                    # No key: behaves like a queue entry
+                    self._seq += 1
+                    key: Hashable = (topic, None, self._seq)
+                else:
+                    key = (topic, kv)
+                if key in self._latest:
+                    self.coalesced += 1
+                elif len(self._latest) >= self.maxsize:
+                    self._latest.popitem(last=False)
+                    self.dropped += 1
+                self._latest[key] = (topic, payload)
+            else:
+                if len(self._fifo) >= self.maxsize:
+                    self._fifo.popleft()
+                    self.dropped += 1
+                self._fifo.append((topic, payload))
+            self._cond.notify()
+
+    def _pop(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        if self._latest:
+            return self._latest.popitem(last=False)[1]
+        if self._fifo:
+            return self._fifo.popleft()
+        return None
 
     def get(self, timeout: Optional[float] = None) -> Optional[Tuple[str, Dict[str, Any]]]:
         if not self.alive:
             return None
-        try:
-            return self.q.get(timeout=timeout)
-        except Empty:
-            return None
+        with self._cond:
+            item = self._pop()
+            if item is None:
+                self._cond.wait(timeout=timeout)
+                if not self.alive:
+                    return None
+                item = self._pop()
+            if item is not None:
+                self.delivered += 1
+            return item
+
+    def pending(self) -> int:
+        return len(self._latest) + len(self._fifo)
 
     def close(self) -> None:
         self.alive = False
+        with self._cond:
+            self._fifo.clear()
+            self._latest.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "topics": sorted(self.topics),
+            "mode": self.mode,
+            "keys": {f: len(v) for f, v in self.keys},
+            "pending": self.pending(),
+            "delivered": self.delivered,
+            "filtered": self.filtered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "age_s": round(time.time() - self.created, 1),
+        }
 
 
 class EventBus:
     """Simple in-memory pub/sub for server-originated UI updates.
 
     - Thread-safe publish/subscribe
-    - Best-effort (drops on overflow)
+    - Subscribers are indexed by topic: publish touches only the subscribers
+      of that topic (plus ``*`` subscribers) and takes no lock; subscribe and
+      unsubscribe swap in new immutable tuples
+    - Best-effort: a full subscriber drops its oldest message, or in
+      ``latest`` mode keeps just the newest message per key
     - Designed for single-process dev or small deployments
     """
 
     def __init__(self) -> None:
-        self._subs: List[_Subscriber] = []
         self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[_Subscriber, ...]] = {}
+        self._wildcard: Tuple[_Subscriber, ...] = ()
+        self.published: Dict[str, int] = {}
 
     def publish(self, topic: str, payload: Dict[str, Any]) -> None:
-        with self._lock:
-            subs = list(self._subs)
-        for s in subs:
-            try:
-                if topic in s.topics or "*" in s.topics:
+        self.published[topic] = self.published.get(topic, 0) + 1
+        for subs in (self._index.get(topic, ()), self._wildcard):
+            for s in subs:
+                try:
                     s.put(topic, payload)
-            except Exception:
-                # Ignore subscriber errors
-                pass
+                except Exception:
+                    # Ignore subscriber errors
+                    pass
+
+    def publish_many(self, events: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Publish a batch of (topic, payload) in order, e.g. a Pub/Sub micro-batch."""
+        index, wildcard, published = self._index, self._wildcard, self.published
+        for topic, payload in events:
+            published[topic] = published.get(topic, 0) + 1
+            for subs in (index.get(topic, ()), wildcard):
+                for s in subs:
+                    try:
+                        s.put(topic, payload)
+                    except Exception:
+                        pass
+
+    def has_subscribers(self, topic: str) -> bool:
+        """Cheap check so publishers can skip building payloads nobody receives."""
+        return bool(self._wildcard) or bool(self._index.get(topic))
 
     def subscribe(
         self,
         topics: Iterable[str],
         flt: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
         maxsize: int = 512,
+        *,
+        keys: Optional[Mapping[str, Iterable[Any]]] = None,
+        mode: str = "queue",
+        coalesce_key: Optional[Mapping[str, str]] = None,
     ) -> _Subscriber:
-        s = _Subscriber(set(topics), flt, maxsize=maxsize)
+        s = _Subscriber(set(topics), flt, maxsize=maxsize, keys=keys, mode=mode, coalesce_key=coalesce_key)
         with self._lock:
-            self._subs.append(s)
+            for t in s.topics:
+                if t == "*":
+                    self._wildcard = self._wildcard + (s,)
+                else:
+                    self._index[t] = self._index.get(t, ()) + (s,)
         return s
 
     def unsubscribe(self, s: _Subscriber) -> None:
@@ -74,12 +220,70 @@ class EventBus:
         except Exception:
             pass
         with self._lock:
-            try:
-                self._subs.remove(s)
-            except ValueError:
-                pass
+            for t in s.topics:
+                if t == "*":
+                    self._wildcard = tuple(x for x in self._wildcard if x is not s)
+                    continue
+                rest = tuple(x for x in self._index.get(t, ()) if x is not s)
+                if rest:
+                    self._index[t] = rest
+                else:
+                    self._index.pop(t, None)
 
+    def set_topics(self, s: _Subscriber, topics: Iterable[str]) -> None:
+        """Change an existing subscriber's topics in place (its pending messages are kept)."""
+        new = set(topics)
+        with self._lock:
+            for t in s.topics - new:
+                if t == "*":
+                    self._wildcard = tuple(x for x in self._wildcard if x is not s)
+                    continue
+                rest = tuple(x for x in self._index.get(t, ()) if x is not s)
+                if rest:
+                    self._index[t] = rest
+                else:
+                    self._index.pop(t, None)
+            for t in new - s.topics:
+                if t == "*":
+                    self._wildcard = self._wildcard + (s,)
+                else:
+                    self._index[t] = self._index.get(t, ()) + (s,)
+            s.topics = new
 
-# Global singleton bus
-bus = EventBus()
+    def subscribers(self) -> List[_Subscriber]:
+        seen: Dict[int, _Subscriber] = {}
+        for subs in list(self._index.values()) + [self._wildcard]:
+            for s in subs:
+                seen[id(s)] = s
+        return list(seen.values())
 
+    def stats(self) -> Dict[str, Any]:
+        subs = self.subscribers()
+        return {
+            "subscribers": len(subs),
+            "by_topic": {t: len(v) for t, v in self._index.items()},
+            "wildcard": len(self._wildcard),
+            "published": dict(self.published),
+            "pending": sum(s.pending() for s in subs),
+            "dropped": sum(s.dropped for s in subs),
+            "coalesced": sum(s.coalesced for s in subs),
+            "filtered": sum(s.filtered for s in subs),
+            "consumers": [s.stats() for s in subs[:50]],
+        }
+
+
+def _make_bus() -> EventBus:
+    """In-process bus, or the Redis-backed one shared by all instances when REALTIME_BUS=redis."""
+    if cfg.realtime_bus == "redis":
+        url = (cfg.realtime_redis_url or cfg.redis_url or "").strip()
+        try:
+            from .realtime_redis import RedisEventBus
+
+            return RedisEventBus(url)
+        except Exception as e:
+            print(f"[Realtime] Redis bus unavailable, using in-process bus: {e}")
+    return EventBus()
+
+
+# Global singleton bus
+bus = _make_bus()
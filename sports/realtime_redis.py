@@ -0,0 +1,337 @@
+"""Redis Streams backend for the realtime event bus (multi-instance deployments).
+
+With several webapp instances behind a load balancer only the one running the
+pool subscriber or Pub/Sub consumer sees events on its in-process bus.
+``RedisEventBus`` is a drop-in ``EventBus`` that also appends every publish
+to one Redis stream and reads the stream back on a background thread, so
+each instance fans out every event to its own local subscribers (SSE
+clients, the asyncio fan-out service) exactly as before.
+
+- Local subscribers get local publishes immediately; the reader skips
+  entries this instance wrote.
+- Payloads are stored binary: msgpack when installed, else orjson/json
+  bytes, behind a one-byte codec tag so readers decode either.
+- The stream is trimmed to roughly ``cfg.realtime_redis_maxlen`` entries on
+  every append and, with ``cfg.realtime_redis_retention_s``, also to that
+  age by the
+  reader every few seconds (XADD takes only one trim rule). That bounds
+  memory and is the catch-up window: ``history()`` returns entries after a
+  stream id, and a new instance can start ``cfg.realtime_redis_catchup_s``
+  seconds back.
+- Each instance advertises its subscribed topics in a hash so
+  ``has_subscribers`` still lets publishers skip topics nobody listens to on
+  any instance. Consumers that read the stream themselves (``read()``, e.g.
+  the SSE fan-out, which uses stream ids as event ids) declare their topics
+  with ``set_interest()``.
+
+Enable with REALTIME_BUS=redis; the URL is REALTIME_REDIS_URL or REDIS_URL.
+The remaining ``realtime_redis_*`` settings live in ``sports/config.py``.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import redis  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    redis = None  # type: ignore
+
+try:
+    import msgpack  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    msgpack = None  # type: ignore
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+
+from .config import cfg
+from .realtime import EventBus
+
+_MSGPACK = b"m"
+_JSON = b"j"
+
+
+def encode_payload(payload: Dict[str, Any]) -> bytes:
+    if msgpack is not None:
+        try:
+            return _MSGPACK + msgpack.packb(payload, use_bin_type=True, default=str)
+        except Exception:
+            pass
+    if orjson is not None:
+        try:
+            return _JSON + orjson.dumps(payload)
+        except Exception:
+            pass
+    return _JSON + json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def decode_payload(data: bytes) -> Dict[str, Any]:
+    tag, body = data[:1], data[1:]
+    if tag == _MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack-encoded event but msgpack is not installed")
+        return msgpack.unpackb(body, raw=False)
+    if tag == _JSON:
+        return orjson.loads(body) if orjson is not None else json.loads(body.decode("utf-8"))
+    raise ValueError(f"unknown event codec {tag!r}")
+
+
+class RedisEventBus(EventBus):
+    """EventBus whose publishes reach the local subscribers of every instance."""
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        *,
+        client: Any = None,
+        stream: Optional[str] = None,
+        maxlen: Optional[int] = None,
+        retention_s: Optional[float] = None,
+        catchup_s: Optional[float] = None,
+        block_ms: int = 1000,
+        start: bool = True,
+    ) -> None:
+        super().__init__()
+        if client is None:
+            if redis is None:
+                raise RuntimeError("redis package not installed")
+            client = redis.from_url(url, decode_responses=False, socket_connect_timeout=2.0, socket_timeout=5.0 + block_ms / 1000.0)
+        self.redis = client
+        self.stream = stream or cfg.realtime_redis_stream
+        self.interest_key = f"{self.stream}:interest"
+        self.maxlen = max(100, int(maxlen if maxlen is not None else cfg.realtime_redis_maxlen))
+        self.retention_s = max(0.0, retention_s if retention_s is not None else cfg.realtime_redis_retention_s)
+        self.catchup_s = max(0.0, catchup_s if catchup_s is not None else cfg.realtime_redis_catchup_s)
+        self.block_ms = block_ms
+        self.origin = uuid.uuid4().hex[:12].encode("ascii")
+        self.last_id: Optional[bytes] = None
+        self.remote_topics: Set[str] = set()
+        # Topics of direct stream readers (``read()``), by owner
+        self._interest: Dict[str, Set[str]] = {}
+        self.connected = False
+        self.counters = {"sent": 0, "received": 0, "skipped_own": 0, "send_errors": 0, "read_errors": 0, "decode_errors": 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_interest = 0.0
+        self._next_trim = 0.0
+        if start:
+            self.start()
+
+    # -- publishing --------------------------------------------------------
+    def _fields(self, topic: str, payload: Dict[str, Any]) -> Dict[bytes, bytes]:
+        return {b"o": self.origin, b"t": topic.encode("utf-8"), b"p": encode_payload(payload)}
+
+    def _xadd(self, target: Any, fields: Dict[bytes, bytes]) -> Any:
+        return target.xadd(self.stream, fields, maxlen=self.maxlen, approximate=True)
+
+    def _trim_age(self) -> None:
+        """Drop entries older than retention_s (every ~5s; the count cap is applied on append)."""
+        now = time.time()
+        if not self.retention_s or now < self._next_trim:
+            return
+        self._next_trim = now + 5.0
+        # Exact: an approximate MINID keeps whole stream nodes, i.e. stale entries
+        self.redis.xtrim(self.stream, minid=f"{int((now - self.retention_s) * 1000)}-0", approximate=False)
+
+    def publish(self, topic: str, payload: Dict[str, Any]) -> None:
+        super().publish(topic, payload)
+        if not self.has_subscribers(topic):
+            return
+        try:
+            self._xadd(self.redis, self._fields(topic, payload))
+            self.counters["sent"] += 1
+        except Exception as e:
+            self.counters["send_errors"] += 1
+            if self.counters["send_errors"] % 100 == 1:
+                print(f"[RealtimeRedis] publish failed: {e}")
+
+    def publish_many(self, events: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        events = list(events)
+        super().publish_many(events)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            n = 0
+            for topic, payload in events:
+                if self.has_subscribers(topic):
+                    self._xadd(pipe, self._fields(topic, payload))
+                    n += 1
+            if n:
+                pipe.execute()
+                self.counters["sent"] += n
+        except Exception as e:
+            self.counters["send_errors"] += 1
+            print(f"[RealtimeRedis] batch publish failed: {e}")
+
+    def has_subscribers(self, topic: str) -> bool:
+        if super().has_subscribers(topic) or "*" in self.remote_topics or topic in self.remote_topics:
+            return True
+        return any(topic in t or "*" in t for t in self._interest.values())
+
+    def set_interest(self, owner: str, topics: Iterable[str]) -> None:
+        """Declare the topics a direct stream reader wants, so every instance appends them."""
+        topics = set(topics)
+        if topics:
+            self._interest = {**self._interest, owner: topics}
+        else:
+            self._interest = {k: v for k, v in self._interest.items() if k != owner}
+        # Advertise on the next reader pass instead of waiting for the refresh
+        self._next_interest = 0.0
+
+    # -- reading -----------------------------------------------------------
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="realtime-redis", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            self.redis.hdel(self.interest_key, self.origin)
+        except Exception:
+            pass
+
+    def _start_id(self) -> bytes:
+        if self.catchup_s:
+            return f"{int((time.time() - self.catchup_s) * 1000)}-0".encode("ascii")
+        try:
+            # Only entries written from now on
+            info = self.redis.xinfo_stream(self.stream)
+            last = info.get("last-generated-id") or info.get(b"last-generated-id")
+            if last:
+                return last if isinstance(last, bytes) else str(last).encode("ascii")
+        except Exception:
+            pass
+        return b"0-0"
+
+    def _advertise(self) -> None:
+        """Publish this instance's topics and refresh the union of everyone's (every ~2s)."""
+        now = time.time()
+        if now < self._next_interest:
+            return
+        self._next_interest = now + 2.0
+        local = set(self._index) | ({"*"} if self._wildcard else set())
+        for topics in self._interest.values():
+            local |= topics
+        local = sorted(local)
+        self.redis.hset(self.interest_key, self.origin, json.dumps({"ts": now, "topics": local}))
+        topics: Set[str] = set()
+        stale = []
+        for inst, raw in (self.redis.hgetall(self.interest_key) or {}).items():
+            try:
+                rec = json.loads(raw)
+            except Exception:
+                continue
+            if now - float(rec.get("ts", 0)) > 10.0:
+                stale.append(inst)
+                continue
+            if inst != self.origin:
+                topics.update(rec.get("topics") or [])
+        if stale:
+            self.redis.hdel(self.interest_key, *stale)
+        self.remote_topics = topics
+
+    def _deliver(self, entries: List[Tuple[bytes, Dict[bytes, bytes]]]) -> None:
+        batch = []
+        for entry_id, fields in entries:
+            self.last_id = entry_id
+            if fields.get(b"o") == self.origin:
+                self.counters["skipped_own"] += 1
+                continue
+            try:
+                batch.append((fields[b"t"].decode("utf-8"), decode_payload(fields[b"p"])))
+            except Exception:
+                self.counters["decode_errors"] += 1
+        if batch:
+            self.counters["received"] += len(batch)
+            # Local fan-out only: EventBus.publish_many, not ours (which would re-append to Redis)
+            EventBus.publish_many(self, batch)
+
+    def _run(self) -> None:
+        backoff = 0.5
+        while not self._stop.is_set():
+            try:
+                if self.last_id is None:
+                    self.last_id = self._start_id()
+                self._advertise()
+                self._trim_age()
+                resp = self.redis.xread({self.stream: self.last_id}, count=500, block=self.block_ms)
+                self.connected = True
+                backoff = 0.5
+                for _stream, entries in resp or []:
+                    self._deliver(entries)
+            except Exception as e:
+                self.connected = False
+                self.counters["read_errors"] += 1
+                print(f"[RealtimeRedis] stream read failed (retrying in {backoff:.1f}s): {e}")
+                self._stop.wait(backoff)
+                backoff = min(30.0, backoff * 2)
+
+    def tail_id(self) -> str:
+        """Id of the newest stream entry ("0-0" if empty); ``read()`` from it returns only new entries."""
+        try:
+            info = self.redis.xinfo_stream(self.stream)
+            last = info.get("last-generated-id") or info.get(b"last-generated-id")
+            if last:
+                return last.decode("ascii") if isinstance(last, bytes) else str(last)
+        except Exception:
+            pass
+        return "0-0"
+
+    def first_id(self) -> Optional[str]:
+        """Id of the oldest retained entry, or None if the stream is empty."""
+        entries = self.redis.xrange(self.stream, min="-", max="+", count=1)
+        if not entries:
+            return None
+        entry_id = entries[0][0]
+        return entry_id.decode("ascii") if isinstance(entry_id, bytes) else str(entry_id)
+
+    def read(self, after_id: str, *, count: int = 1000, block_ms: Optional[int] = None) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Entries after ``after_id`` from every instance (this one included) as (stream id, topic, payload).
+
+        Blocks up to ``block_ms`` (default: the bus's) when there are none. Entries
+        that fail to decode come back with topic ``""`` so the caller still moves past them.
+        """
+        resp = self.redis.xread({self.stream: after_id}, count=count, block=self.block_ms if block_ms is None else block_ms)
+        out: List[Tuple[str, str, Dict[str, Any]]] = []
+        for _stream, entries in resp or []:
+            for entry_id, fields in entries:
+                entry_id = entry_id.decode("ascii") if isinstance(entry_id, bytes) else str(entry_id)
+                try:
+                    out.append((entry_id, fields[b"t"].decode("utf-8"), decode_payload(fields[b"p"])))
+                except Exception:
+                    self.counters["decode_errors"] += 1
+                    out.append((entry_id, "", {}))
+        return out
+
+    def history(self, after_id: str = "-", *, topics: Optional[Iterable[str]] = None, count: int = 1000) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Retained events after ``after_id`` (exclusive) as (stream id, topic, payload), for catch-up."""
+        want = set(topics) if topics else None
+        start = after_id if after_id == "-" else f"({after_id}"
+        out: List[Tuple[str, str, Dict[str, Any]]] = []
+        for entry_id, fields in self.redis.xrange(self.stream, min=start, max="+", count=count):
+            try:
+                topic = fields[b"t"].decode("utf-8")
+                if want is None or topic in want:
+                    out.append((entry_id.decode("ascii") if isinstance(entry_id, bytes) else str(entry_id), topic, decode_payload(fields[b"p"])))
+            except Exception:
+                continue
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        out = super().stats()
+        out["redis"] = {
+            **self.counters,
+            "connected": self.connected,
+            "stream": self.stream,
+            "last_id": self.last_id.decode("ascii") if isinstance(self.last_id, bytes) else self.last_id,
+            "remote_topics": sorted(self.remote_topics),
+            "codec": "msgpack" if msgpack is not None else "json",
+        }
+        return out
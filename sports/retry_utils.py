@@ -3,7 +3,9 @@
 import time
 import random
 import logging
-from typing import Callable, Any, Optional, Type, Tuple
+import threading
+from collections import deque
+from typing import Callable, Any, Dict, Optional, Type, Tuple
 from functools import wraps
 
 logger = logging.getLogger(__name__)
@@ -20,6 +22,203 @@ class TemporaryError(RetryableError):
     """Error indicating a temporary issue that might resolve with retry."""
     pass
 
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the dependency while its circuit breaker is open.
+
+    Callers should fail fast and serve cached data where they have it.
+    """
+    def __init__(self, dependency: str, retry_in: float):
+        super().__init__(f"Circuit open for {dependency}; retry in {retry_in:.1f}s")
+        self.dependency = dependency
+        self.retry_in = retry_in
+
+
+class RetryBudget:
+    """Caps retries for a dependency to a fraction of its recent requests.
+
+    Every first attempt deposits ``ratio`` of a retry; every retry spends one.
+    Counts are kept over a sliding window so a degraded dependency cannot be
+    hit with more than ``(1 + ratio)`` times its normal load by retries.
+    ``min_retries`` per window keeps low-traffic callers able to retry at all.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window_s: float = 10.0):
+        self.ratio = max(0.0, ratio)
+        self.min_retries = max(0, min_retries)
+        self.window_s = max(1.0, window_s)
+        self._lock = threading.Lock()
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self.denied = 0
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window_s
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        """Spend one retry if the budget allows it."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = len(self._requests) * self.ratio + self.min_retries
+            if len(self._retries) + 1 > allowed:
+                self.denied += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {
+                "ratio": self.ratio,
+                "window_s": self.window_s,
+                "requests": len(self._requests),
+                "retries": len(self._retries),
+                "denied": self.denied,
+            }
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker for one dependency.
+
+    Opens after ``failure_threshold`` consecutive failures; while open every
+    call fails fast with CircuitOpenError. After ``reset_timeout_s`` it goes
+    half-open and lets ``half_open_max_calls`` probes through: a successful
+    probe closes the circuit, a failed one re-opens it, and a neutral one
+    (an error that says nothing about the dependency's health) just frees
+    its probe slot.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_s = max(0.1, reset_timeout_s)
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout_s:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless the call may proceed."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.reset_timeout_s - (now - self._opened_at))
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed after successful probe")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_neutral(self) -> None:
+        """Outcome says nothing about health (e.g. bad input): release a half-open probe, keep counts."""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self, error: Optional[Exception] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if error is not None:
+                self.last_error = str(error)[:300]
+            self._failures += 1
+            state = self._current_state(now)
+            if state == self.HALF_OPEN or (state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = now
+                self.times_opened += 1
+                logger.warning(f"Circuit for {self.name} opened after {self._failures} failures: {self.last_error}")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_s": self.reset_timeout_s,
+                "retry_in_s": round(max(0.0, self.reset_timeout_s - (now - self._opened_at)), 1) if state == self.OPEN else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
+
+
+# Shared per-dependency state so every call site for e.g. "bigquery" or
+# "tote" sees the same budget and breaker.
+_BUDGETS: Dict[str, RetryBudget] = {}
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def get_retry_budget(dependency: str) -> RetryBudget:
+    """Return the shared retry budget for a dependency, creating it on first use."""
+    with _REGISTRY_LOCK:
+        budget = _BUDGETS.get(dependency)
+        if budget is None:
+            budget = _BUDGETS[dependency] = RetryBudget()
+        return budget
+
+def get_circuit_breaker(dependency: str) -> CircuitBreaker:
+    """Return the shared circuit breaker for a dependency, creating it on first use."""
+    with _REGISTRY_LOCK:
+        breaker = _BREAKERS.get(dependency)
+        if breaker is None:
+            breaker = _BREAKERS[dependency] = CircuitBreaker(dependency)
+        return breaker
+
+def dependency_status() -> Dict[str, Dict[str, Any]]:
+    """Breaker state and retry budget usage for every registered dependency."""
+    with _REGISTRY_LOCK:
+        names = sorted(set(_BUDGETS) | set(_BREAKERS))
+    return {
+        name: {
+            "breaker": get_circuit_breaker(name).stats(),
+            "retry_budget": get_retry_budget(name).stats(),
+        }
+        for name in names
+    }
+
 def is_quota_error(error: Exception) -> bool:
     """Check if an error is related to quota limits."""
     error_str = str(error).lower()
@@ -49,7 +248,8 @@ def exponential_backoff_with_jitter(
     max_delay: float = 60.0,
     max_retries: int = 5,
     backoff_factor: float = 2.0,
-    jitter: bool = True
+    jitter: bool = True,
+    dependency: Optional[str] = None
 ):
     """
     Decorator that implements exponential backoff with jitter for retrying functions.
@@ -60,17 +260,37 @@ def exponential_backoff_with_jitter(
         max_retries: Maximum number of retry attempts
         backoff_factor: Factor to multiply delay by after each retry
         jitter: Whether to add random jitter to avoid thundering herd
+        dependency: Optional dependency name (e.g. "bigquery"). When set, retries
+            draw from the dependency's shared retry budget and every attempt goes
+            through its circuit breaker, raising CircuitOpenError while it is open.
     """
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs) -> Any:
             last_exception = None
+            breaker = get_circuit_breaker(dependency) if dependency else None
+            budget = get_retry_budget(dependency) if dependency else None
+            if budget is not None:
+                budget.record_request()
             
             for attempt in range(max_retries + 1):
+                if breaker is not None:
+                    breaker.before_call()
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
+                    if breaker is not None:
+                        breaker.record_success()
+                    return result
                 except Exception as e:
                     last_exception = e
+                    retryable = is_quota_error(e) or is_temporary_error(e)
+                    if breaker is not None:
+                        # Only dependency-health errors count against the breaker;
+                        # bad SQL or bad input must not open it.
+                        if retryable:
+                            breaker.record_failure(e)
+                        else:
+                            breaker.record_neutral()
                     
                     # Check if we should retry this error
                     if attempt == max_retries:
@@ -89,6 +309,10 @@ def exponential_backoff_with_jitter(
                         logger.error(f"Non-retryable error in {func.__name__}: {e}")
                         break
                     
+                    if budget is not None and not budget.try_retry():
+                        logger.warning(f"Retry budget for {dependency} exhausted; not retrying {func.__name__}")
+                        break
+                    
                     if jitter:
                         # Add jitter to avoid thundering herd
                         delay = delay * (0.5 + random.random() * 0.5)
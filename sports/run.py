@@ -305,6 +305,23 @@ def main(argv=None):
             print(f"[BQ Cleanup] ERROR: {e}")
     sp_bq_clean.set_defaults(func=_cmd_bq_clean)
 
+    # --- Historical match CSVs: bulk vectorized import ---
+    # Reads football-data / Kaggle / Cricsheet CSVs with pandas and writes all matches in one merge
+    sp_matches = sub.add_parser("matches-bulk", help="Bulk import match CSVs (football_fd, football_kaggle, cricket_cricsheet) into BigQuery")
+    sp_matches.add_argument("--kind", required=True, choices=["football_fd", "football_kaggle", "cricket_cricsheet"])
+    sp_matches.add_argument("--path", required=True, help="CSV file or directory of CSVs")
+    sp_matches.add_argument("--force", action="store_true", help="Re-import files even if their checksum is unchanged")
+    def _cmd_matches_bulk(args):
+        from .bq import get_bq_sink
+        from .ingest.bulk_csv import bulk_ingest
+        sink = get_bq_sink()
+        if not sink:
+            print("[Matches] BigQuery sink not enabled/configured")
+            return
+        n = bulk_ingest(sink, args.path, args.kind, force=args.force)
+        print(f"[Matches] Ingested {n} match(es)")
+    sp_matches.set_defaults(func=_cmd_matches_bulk)
+
     # --- Daily Tote pipeline: ingest products/results/weather directly to BigQuery ---
     # Runs daily pipeline for a date directly to BigQuery: products (OPEN+CLOSED), results, weather.
     sp_pipe = sub.add_parser("tote-pipeline", help="Run daily pipeline for a date directly to BigQuery: products (OPEN+CLOSED), results, weather.")
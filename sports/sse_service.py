@@ -0,0 +1,566 @@
+"""Asyncio SSE / WebSocket fan-out for live UI updates.
+
+The Flask ``/stream`` route ties up a WSGI worker thread per open browser.
+This is a plain ASGI app (no framework; served by uvicorn) that holds each
+connection as a couple of idle coroutines instead, so one process can keep
+thousands of dashboards attached.
+
+- Events come from the in-process ``EventBus`` through a single bridge
+  thread. In a standalone process (``python -m sports.sse_service`` or
+  ``uvicorn sports.sse_service:app``) the bus is fed by the Pub/Sub
+  consumer; inside the webapp (SSE_PORT set) it is the same bus the pool
+  subscriber publishes to.
+- Each event is encoded once: the SSE frame and the WebSocket message are
+  built from the same JSON bytes and shared by every client.
+- Every event gets an increasing id. With the Redis bus it is the stream
+  entry id, valid on every instance: a browser reconnecting with
+  ``Last-Event-ID`` gets what it missed from the stream. Otherwise ids carry
+  a per-process epoch and recent events are kept in a ring. If the gap can't
+  be filled (trimmed, too long, another process) the client gets
+  ``event: resync`` and should reload.
+- The bridge subscribes only to the topics connected clients asked for, so
+  publishers can still skip topics nobody is watching.
+- Clients choose topics and key filters with the same query parameters as
+  the Flask route (``topic``/``topics``, ``events``, ``products``, ``mode``).
+  In ``latest`` mode (default) a slow client keeps only the newest pending
+  update per product/event.
+
+Routes: ``GET /stream`` (SSE), ``/ws`` (WebSocket, JSON
+``{"id", "event", "data"}`` messages), ``GET /health``, ``GET /status``.
+
+Replay ring, per-client queue, keep-alive, CORS origin and the standalone
+feed are the ``sse_*`` settings in ``sports/config.py``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import uvicorn  # type: ignore
+except Exception:  # pragma: no cover
+    uvicorn = None  # type: ignore
+
+from .config import cfg
+from .realtime import DEFAULT_KEYS, EventBus, bus as event_bus
+from .realtime_redis import RedisEventBus
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except Exception:
+            pass
+    return json.dumps(obj, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class _Event:
+    """One published event, encoded once and shared by all clients."""
+
+    __slots__ = ("id", "order", "topic", "payload", "key", "data", "sse", "_ws")
+
+    def __init__(self, eid: str, order: Tuple[int, ...], topic: str, payload: Dict[str, Any]) -> None:
+        self.id = eid
+        self.order = order
+        self.topic = topic
+        self.payload = payload
+        field = DEFAULT_KEYS.get(topic)
+        kv = payload.get(field) if field else None
+        self.key: Hashable = (topic, kv) if kv is not None else (topic, None, eid)
+        self.data = _dumps(payload)
+        self.sse = b"id: %s\nevent: %s\ndata: %s\n\n" % (eid.encode("ascii"), topic.encode("utf-8"), self.data)
+        self._ws: Optional[str] = None
+
+    @property
+    def ws(self) -> str:
+        if self._ws is None:
+            self._ws = '{"id":%s,"event":%s,"data":%s}' % (json.dumps(self.id), json.dumps(self.topic), self.data.decode("utf-8"))
+        return self._ws
+
+
+def _stream_order(eid: str) -> Optional[Tuple[int, int]]:
+    """Sort key of a Redis stream id ("<ms>-<seq>"), None if ``eid`` is not one."""
+    ms, _, seq = eid.partition("-")
+    if not (ms.isdigit() and seq.isdigit()):
+        return None
+    return int(ms), int(seq)
+
+
+class _Client:
+    def __init__(self, topics: Set[str], keys: Dict[str, Set[str]], mode: str, maxsize: int) -> None:
+        self.topics = topics
+        self.keys: Tuple[Tuple[str, frozenset], ...] = tuple((f, frozenset(v)) for f, v in keys.items())
+        self.mode = mode
+        self.maxsize = maxsize
+        self.pending: "OrderedDict[Hashable, _Event]" = OrderedDict()
+        self.wake = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def matches(self, ev: _Event) -> bool:
+        for field, allowed in self.keys:
+            v = ev.payload.get(field)
+            if v is None or str(v) not in allowed:
+                return False
+        return True
+
+    def push(self, ev: _Event) -> None:
+        key = ev.key if self.mode == "latest" else ev.id
+        if key in self.pending:
+            # Replace and move to the back so ids stay increasing on the wire
+            del self.pending[key]
+            self.coalesced += 1
+        elif len(self.pending) >= self.maxsize:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        self.pending[key] = ev
+        self.wake.set()
+
+    def take(self) -> List[_Event]:
+        out = list(self.pending.values())
+        self.pending.clear()
+        self.wake.clear()
+        return out
+
+
+class Broadcaster:
+    """Bridges the bus into the server's event loop.
+
+    With a ``RedisEventBus`` the bridge reads the shared stream itself and the
+    stream entry id is the event id, so a browser can resume on any instance
+    (``history()`` fills the gap). Otherwise ids are ``<epoch>.<seq>`` with a
+    per-process epoch; a Last-Event-ID from another process gets a resync.
+    Either way the bridge only asks the bus for the topics connected clients
+    want, updated on attach/detach.
+    """
+
+    def __init__(self, bus: EventBus, *, replay: Optional[int] = None, client_queue: Optional[int] = None) -> None:
+        self.bus = bus
+        self.replay = max(0, replay if replay is not None else cfg.sse_replay_events)
+        self.client_queue = max(16, client_queue if client_queue is not None else cfg.sse_client_queue)
+        self.ring: Deque[_Event] = deque(maxlen=self.replay or 1)
+        self.clients: Dict[str, Set[_Client]] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.shared = RedisEventBus is not None and isinstance(bus, RedisEventBus)
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._last_id: Optional[str] = None
+        # Topics the bridge forwards; replaced (never mutated) so the bridge thread can read it
+        self._wanted: frozenset = frozenset()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sub = None
+        self.counters = {"events": 0, "deliveries": 0, "connections": 0, "resumed": 0, "resyncs": 0}
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._thread is not None:
+            return
+        self.loop = loop
+        if self.shared:
+            target = self._bridge_stream
+        else:
+            self._sub = self.bus.subscribe([], maxsize=50000)
+            target = self._bridge
+        self._update_topics()
+        self._thread = threading.Thread(target=target, name="sse-bridge", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sub is not None:
+            self.bus.unsubscribe(self._sub)
+        if self.shared:
+            self.bus.set_interest(f"sse-{self.epoch}", ())
+
+    def _update_topics(self) -> None:
+        wanted = frozenset(self.clients)
+        if wanted == self._wanted:
+            return
+        self._wanted = wanted
+        if self.shared:
+            self.bus.set_interest(f"sse-{self.epoch}", wanted)
+        elif self._sub is not None:
+            self.bus.set_topics(self._sub, wanted)
+
+    def _bridge(self) -> None:
+        sub = self._sub
+        while sub is not None and sub.alive:
+            item = sub.get(timeout=1.0)
+            if item is None:
+                continue
+            batch = [item]
+            while len(batch) < 1000:
+                nxt = sub.get(timeout=0)
+                if nxt is None:
+                    break
+                batch.append(nxt)
+            events = []
+            for topic, payload in batch:
+                try:
+                    self._seq += 1
+                    events.append(_Event(f"{self.epoch}.{self._seq}", (self._seq,), topic, payload))
+                except Exception as e:
+                    print(f"[SSE] could not encode {topic}: {e}")
+            if not self._send(events):
+                break
+
+    def _bridge_stream(self) -> None:
+        last = self.bus.tail_id()
+        backoff = 0.5
+        while not self._stop.is_set():
+            try:
+                entries = self.bus.read(last, count=1000)
+                backoff = 0.5
+            except Exception as e:
+                print(f"[SSE] stream read failed (retrying in {backoff:.1f}s): {e}")
+                self._stop.wait(backoff)
+                backoff = min(30.0, backoff * 2)
+                continue
+            if not entries:
+                continue
+            last = entries[-1][0]
+            wanted = self._wanted
+            events = []
+            for eid, topic, payload in entries:
+                if topic not in wanted and "*" not in wanted:
+                    continue
+                try:
+                    events.append(_Event(eid, _stream_order(eid) or (0, 0), topic, payload))
+                except Exception as e:
+                    print(f"[SSE] could not encode {topic}: {e}")
+            if not self._send(events):
+                break
+
+    def _send(self, events: List[_Event]) -> bool:
+        if events and self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self._dispatch, events)
+            except RuntimeError:
+                return False
+        return True
+
+    def _dispatch(self, events: List[_Event]) -> None:
+        for ev in events:
+            self.counters["events"] += 1
+            self._last_id = ev.id
+            if self.replay:
+                self.ring.append(ev)
+            for group in (self.clients.get(ev.topic), self.clients.get("*")):
+                if not group:
+                    continue
+                for c in group:
+                    if c.keys and not c.matches(ev):
+                        continue
+                    c.push(ev)
+                    self.counters["deliveries"] += 1
+
+    @staticmethod
+    def _wants(c: _Client, ev: _Event) -> bool:
+        return (ev.topic in c.topics or "*" in c.topics) and (not c.keys or c.matches(ev))
+
+    def _resume_ring(self, c: _Client, last_event_id: str) -> bool:
+        epoch, _, seq = last_event_id.partition(".")
+        if epoch != self.epoch or not seq.isdigit():
+            # Issued by another instance or an earlier process
+            return False
+        last = int(seq)
+        if not self.ring or last < self.ring[0].order[0] - 1 or last > self.ring[-1].order[0]:
+            return False
+        for ev in self.ring:
+            if ev.order[0] > last and self._wants(c, ev):
+                c.push(ev)
+        return True
+
+    def _stream_history(self, last_event_id: str, topics: Optional[Set[str]]) -> Tuple[Optional[str], List[Tuple[str, str, Dict[str, Any]]]]:
+        return self.bus.first_id(), self.bus.history(last_event_id, topics=topics, count=self.client_queue + 1)
+
+    async def _resume_stream(self, c: _Client, last_event_id: str) -> bool:
+        last = _stream_order(last_event_id)
+        if last is None:
+            return False
+        topics = None if "*" in c.topics else set(c.topics)
+        try:
+            first, entries = await asyncio.get_running_loop().run_in_executor(None, self._stream_history, last_event_id, topics)
+        except Exception as e:
+            print(f"[SSE] history read failed: {e}")
+            return False
+        first_order = _stream_order(first) if first else None
+        if (first_order is not None and first_order > last) or len(entries) > self.client_queue:
+            # Trimmed past the client's position, or more than it could be sent
+            return False
+        newest = last
+        for eid, topic, payload in entries:
+            ev = _Event(eid, _stream_order(eid) or (0, 0), topic, payload)
+            newest = max(newest, ev.order)
+            if not c.keys or c.matches(ev):
+                c.push(ev)
+        # Events the bridge dispatched while history was being read
+        for ev in self.ring:
+            if ev.order > newest and self._wants(c, ev):
+                c.push(ev)
+        return True
+
+    async def attach(self, c: _Client, last_event_id: Optional[str]) -> bool:
+        """Register a client; replay missed events. False means the gap can't be filled (resync)."""
+        ok = True
+        if last_event_id:
+            ok = await self._resume_stream(c, last_event_id) if self.shared else self._resume_ring(c, last_event_id)
+            self.counters["resumed" if ok else "resyncs"] += 1
+        for t in c.topics:
+            self.clients.setdefault(t, set()).add(c)
+        self.counters["connections"] += 1
+        self._update_topics()
+        return ok
+
+    def detach(self, c: _Client) -> None:
+        c.closed = True
+        for t in c.topics:
+            group = self.clients.get(t)
+            if group is not None:
+                group.discard(c)
+                if not group:
+                    self.clients.pop(t, None)
+        self._update_topics()
+
+    def stats(self) -> Dict[str, Any]:
+        clients: Dict[int, _Client] = {}
+        for group in self.clients.values():
+            for c in group:
+                clients[id(c)] = c
+        return {
+            **self.counters,
+            "clients": len(clients),
+            "by_topic": {t: len(g) for t, g in self.clients.items()},
+            "pending": sum(len(c.pending) for c in clients.values()),
+            "dropped": sum(c.dropped for c in clients.values()),
+            "coalesced": sum(c.coalesced for c in clients.values()),
+            "ring": len(self.ring) if self.replay else 0,
+            "ids": "stream" if self.shared else f"epoch {self.epoch}",
+            "last_id": self._last_id,
+            "bus_backlog": self._sub.pending() if self._sub is not None else None,
+        }
+
+
+def parse_stream_params(qs: Dict[str, List[str]]) -> Tuple[List[str], Dict[str, Set[str]], str]:
+    """Topics, key filters and mode from /stream query parameters (shared with the Flask route)."""
+
+    def _csv(names) -> List[str]:
+        out: List[str] = []
+        for name in names:
+            for v in qs.get(name, []):
+                out.extend(x.strip() for x in v.split(",") if x.strip())
+        return out
+
+    topics = qs.get("topic") or _csv(["topics"])
+    keys: Dict[str, Set[str]] = {}
+    for field, names in (("event_id", ("events", "event_id")), ("product_id", ("products", "product_id"))):
+        vals = _csv(names)
+        if vals:
+            keys[field] = set(vals)
+    mode = ((qs.get("mode") or ["latest"])[0] or "latest").strip().lower()
+    return [t for t in topics if t], keys, mode
+
+
+class SSEApp:
+    def __init__(self, bus: EventBus, *, feed: str = "bus") -> None:
+        self.broadcaster = Broadcaster(bus)
+        self.feed = feed
+        self.keepalive_s = max(1, cfg.sse_keepalive_s)
+        self.cors_origin = cfg.sse_cors_origin
+
+    def _ensure_started(self) -> None:
+        if self.broadcaster.loop is None:
+            self.broadcaster.start(asyncio.get_running_loop())
+            if self.feed == "pubsub":
+                try:
+                    from .pubsub_consumer import start_pubsub_consumer
+
+                    start_pubsub_consumer()
+                except Exception as e:
+                    print(f"[SSE] Pub/Sub feed not started: {e}")
+
+    async def __call__(self, scope, receive, send) -> None:
+        kind = scope["type"]
+        if kind == "lifespan":
+            while True:
+                msg = await receive()
+                if msg["type"] == "lifespan.startup":
+                    self._ensure_started()
+                    await send({"type": "lifespan.startup.complete"})
+                elif msg["type"] == "lifespan.shutdown":
+                    self.broadcaster.stop()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        self._ensure_started()
+        path = scope.get("path", "")
+        qs = parse_qs((scope.get("query_string") or b"").decode("latin-1"))
+        if kind == "websocket":
+            if path in ("/ws", "/stream"):
+                await self._websocket(scope, receive, send, qs)
+            else:
+                await send({"type": "websocket.close", "code": 4404})
+            return
+        if kind != "http":
+            return
+        if path == "/stream":
+            await self._sse(scope, receive, send, qs)
+        elif path == "/health":
+            await self._json(send, {"status": "ok", "timestamp": time.time()})
+        elif path == "/status":
+            await self._json(send, self.broadcaster.stats())
+        else:
+            await self._plain(send, 404, "Not found.")
+
+    # -- helpers -----------------------------------------------------------
+    async def _plain(self, send, status: int, text: str) -> None:
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": text.encode("utf-8")})
+
+    async def _json(self, send, obj: Any) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": _dumps(obj)})
+
+    def _client(self, qs: Dict[str, List[str]]) -> Tuple[Optional[_Client], str]:
+        topics, keys, mode = parse_stream_params(qs)
+        if not topics:
+            return None, "No topics specified."
+        if mode not in ("latest", "queue"):
+            return None, "mode must be 'latest' or 'queue'."
+        return _Client(set(topics), keys, mode, self.broadcaster.client_queue), ""
+
+    @staticmethod
+    def _last_event_id(scope, qs: Dict[str, List[str]]) -> Optional[str]:
+        for k, v in scope.get("headers") or []:
+            if k == b"last-event-id":
+                return v.decode("latin-1").strip() or None
+        vals = qs.get("last_event_id") or qs.get("lastEventId")
+        return vals[0] if vals else None
+
+    async def _watch_disconnect(self, receive, c: _Client, closing: str) -> None:
+        while True:
+            msg = await receive()
+            if msg["type"] in (closing, "websocket.disconnect"):
+                c.closed = True
+                c.wake.set()
+                return
+
+    async def _stream(self, c: _Client, emit, keepalive) -> None:
+        while not c.closed:
+            try:
+                await asyncio.wait_for(c.wake.wait(), timeout=self.keepalive_s)
+            except asyncio.TimeoutError:
+                await keepalive()
+                continue
+            if c.closed:
+                break
+            events = c.take()
+            if events:
+                await emit(events)
+                c.sent += len(events)
+
+    # -- transports ----------------------------------------------------------
+    async def _sse(self, scope, receive, send, qs) -> None:
+        c, err = self._client(qs)
+        if c is None:
+            await self._plain(send, 400, err)
+            return
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", self.cors_origin.encode("latin-1")),
+            ],
+        })
+        ok = await self.broadcaster.attach(c, self._last_event_id(scope, qs))
+        watcher = asyncio.ensure_future(self._watch_disconnect(receive, c, "http.disconnect"))
+
+        async def emit(events: List[_Event]) -> None:
+            await send({"type": "http.response.body", "body": b"".join(ev.sse for ev in events), "more_body": True})
+
+        async def keepalive() -> None:
+            await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+
+        try:
+            # Tell the client to retry after 3s and, if its gap can't be filled, to reload
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n" + (b"" if ok else b"event: resync\ndata: {}\n\n"), "more_body": True})
+            await self._stream(c, emit, keepalive)
+        except Exception:
+            pass
+        finally:
+            self.broadcaster.detach(c)
+            watcher.cancel()
+
+    async def _websocket(self, scope, receive, send, qs) -> None:
+        msg = await receive()
+        if msg["type"] != "websocket.connect":
+            return
+        c, err = self._client(qs)
+        if c is None:
+            await send({"type": "websocket.close", "code": 4400, "reason": err})
+            return
+        await send({"type": "websocket.accept"})
+        ok = await self.broadcaster.attach(c, self._last_event_id(scope, qs))
+        watcher = asyncio.ensure_future(self._watch_disconnect(receive, c, "websocket.disconnect"))
+
+        async def emit(events: List[_Event]) -> None:
+            for ev in events:
+                await send({"type": "websocket.send", "text": ev.ws})
+
+        async def keepalive() -> None:
+            await send({"type": "websocket.send", "text": '{"event":"keep-alive"}'})
+
+        try:
+            if not ok:
+                await send({"type": "websocket.send", "text": '{"event":"resync","data":{}}'})
+            await self._stream(c, emit, keepalive)
+        except Exception:
+            pass
+        finally:
+            self.broadcaster.detach(c)
+            watcher.cancel()
+
+
+# Served standalone (``uvicorn sports.sse_service:app``, fed by Pub/Sub) or alongside the
+# webapp via ``start_in_thread`` (fed by the webapp's bus)
+app = SSEApp(event_bus, feed=cfg.sse_feed)
+
+
+def start_in_thread(host: str = "0.0.0.0", port: int = 8090) -> Optional[threading.Thread]:
+    """Run ``app`` under uvicorn on a daemon thread sharing this process's event bus."""
+    if uvicorn is None:
+        print("[SSE] uvicorn not installed; fan-out service not started")
+        return None
+    # The webapp's subscribers already publish to this bus; no Pub/Sub consumer here
+    app.feed = "bus"
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="on"))
+    # Not the main thread: uvicorn must not install signal handlers
+    server.install_signal_handlers = lambda: None  # type: ignore[assignment]
+    t = threading.Thread(target=server.run, name="sse-service", daemon=True)
+    t.start()
+    print(f"[SSE] fan-out service listening on {host}:{port}")
+    return t
+
+
+if __name__ == "__main__":
+    if uvicorn is None:
+        raise SystemExit("uvicorn is required: pip install uvicorn")
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8080")), log_level="info")
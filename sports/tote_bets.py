@@ -151,7 +151,7 @@ def place_audit_superfecta(
             query = """
             query ProductLegs($id: String){ product(id: $id){ ... on BettingProduct { legs{ nodes{ id selections{ nodes{ id competitor{ details{ ... on HorseDetails { clothNumber } ... on GreyhoundDetails { trapNumber } } } } } } } } } }
             """
-            data = client.graphql(query, {"id": product_id})
+            data = client.product(product_id, query)
             legs = (((data.get("product") or {}).get("legs") or {}).get("nodes")) or []
             if legs:
                 product_leg_id = product_leg_id or legs[0].get("id")
@@ -22,6 +22,7 @@ from sports.providers.tote_bets import place_audit_superfecta
 from sports.providers.tote_bets import refresh_bet_status, audit_list_bets, sync_bets_from_api
 from sports.providers.tote_api import normalize_probable_lines
 from sports.gcp import publish_pubsub_message
+from sports.retry_utils import CircuitOpenError
 from sports.providers.pl_calcs import calculate_pl_strategy, calculate_pl_from_perms
 from sports.superfecta_planner import (
     SUPERFECTA_RISK_PRESETS,
@@ -203,12 +204,9 @@ def _sqldf_cache_get(key: tuple) -> Optional[pd.DataFrame]:
         ent = _SQLDF_CACHE.get(key)
         if ent:
             exp, df = ent
-            if exp < now:
-                try:
-                    del _SQLDF_CACHE[key]
-                except Exception:
-                    pass
-            else:
+            # Expired entries are kept (and evicted on insert) so they can be
+            # served stale while BigQuery's circuit breaker is open.
+            if exp >= now:
                 try:
                     return df.copy(deep=True)
                 except Exception:
@@ -240,6 +238,18 @@ def _sqldf_cache_get(key: tuple) -> Optional[pd.DataFrame]:
     return df
 
 
+def _sqldf_cache_get_stale(key: tuple) -> Optional[pd.DataFrame]:
+    """Return a locally cached result even if its TTL has expired."""
+    with _SQLDF_CACHE_LOCK:
+        ent = _SQLDF_CACHE.get(key)
+    if not ent:
+        return None
+    try:
+        return ent[1].copy(deep=True)
+    except Exception:
+        return ent[1]
+
+
 def _sqldf_cache_set(key: tuple, df: pd.DataFrame, ttl: int) -> None:
     if not cfg.web_sqldf_cache_enabled or ttl <= 0:
         return
@@ -284,7 +294,7 @@ def _sql_is_readonly(sql: str) -> bool:
         return False
 
 from sports.realtime import bus as event_bus
-from sports.pubsub_consumer import start_pubsub_consumer, stop_pubsub_consumer, is_consumer_running
+from sports.pubsub_consumer import start_pubsub_consumer, stop_pubsub_consumer, is_consumer_running, consumer_stats
 
 
 def _clean_float(value: Any, default: float = 0.0) -> float:
@@ -405,6 +415,19 @@ def _maybe_start_pool_thread():
         t.start()
         _pool_thread_started = True
 
+_sse_thread_started = False
+
+def _maybe_start_sse_service():
+    """Serve the asyncio SSE fan-out (sports.sse_service) on SSE_PORT, fed by this process's bus."""
+    global _sse_thread_started
+    port = (os.getenv("SSE_PORT") or "").strip()
+    if _sse_thread_started or not port:
+        return
+    from .sse_service import start_in_thread
+
+    if start_in_thread(os.getenv("SSE_HOST", "0.0.0.0"), int(port)) is not None:
+        _sse_thread_started = True
+
 def _maybe_start_bq_exporter():
     # Placeholder for legacy background exporter. No-op in BQ-only mode.
     return
@@ -413,17 +436,25 @@ def _maybe_start_bq_exporter():
 def stream():
     """Server-Sent Events (SSE) endpoint."""
     # Get topics from client, e.g. /stream?topic=pool_total_changed&topic=product_status_changed
-    # Accept either repeated topic params (?topic=...) or a comma-separated 'topics' param
-    topics = request.args.getlist('topic')
-    if not topics:
-        topics_csv = (request.args.get('topics') or '').strip()
-        if topics_csv:
-            topics = [t for t in topics_csv.split(',') if t]
+    # Accept either repeated topic params (?topic=...) or a comma-separated 'topics' param,
+    # optional key filters (?events=E1,E2 / ?products=P1) and mode=latest|queue
+    from .sse_service import parse_stream_params
+
+    # Hand browsers to the asyncio fan-out service when one is published (keeps WSGI workers free)
+    sse_url = (os.getenv("SSE_PUBLIC_URL") or "").strip()
+    if sse_url:
+        qs = request.query_string.decode("latin-1")
+        return redirect(sse_url + ("?" + qs if qs else ""), code=307)
+
+    topics, keys, mode = parse_stream_params(request.args.to_dict(flat=False))
     if not topics:
         return Response("No topics specified.", status=400, mimetype='text/plain')
+    # 'latest' (default) keeps only the newest pending update per product/event for slow clients
+    if mode not in ('latest', 'queue'):
+        return Response("mode must be 'latest' or 'queue'.", status=400, mimetype='text/plain')
 
     def event_generator():
-        sub = event_bus.subscribe(topics)
+        sub = event_bus.subscribe(topics, maxsize=2048, keys=keys, mode=mode)
         try:
             while True:
                 item = sub.get(timeout=25)
@@ -467,7 +498,8 @@ def pubsub_status():
     """Get Pub/Sub consumer status"""
     return jsonify({
         "consumer_running": is_consumer_running(),
-        "timestamp": time.time()
+        "timestamp": time.time(),
+        "consumer": consumer_stats(),
     }), 200
 
 @app.route('/api/status/websocket')
@@ -924,7 +956,14 @@ def sql_df(*args, **kwargs) -> pd.DataFrame:
         query_parameters=qp,
         use_query_cache=True)
     db = get_db()
-    it = db.query(q, job_config=job_config)
+    try:
+        it = db.query(q, job_config=job_config)
+    except CircuitOpenError:
+        # BigQuery is failing; serve the last known result rather than queueing more load
+        stale = _sqldf_cache_get_stale(ck)
+        if stale is not None:
+            return stale
+        raise
     bqs_client = _get_bqstorage_client() if cfg.bq_use_storage_api else None
     try:
         if bqs_client is not None:
@@ -1470,6 +1509,10 @@ def create_app():
         _maybe_start_pool_thread()
     except Exception:
         pass
+    try:
+        _maybe_start_sse_service()
+    except Exception as e:
+        print(f"[SSE] fan-out service not started: {e}")
     try:
         _maybe_start_bq_exporter()
     except Exception:
@@ -2932,6 +2975,59 @@ def api_status_quota_usage():
         return app.response_class(json.dumps({"error": str(e)}), mimetype="application/json", status=500)
 
 
+@app.get("/api/status/tote_limiter")
+def api_status_tote_limiter():
+    """Return the adaptive Tote rate/concurrency limits and throttle counters."""
+    try:
+        from .providers.tote_api import limiter_stats
+
+        return app.response_class(json.dumps(limiter_stats()), mimetype="application/json")
+    except Exception as e:
+        return app.response_class(json.dumps({"error": str(e)}), mimetype="application/json", status=500)
+
+
+@app.get("/api/status/subscriber_sink")
+def api_status_subscriber_sink():
+    """Return per-table queue depth, flush latency and dropped rows of the pool subscriber's sink pipelines."""
+    try:
+        from .providers.sink_pipeline import sink_pipeline_stats
+
+        return app.response_class(json.dumps(sink_pipeline_stats()), mimetype="application/json")
+    except Exception as e:
+        return app.response_class(json.dumps({"error": str(e)}), mimetype="application/json", status=500)
+
+
+@app.get("/api/status/event_bus")
+def api_status_event_bus():
+    """Return SSE subscribers per topic with their pending, dropped and coalesced message counts."""
+    try:
+        return app.response_class(json.dumps(event_bus.stats()), mimetype="application/json")
+    except Exception as e:
+        return app.response_class(json.dumps({"error": str(e)}), mimetype="application/json", status=500)
+
+
+@app.get("/api/status/ingest_dedup")
+def api_status_ingest_dedup():
+    """Return rows written vs skipped as unchanged by the ingest row fingerprint cache."""
+    try:
+        from .ingest.row_fingerprints import row_cache_stats
+
+        return app.response_class(json.dumps(row_cache_stats()), mimetype="application/json")
+    except Exception as e:
+        return app.response_class(json.dumps({"error": str(e)}), mimetype="application/json", status=500)
+
+
+@app.get("/api/status/dependencies")
+def api_status_dependencies():
+    """Return circuit breaker state and retry budget usage per dependency."""
+    try:
+        from .retry_utils import dependency_status
+
+        return app.response_class(json.dumps(dependency_status()), mimetype="application/json")
+    except Exception as e:
+        return app.response_class(json.dumps({"error": str(e)}), mimetype="application/json", status=500)
+
+
 @app.get("/api/status/qc")
 def api_status_qc():
     """Return QC gaps and counts from QC views."""
@@ -3495,18 +3591,15 @@ def api_refresh_event_pools(event_id: str):
         if not product_ids:
             return app.response_class(json.dumps({"triggered": 0, "product_ids": []}), mimetype="application/json")
 
-        # Publish one job per product
-        message_ids = []
-        for pid in product_ids:
-            try:
-                # This uses the same task as the manual trigger page
-                mid = publish_pubsub_message(project_id, topic_id, {"task": "ingest_single_product", "product_id": pid})
-                message_ids.append(mid)
-            except Exception as e:
-                # Log and continue
-                print(f"Failed to publish job for product {pid}: {e}")
+        # One job for all products; the ingest service fetches them as aliased batch requests
+        triggered = 0
+        try:
+            publish_pubsub_message(project_id, topic_id, {"task": "ingest_multiple_products", "product_ids": product_ids})
+            triggered = len(product_ids)
+        except Exception as e:
+            print(f"Failed to publish batch job for event {event_id}: {e}")
         
-        return app.response_class(json.dumps({"triggered": len(message_ids), "product_ids": product_ids}), mimetype="application/json")
+        return app.response_class(json.dumps({"triggered": triggered, "product_ids": product_ids}), mimetype="application/json")
 
     except Exception as e:
         traceback.print_exc()
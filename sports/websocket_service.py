@@ -15,45 +15,38 @@ from google.cloud import pubsub_v1
 
 from .config import cfg
 from .providers.tote_subscriptions import run_subscriber
+from .providers.sink_pipeline import sink_pipeline_stats
 from .bq import get_bq_sink
-from .gcp import publish_pubsub_message
+from .gcp import get_publisher, publish_pubsub_message_async, publisher_stats
 
 app = Flask(__name__)
 
 # Global state
 subscription_task: Optional[asyncio.Task] = None
 subscription_running = False
-pubsub_client: Optional[pubsub_v1.PublisherClient] = None
 
 def get_pubsub_client() -> pubsub_v1.PublisherClient:
-    """Get or create Pub/Sub client"""
-    global pubsub_client
-    if pubsub_client is None:
-        pubsub_client = pubsub_v1.PublisherClient()
-    return pubsub_client
+    """Shared, batching Pub/Sub publisher (see sports.gcp.get_publisher)"""
+    return get_publisher()
 
 def publish_event(event_type: str, data: Dict[str, Any]) -> None:
-    """Publish event to appropriate Pub/Sub topic"""
+    """Publish event to appropriate Pub/Sub topic (non-blocking; batched by the shared publisher)"""
     try:
-        client = get_pubsub_client()
-        topic_id = f"tote-{event_type.replace('_', '-')}"
-        topic_path = client.topic_path(cfg.gcp_project, topic_id)
-        
         message_data = {
             "event_type": event_type,
             "data": data,
             "timestamp": time.time(),
             "source": "websocket-service"
         }
-        
-        client.publish(
-            topic_path,
-            json.dumps(message_data).encode('utf-8'),
-            event_type=event_type
+        # Keep each product's (else event's) updates in order
+        key = data.get("product_id") or data.get("event_id")
+        publish_pubsub_message_async(
+            cfg.gcp_project,
+            f"tote-{event_type.replace('_', '-')}",
+            message_data,
+            ordering_key=str(key) if key else None,
+            event_type=event_type,
         )
-        
-        print(f"Published {event_type} to {topic_id}")
-        
     except Exception as e:
         print(f"Failed to publish {event_type}: {e}")
 
@@ -168,7 +161,9 @@ def status():
     return jsonify({
         "subscription_running": subscription_running,
         "timestamp": time.time(),
-        "gcp_project": cfg.gcp_project
+        "gcp_project": cfg.gcp_project,
+        "sink": sink_pipeline_stats(),
+        "publisher": publisher_stats(),
     }), 200
 
 @app.route('/test-pubsub', methods=['POST'])
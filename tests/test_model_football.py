@@ -0,0 +1,26 @@
+import numpy as np
+
+from sports.model_football import match_probs_batch, match_probs_from_rates, score_matrices
+
+
+def test_empty_batch_returns_empty_arrays():
+    assert score_matrices([], [], max_goals=4).shape == (0, 5, 5)
+    out = match_probs_batch([], [], max_goals=4, return_matrix=True)
+    for key in ("home", "draw", "away", "over_2.5", "under_2.5"):
+        assert out[key].shape == (0,)
+    assert out["matrix"].shape == (0, 5, 5)
+
+
+def test_lines_beyond_the_grid_are_certain_unders():
+    out = match_probs_batch([1.4, 2.0], [1.1, 0.7], max_goals=3, lines=(5.5, 6.0, 6.5, 20.5))
+    for line in (6.0, 6.5, 20.5):
+        assert np.allclose(out[f"under_{line}"], 1.0)
+        assert np.allclose(out[f"over_{line}"], 0.0)
+    assert np.all(out["under_5.5"] < 1.0)
+
+
+def test_batch_matches_single_fixture_pricing():
+    h, d, a = match_probs_from_rates(1.5, 1.2)
+    out = match_probs_batch([1.5], [1.2])
+    assert np.isclose(out["home"][0], h) and np.isclose(out["draw"][0], d) and np.isclose(out["away"][0], a)
+    assert np.isclose(h + d + a, 1.0)
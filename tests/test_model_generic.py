@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from sports.model_generic import EloEngine, fit_elo
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=["date", "home", "away", "result"])
+
+
+DAY1 = [("2024-01-01", "A", "B", "H"), ("2024-01-01", "C", "D", "D")]
+DAY2 = [("2024-01-02", "A", "C", "A"), ("2024-01-02", "B", "D", "H")]
+
+
+def test_apply_matches_fit_elo():
+    eng = EloEngine()
+    eng.apply(_frame(DAY1 + DAY2))
+    expected = fit_elo([{"home": h, "away": a, "result": r} for _, h, a, r in DAY1 + DAY2])
+    assert eng.ratings_dict() == pytest.approx(expected)
+
+
+def test_reapplying_a_frame_is_a_noop():
+    eng = EloEngine()
+    assert eng.apply(_frame(DAY1)) == 2
+    before = eng.ratings_dict()
+    assert eng.apply(_frame(DAY1)) == 0
+    assert eng.last_skipped["duplicate"] == 2
+    assert eng.ratings_dict() == before
+    assert len(eng._h) == 2
+
+
+def test_overlapping_frame_applies_only_new_matches():
+    eng = EloEngine()
+    eng.apply(_frame(DAY1))
+    assert eng.apply(_frame(DAY1 + DAY2)) == 2
+    other = EloEngine()
+    other.apply(_frame(DAY1 + DAY2))
+    assert eng.ratings_dict() == pytest.approx(other.ratings_dict())
+
+
+def test_out_of_order_matches_are_rejected_and_snapshots_stay_valid():
+    eng = EloEngine(snapshot_every=1)
+    eng.apply(_frame(DAY2))
+    assert eng.apply(_frame(DAY1)) == 0
+    assert eng.last_skipped["out_of_order"] == 2
+    # History is still DAY2 only, so nothing is dated on or before Jan 1
+    assert eng.ratings_as_of("2024-01-01") == {}
+    assert eng.ratings_as_of("2024-01-02") == pytest.approx(eng.ratings_dict())
+
+
+def test_same_day_matches_in_a_later_call_are_applied():
+    eng = EloEngine()
+    eng.apply(_frame(DAY1[:1]))
+    assert eng.apply(_frame(DAY1[1:])) == 1
+
+
+def test_ratings_as_of_replays_from_snapshots():
+    eng = EloEngine(snapshot_every=1)
+    eng.apply(_frame(DAY1))
+    eng.apply(_frame(DAY2))
+    day1 = EloEngine()
+    day1.apply(_frame(DAY1))
+    assert eng.ratings_as_of("2024-01-01") == pytest.approx(day1.ratings_dict())
+
+
+def test_save_load_keeps_applied_keys(tmp_path):
+    eng = EloEngine()
+    eng.apply(_frame(DAY1))
+    path = str(tmp_path / "elo.npz")
+    eng.save(path)
+    loaded = EloEngine.load(path)
+    assert loaded.apply(_frame(DAY1)) == 0
+    assert loaded.apply(_frame(DAY2)) == 2
@@ -0,0 +1,140 @@
+import time
+
+import fakeredis
+import pytest
+
+from sports.realtime_redis import RedisEventBus, decode_payload, encode_payload
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def make_bus(server):
+    buses = []
+
+    def _make(**kw):
+        kw.setdefault("block_ms", 50)
+        bus = RedisEventBus(client=fakeredis.FakeRedis(server=server), stream="test:events", **kw)
+        buses.append(bus)
+        return bus
+
+    yield _make
+    for bus in buses:
+        bus.stop()
+
+
+def _share_interest(*buses):
+    """Force an immediate interest exchange instead of waiting for the 2s refresh."""
+    for _ in range(2):
+        for bus in buses:
+            bus._next_interest = 0.0
+            bus._advertise()
+
+
+def _drain(sub, timeout=2.0):
+    out = []
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        item = sub.get(timeout=0.05)
+        if item is not None:
+            out.append(item)
+        elif out:
+            break
+    return out
+
+
+def test_codec_roundtrip():
+    payload = {"product_id": "P1", "total": 12.5, "n": [1, 2]}
+    assert decode_payload(encode_payload(payload)) == payload
+
+
+def test_publish_reaches_other_instance(make_bus):
+    a, b = make_bus(), make_bus()
+    sub = b.subscribe(["pool_total_changed"])
+    _share_interest(a, b)
+    assert a.has_subscribers("pool_total_changed")
+    assert not a.has_subscribers("event_status_changed")
+
+    a.publish("pool_total_changed", {"product_id": "P1", "total": 10})
+
+    assert _drain(sub) == [("pool_total_changed", {"product_id": "P1", "total": 10})]
+    assert b.counters["received"] == 1
+
+
+def test_no_self_echo(make_bus):
+    a, b = make_bus(), make_bus()
+    local = a.subscribe(["pool_total_changed"])
+    remote = b.subscribe(["pool_total_changed"])
+    _share_interest(a, b)
+
+    a.publish("pool_total_changed", {"product_id": "P1"})
+
+    assert len(_drain(remote)) == 1
+    deadline = time.time() + 2.0
+    while a.counters["skipped_own"] < 1 and time.time() < deadline:
+        time.sleep(0.02)
+    assert a.counters["skipped_own"] == 1
+    # The local subscriber saw the publish once, not again via the stream
+    assert _drain(local, timeout=0.3) == [("pool_total_changed", {"product_id": "P1"})]
+
+
+def test_key_filter_and_latest_mode(make_bus):
+    a = make_bus()
+    b = make_bus(start=False)
+    sub = b.subscribe(["pool_total_changed"], keys={"product_id": {"P1"}}, mode="latest")
+    _share_interest(a, b)
+    b.last_id = b._start_id()
+
+    a.publish_many([
+        ("pool_total_changed", {"product_id": "P1", "total": 1}),
+        ("pool_total_changed", {"product_id": "P2", "total": 5}),
+        ("pool_total_changed", {"product_id": "P1", "total": 2}),
+        ("pool_total_changed", {"product_id": "P1", "total": 3}),
+    ])
+    b.start()
+
+    assert _drain(sub) == [("pool_total_changed", {"product_id": "P1", "total": 3})]
+    assert sub.filtered == 1
+    assert sub.coalesced == 2
+
+
+def test_stream_trimmed_by_count(make_bus, server):
+    a = make_bus(maxlen=100, start=False)
+    a.subscribe(["pool_total_changed"])
+    for i in range(500):
+        a.publish("pool_total_changed", {"i": i})
+    n = fakeredis.FakeRedis(server=server).xlen("test:events")
+    assert 100 <= n < 500
+
+
+def test_stream_trimmed_by_age(make_bus, server):
+    a = make_bus(retention_s=60, start=False)
+    r = fakeredis.FakeRedis(server=server)
+    r.xadd("test:events", {b"o": b"x", b"t": b"pool_total_changed", b"p": encode_payload({"old": True})}, id="1-0")
+    a.subscribe(["pool_total_changed"])
+    a.publish("pool_total_changed", {"old": False})
+
+    a._trim_age()
+
+    assert [p for _, _, p in a.history()] == [{"old": False}]
+
+
+def test_history_after_id_and_topics(make_bus):
+    a = make_bus(start=False)
+    a.subscribe(["*"])
+    a.publish("pool_total_changed", {"n": 1})
+    a.publish("event_status_changed", {"n": 2})
+    a.publish("pool_total_changed", {"n": 3})
+
+    entries = a.history()
+    assert [(t, p["n"]) for _, t, p in entries] == [
+        ("pool_total_changed", 1),
+        ("event_status_changed", 2),
+        ("pool_total_changed", 3),
+    ]
+    first_id = entries[0][0]
+    assert [p["n"] for _, _, p in a.history(first_id)] == [2, 3]
+    assert [p["n"] for _, _, p in a.history(topics=["pool_total_changed"])] == [1, 3]
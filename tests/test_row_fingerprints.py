@@ -0,0 +1,141 @@
+import fakeredis
+
+from sports.bq import BigQuerySink
+from sports.ingest import row_fingerprints as rf
+from sports.ingest import tote_products
+
+
+ROWS = [{"product_id": "P1", "status": "OPEN"}, {"product_id": "P2", "status": "OPEN"}]
+
+
+def _cache(redis_client=None, **kw):
+    cache = rf.RowFingerprintCache(**kw)
+    if redis_client is not None:
+        cache._redis = redis_client
+    else:
+        cache._redis_failed = True
+    return cache
+
+
+def test_unchanged_rows_skipped_after_commit():
+    cache = _cache()
+    out, pending = cache.changed_rows("t", ROWS, ("product_id",), scope="p.d")
+    assert len(out) == 2
+    cache.commit("t", pending, scope="p.d")
+    assert cache.changed_rows("t", ROWS, ("product_id",), scope="p.d")[0] == []
+    changed = [dict(ROWS[0], status="CLOSED"), ROWS[1]]
+    assert cache.changed_rows("t", changed, ("product_id",), scope="p.d")[0] == [changed[0]]
+
+
+def test_fingerprints_are_scoped_per_dataset():
+    r = fakeredis.FakeRedis(decode_responses=True)
+    writer = _cache(r)
+    writer.commit("t", writer.changed_rows("t", ROWS, ("product_id",), scope="dev.test")[1], scope="dev.test")
+
+    reader = _cache(r)
+    assert len(reader.changed_rows("t", ROWS, ("product_id",), scope="prod.autobet")[0]) == 2
+    assert reader.changed_rows("t", ROWS, ("product_id",), scope="dev.test")[0] == []
+
+
+def test_entries_expire_individually(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(rf.time, "time", lambda: now[0])
+    r = fakeredis.FakeRedis(decode_responses=True)
+    cache = _cache(r, ttl_s=3600)
+    cache.commit("t", cache.changed_rows("t", ROWS[:1], ("product_id",), scope="s")[1], scope="s")
+    first_key = cache._redis_key("s", "t", cache._buckets(now[0])[0])
+    assert 0 < r.ttl(first_key) <= 3600 + cache.BUCKET_S
+
+    # Later writes go to later day buckets and do not extend the old one
+    now[0] += 2 * cache.BUCKET_S
+    cache.commit("t", cache.changed_rows("t", ROWS[1:], ("product_id",), scope="s")[1], scope="s")
+    assert r.ttl(first_key) <= 3600 + cache.BUCKET_S
+
+    # Past the TTL the first row counts as new again, locally and via Redis
+    assert cache.changed_rows("t", ROWS[:1], ("product_id",), scope="s")[0] == ROWS[:1]
+    fresh = _cache(r, ttl_s=3600)
+    assert fresh.changed_rows("t", ROWS[:1], ("product_id",), scope="s")[0] == ROWS[:1]
+    assert fresh.changed_rows("t", ROWS[1:], ("product_id",), scope="s")[0] == []
+
+
+class _LocalSink:
+    def __init__(self):
+        self.written = []
+
+    def upsert_tote_products(self, rows):
+        self.written.append(list(rows))
+
+
+class _FakeBQ(BigQuerySink):
+    def __init__(self, dataset):
+        super().__init__("proj", dataset)
+        self.written = []
+
+    def upsert_tote_products(self, rows):
+        self.written.append(list(rows))
+
+
+def test_upsert_changed_only_dedups_bigquery_sinks(monkeypatch):
+    cache = _cache()
+    monkeypatch.setattr(tote_products, "get_row_cache", lambda: cache)
+
+    local = _LocalSink()
+    for _ in range(2):
+        tote_products._upsert_changed(local.upsert_tote_products, "tote_products", ROWS, ("product_id",))
+    assert [len(w) for w in local.written] == [2, 2]
+
+    prod = _FakeBQ("autobet")
+    for _ in range(2):
+        tote_products._upsert_changed(prod.upsert_tote_products, "tote_products", ROWS, ("product_id",))
+    assert [len(w) for w in prod.written] == [2]
+
+    # Another dataset has its own fingerprints
+    test = _FakeBQ("autobet_test")
+    tote_products._upsert_changed(test.upsert_tote_products, "tote_products", ROWS, ("product_id",))
+    assert [len(w) for w in test.written] == [2]
+
+
+class _RawSink:
+    def __init__(self):
+        self.rows = []
+
+    def upsert_raw_tote_probable_odds(self, rows):
+        self.rows.extend(rows)
+
+
+NODES = [{"id": "P1", "name": "Win", "lines": {"nodes": [{"odds": {"decimal": 3.5}}]}}, {"id": "P2", "name": "Place"}]
+
+
+def test_raw_products_go_to_gcs_with_pointer_row(monkeypatch):
+    import gzip
+    import json
+
+    from sports import gcp
+
+    uploads = {}
+    monkeypatch.setattr(tote_products.cfg, "tote_raw_bucket", "raw-bucket")
+    monkeypatch.setattr(gcp, "upload_bytes_to_bucket", lambda bucket, blob, data, **kw: uploads.update({f"gs://{bucket}/{blob}": data}))
+    sink = _RawSink()
+    tote_products._store_raw_products(sink, NODES, "products:2025-09-20:1", 1)
+
+    (row,) = sink.rows
+    assert list(uploads) == [row["gcs_uri"]]
+    full = gzip.decompress(uploads[row["gcs_uri"]])
+    assert json.loads(full) == {"products": {"nodes": NODES}}
+    assert row["payload_bytes"] == len(full) and row["gzip_bytes"] == len(uploads[row["gcs_uri"]])
+    # Only what vw_tote_probable_odds reads stays in BigQuery
+    assert json.loads(row["payload"]) == {"products": {"nodes": [{"id": "P1", "lines": NODES[0]["lines"]}]}}
+
+
+def test_raw_products_stay_in_bigquery_when_upload_fails(monkeypatch):
+    from sports import gcp
+
+    def _fail(*a, **kw):
+        raise RuntimeError("denied")
+
+    monkeypatch.setattr(tote_products.cfg, "tote_raw_bucket", "raw-bucket")
+    monkeypatch.setattr(gcp, "upload_bytes_to_bucket", _fail)
+    sink = _RawSink()
+    tote_products._store_raw_products(sink, NODES, "r", 1)
+    assert "gcs_uri" not in sink.rows[0]
+    assert '"name":"Place"' in sink.rows[0]["payload"]
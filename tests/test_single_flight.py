@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from sports.providers.single_flight import AsyncSingleFlight
+
+
+def test_concurrent_callers_share_one_request():
+    async def main():
+        sf = AsyncSingleFlight(ttl_s=0)
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"ok": True}
+
+        results = await asyncio.gather(*(sf.run(("q", "P1"), fetch) for _ in range(5)))
+        assert results == [{"ok": True}] * 5
+        assert len(calls) == 1
+        assert sf.counters["executed"] == 1 and sf.counters["coalesced"] == 4
+
+    asyncio.run(main())
+
+
+def test_results_are_cached_for_ttl_then_refetched():
+    async def main():
+        sf = AsyncSingleFlight(ttl_s=0.1)
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return len(calls)
+
+        assert await sf.run("k", fetch) == 1
+        assert await sf.run("k", fetch) == 1
+        assert sf.counters["cache_hits"] == 1
+        await asyncio.sleep(0.15)
+        assert await sf.run("k", fetch) == 2
+
+    asyncio.run(main())
+
+
+def test_errors_are_shared_and_cached():
+    async def main():
+        sf = AsyncSingleFlight(ttl_s=10)
+        calls = []
+
+        async def fail():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(sf.run("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await sf.run("k", fail)
+        assert len(calls) == 1
+        assert sf.counters["errors"] == 1 and sf.counters["cache_hits"] == 1
+
+    asyncio.run(main())
+
+
+def test_concurrency_is_capped_across_keys():
+    async def main():
+        sf = AsyncSingleFlight(ttl_s=0, max_concurrency=2)
+        running = []
+        peak = []
+
+        async def fetch():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.02)
+            running.pop()
+
+        await asyncio.gather(*(sf.run(i, fetch) for i in range(6)))
+        assert max(peak) == 2
+
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from sports.providers.sink_pipeline import SinkPipeline
+
+
+class _Sink:
+    def __init__(self, bad=(), blocked=()):
+        self.bad = set(bad)
+        self.blocked = set(blocked)
+        self.release = threading.Event()
+        self.written = {}
+
+    def _write(self, method, rows):
+        if method in self.blocked:
+            self.release.wait(5)
+        if any(r.get("id") in self.bad for r in rows):
+            raise ValueError("invalid row")
+        self.written.setdefault(method, []).extend(r["id"] for r in rows)
+
+    def upsert_a(self, rows):
+        self._write("upsert_a", rows)
+
+    def upsert_b(self, rows):
+        self._write("upsert_b", rows)
+
+
+async def _wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    return cond()
+
+
+async def _wait_for_table(p, method):
+    await _wait_for(lambda: method in p._tables)
+    return p._tables[method]
+
+
+def _pipeline(sink, **kw):
+    kw.setdefault("flush_interval_s", 0.01)
+    kw.setdefault("max_batch", 10)
+    kw.setdefault("spool_dir", "")
+    return SinkPipeline(sink, name="test", **kw)
+
+
+def test_slow_table_does_not_delay_others():
+    async def main():
+        sink = _Sink(blocked={"upsert_a"})
+        p = _pipeline(sink)
+        p.submit("upsert_a", {"id": 1})
+        p.submit("upsert_b", {"id": 2})
+        assert await _wait_for(lambda: sink.written.get("upsert_b") == [2])
+        assert "upsert_a" not in sink.written
+        sink.release.set()
+        await p.aclose(timeout=5)
+        assert sink.written["upsert_a"] == [1]
+
+    asyncio.run(main())
+
+
+def test_memory_mode_drops_oldest_and_counts_failures_once():
+    async def main():
+        sink = _Sink(bad={3}, blocked={"upsert_a"})
+        p = _pipeline(sink, max_batch=2, max_pending=2)
+        for i in range(1, 6):
+            p.submit("upsert_a", {"id": i})
+        sink.release.set()
+        await p.aclose(timeout=5)
+        st = p._tables["upsert_a"].stats()
+        assert st["rows_dropped"] >= 1
+        assert st["rows_failed"] + st["rows_written"] + st["rows_dropped"] == 5
+
+    asyncio.run(main())
+
+
+def test_spool_dead_letters_bad_row_and_keeps_the_rest(tmp_path):
+    async def main():
+        sink = _Sink(bad={3})
+        p = _pipeline(sink, spool_dir=str(tmp_path), max_attempts=1)
+        for i in range(1, 7):
+            p.submit("upsert_a", {"id": i})
+        tp = await _wait_for_table(p, "upsert_a")
+        assert await _wait_for(lambda: tp.written == 5)
+        await p.aclose(timeout=5)
+        assert sorted(sink.written["upsert_a"]) == [1, 2, 4, 5, 6]
+        assert tp.failed == 1 and tp.dead_lettered == 1
+        with open(os.path.join(str(tmp_path), "deadletter.jsonl"), encoding="utf-8") as f:
+            dead = [json.loads(line) for line in f]
+        assert [(d["m"], d["r"]) for d in dead] == [("upsert_a", {"id": 3})]
+        # Everything was acknowledged, so nothing is replayed on restart
+        assert p._spool.committed == p._spool.write_pos
+
+    asyncio.run(main())
+
+
+def test_spool_backpressure_is_per_table(tmp_path):
+    async def main():
+        sink = _Sink(blocked={"upsert_a"})
+        p = _pipeline(sink, spool_dir=str(tmp_path), max_batch=2, max_pending=2)
+        for i in range(10):
+            p.submit("upsert_a", {"id": i})
+        for i in range(5):
+            p.submit("upsert_b", {"id": 100 + i})
+        assert await _wait_for(lambda: len(sink.written.get("upsert_b", [])) == 5)
+        tp = p._tables["upsert_a"]
+        assert tp.parked and len(tp.buffer) <= 2
+
+        sink.release.set()
+        assert await _wait_for(lambda: len(sink.written.get("upsert_a", [])) == 10)
+        assert sink.written["upsert_a"] == list(range(10))
+        await p.aclose(timeout=5)
+
+    asyncio.run(main())
+
+
+def test_batches_and_stats():
+    async def main():
+        sink = _Sink()
+        p = _pipeline(sink, max_batch=3)
+        p.attach_stats("upstream", lambda: {"held": 0})
+        for i in range(7):
+            p.submit("upsert_a", {"id": i})
+        await p.aclose(timeout=5)
+        assert sink.written["upsert_a"] == list(range(7))
+        st = p.stats()
+        table = st["tables"]["upsert_a"]
+        assert table["rows_written"] == 7 and table["rows_dropped"] == 0
+        assert table["flushes"] >= 3
+        assert st["upstream"] == {"held": 0}
+
+    asyncio.run(main())
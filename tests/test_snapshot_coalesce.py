@@ -0,0 +1,61 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from sports.providers.snapshot_coalesce import SnapshotCoalescer
+
+
+T = 1000.0
+
+
+def _row(gross, pid="P1", **kw):
+    return {"product_id": pid, "total_gross": gross, "total_net": gross * 0.8, **kw}
+
+
+def _coalescer(**kw):
+    kw.setdefault("window_ms", 1000)
+    kw.setdefault("min_change", 0.5)
+    kw.setdefault("min_change_pct", 0.05)
+    kw.setdefault("near_off_s", 60)
+    return SnapshotCoalescer(**kw)
+
+
+def test_one_row_per_window_keeps_the_latest():
+    c = _coalescer()
+    assert c.offer(_row(100.0), now=T) == [_row(100.0)]
+    assert c.offer(_row(110.0), now=T + 0.2) == []
+    assert c.offer(_row(120.0), now=T + 0.4) == []
+    assert c.due(now=T + 0.5) == []
+    assert c.due(now=T + 1.0) == [_row(120.0)]
+    assert c.counters["superseded"] == 1
+    assert c.due(now=T + 5.0) == []
+
+
+def test_small_moves_are_dropped():
+    c = _coalescer()
+    c.offer(_row(1000.0), now=T)
+    assert c.offer(_row(1000.1), now=T + 5.0) == []
+    assert c.counters["below_threshold"] == 1
+
+
+def test_status_change_flushes_held_row():
+    c = _coalescer()
+    c.offer(_row(100.0, status="OPEN"), now=T)
+    c.offer(_row(150.0, status="OPEN"), now=T + 0.1)
+    assert c.status_changed("P1", "CLOSED", now=T + 0.2) == [_row(150.0, status="OPEN")]
+    assert c.counters["status_flushes"] == 2
+    # A row carrying a new status is written at once
+    assert c.offer(_row(151.0, status="SUSPENDED"), now=T + 0.3) == [_row(151.0, status="SUSPENDED")]
+
+
+def test_near_off_changes_are_written_immediately():
+    soon = (datetime.now(timezone.utc) + timedelta(seconds=30)).isoformat()
+    c = _coalescer()
+    c.offer(_row(100.0, start_iso=soon), now=T)
+    assert c.offer(_row(110.0, start_iso=soon), now=T + 0.1) == [_row(110.0, start_iso=soon)]
+    assert c.counters["near_off"] == 2
+
+
+def test_disabled_window_passes_everything_through():
+    c = _coalescer(window_ms=0)
+    rows = [_row(100.0), _row(100.0)]
+    assert [c.offer(r, now=time.monotonic()) for r in rows] == [[r] for r in rows]
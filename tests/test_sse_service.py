@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import fakeredis
+
+from sports.realtime import EventBus
+from sports.realtime_redis import RedisEventBus
+from sports.sse_service import Broadcaster, _Client
+
+
+def _client(topics, mode="queue"):
+    return _Client(set(topics), {}, mode, 100)
+
+
+async def _collect(c, n, timeout=3.0):
+    out = []
+    deadline = time.monotonic() + timeout
+    while len(out) < n and time.monotonic() < deadline:
+        try:
+            await asyncio.wait_for(c.wake.wait(), timeout=0.05)
+        except asyncio.TimeoutError:
+            continue
+        out.extend(c.take())
+    return out
+
+
+def test_bridge_follows_client_topics():
+    async def main():
+        bus = EventBus()
+        b = Broadcaster(bus)
+        b.start(asyncio.get_running_loop())
+        assert not bus.has_subscribers("pool_total_changed")
+
+        c = _client(["pool_total_changed"])
+        await b.attach(c, None)
+        assert bus.has_subscribers("pool_total_changed")
+        assert not bus.has_subscribers("event_status_changed")
+
+        b.detach(c)
+        assert not bus.has_subscribers("pool_total_changed")
+        b.stop()
+
+    asyncio.run(main())
+
+
+def test_epoch_ids_resume_only_on_same_process():
+    async def main():
+        bus = EventBus()
+        b = Broadcaster(bus, replay=100)
+        b.start(asyncio.get_running_loop())
+        c = _client(["pool_total_changed"])
+        await b.attach(c, None)
+        for i in range(3):
+            bus.publish("pool_total_changed", {"product_id": f"P{i}"})
+        events = await _collect(c, 3)
+        assert [e.id for e in events] == [f"{b.epoch}.{i}" for i in (1, 2, 3)]
+
+        again = _client(["pool_total_changed"])
+        assert await b.attach(again, events[0].id)
+        assert [e.payload["product_id"] for e in again.take()] == ["P1", "P2"]
+
+        other = Broadcaster(EventBus(), replay=100)
+        assert not await other.attach(_client(["pool_total_changed"]), events[0].id)
+        assert other.counters["resyncs"] == 1
+        b.stop()
+
+    asyncio.run(main())
+
+
+def test_redis_stream_ids_resume_on_another_instance():
+    async def main():
+        server = fakeredis.FakeServer()
+
+        def make():
+            return RedisEventBus(client=fakeredis.FakeRedis(server=server), stream="test:sse", block_ms=50)
+
+        publisher, bus_a, bus_b = make(), make(), make()
+        try:
+            a = Broadcaster(bus_a, replay=100)
+            a.start(asyncio.get_running_loop())
+            c = _client(["pool_total_changed"])
+            await a.attach(c, None)
+            bus_a._advertise()
+            publisher._next_interest = 0.0
+            publisher._advertise()
+            assert publisher.has_subscribers("pool_total_changed")
+
+            for i in range(3):
+                publisher.publish("pool_total_changed", {"product_id": f"P{i}"})
+            events = await _collect(c, 3)
+            assert [e.payload["product_id"] for e in events] == ["P0", "P1", "P2"]
+            assert all(e.id.count("-") == 1 for e in events)
+
+            # Reconnect to another instance with the first id
+            b = Broadcaster(bus_b, replay=100)
+            again = _client(["pool_total_changed"])
+            assert await b.attach(again, events[0].id)
+            assert [e.id for e in again.take()] == [e.id for e in events[1:]]
+
+            # Ids that are not stream ids (e.g. from an in-process bus) resync
+            assert not await b.attach(_client(["pool_total_changed"]), "abcd1234.7")
+            a.stop()
+        finally:
+            for bus in (publisher, bus_a, bus_b):
+                bus.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+import pytest
+
+from sports import retry_utils
+from sports.providers.tote_api import ToteClient, ToteError, split_product_batch
+
+
+class _Resp:
+    def __init__(self, status, body=None):
+        self.status_code = status
+        self.headers = {}
+        self.reason = "status"
+        self.text = ""
+        self.url = "https://tote.test/graphql"
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class _Session:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def post(self, url, **kw):
+        status = self.statuses.pop(0)
+        return _Resp(status, {"data": {}})
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = retry_utils.CircuitBreaker("tote", failure_threshold=2, reset_timeout_s=60)
+    monkeypatch.setitem(retry_utils._BREAKERS, "tote", b)
+    return b
+
+
+def _client(statuses):
+    c = ToteClient(base_url="https://tote.test/graphql", api_key="k", max_retries=0, cassette=None)
+    c.cassette = None
+    c.session = _Session(statuses)
+    return c
+
+
+def test_client_errors_do_not_reset_the_breaker(breaker):
+    c = _client([503, 400, 503])
+    for _ in range(3):
+        with pytest.raises(ToteError):
+            c.graphql("{ x }")
+    assert breaker.state == breaker.OPEN
+
+
+def test_client_error_does_not_close_a_half_open_breaker(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker._opened_at -= 120
+    c = _client([400, 200])
+    with pytest.raises(ToteError):
+        c.graphql("{ x }")
+    assert breaker.state == breaker.HALF_OPEN
+    c.graphql("{ x }")
+    assert breaker.state == breaker.CLOSED
+
+
+def test_split_product_batch_fails_aliases_with_scoped_errors():
+    raw = {
+        "data": {"p1": {"id": "A"}, "p2": {"id": "B", "lines": None}, "p3": None},
+        "errors": [
+            {"message": "lines unavailable", "path": ["p2", "lines"]},
+            {"message": "upstream timeout"},
+        ],
+    }
+    out = split_product_batch(raw, 3)
+    assert out[0] == {"product": {"id": "A"}}
+    assert isinstance(out[1], ToteError) and "lines unavailable" in str(out[1])
+    assert isinstance(out[2], ToteError) and "upstream timeout" in str(out[2])